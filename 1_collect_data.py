@@ -1,75 +1,197 @@
 import database
+import metrics
 import scraper
+import page_archive
 import config
-import time
+import argparse
 from datetime import datetime
 
-def collect_data():
-    print("Step 1: Help Article Cataloging (Scraping)")
+def collect_data(workers=config.CRAWL_WORKERS, refresh=False, extract_processes=None, discovery=None,
+                 reextract=False):
+    if reextract:
+        return reextract_articles(extract_processes)
+    print("Step 1: Help Article Cataloging (Scraping)" + (" [incremental refresh]" if refresh else ""))
     
     Session = database.init_db()
     session = Session()
     
-    s = scraper.Scraper()
+    # Requests overlap across workers; the shared token bucket keeps us at REQUEST_INTERVAL
+    s = scraper.Scraper(workers=workers, extract_processes=extract_processes)
+    print(f"Crawl workers: {s.workers}, parser: {s.parser.name}, extract processes: {s.extract_processes}")
     
     # 1. Get Categories
     print("Fetching categories...")
     categories = s.get_categories()
     print(f"Found {len(categories)} categories.")
     
-    for cat_data in categories:
-        # Save or update category in DB
-        cat = session.query(database.Category).filter_by(url=cat_data['url']).first()
-        if not cat:
-            cat = database.Category(
-                name=cat_data['name'],
-                url=cat_data['url'],
-                article_count=cat_data['count']
-            )
-            session.add(cat)
-            session.commit()
-            print(f"Added Category: {cat.name}")
-        else:
-            cat.article_count = cat_data['count']
-            session.commit()
-            
-        # 2. Get Articles for this category
-        print(f"  Fetching articles for: {cat.name}...")
-        articles = s.get_articles_from_category(cat.url)
-        print(f"  Found {len(articles)} articles.")
+    # Save or update all categories in one statement
+    cat_ids = database.upsert_categories(session, categories)
+    session.commit()
+    
+    # Preload what we already have, so no per-article lookups are needed below
+    if refresh:
+        existing = database.load_articles_for_refresh(session)
+    else:
+        existing = dict.fromkeys(database.known_article_urls(session))
+    print(f"{len(existing)} articles already in the database.")
+    # Matched on the normalized URL, so sitemap and listing spellings of a URL agree
+    existing = {scraper.normalize_url(url): art for url, art in existing.items()}
         
-        for art_data in articles:
-            # Check if article already exists
-            art = session.query(database.Article).filter_by(url=art_data['url']).first()
-            
-            if art:
-                # print(f"    Skipping (exists): {art.title}")
+    # 2. Discover articles: from the sitemap when there is one, category listings otherwise
+    discovered = s.discover_articles(categories, existing, discovery)
+    
+    # 3. Work out which articles to fetch. In refresh mode existing articles are re-fetched
+    # conditionally instead of skipped, unless their sitemap lastmod hasn't moved.
+    stats = {'new': 0, 'changed': 0, 'unchanged': 0, 'failed': 0}
+    pending = []
+    for art_data in discovered:
+        key = scraper.normalize_url(art_data['url'])
+        art = None
+        if key in existing:
+            if not refresh:
+                continue # Known article; without --refresh only new ones are fetched
+            art = existing[key]
+            if art_data['lastmod'] and art_data['lastmod'] == art.sitemap_lastmod:
+                stats['unchanged'] += 1
                 continue
-                
-            print(f"    New Article: {art_data['title']}")
+        pending.append((cat_ids.get(art_data['category_url']), art_data, art))
             
-            # Get full content and metadata
-            content, word_count, has_screenshots = s.get_article_content(art_data['url'])
-            custom_id = s.extract_id_from_url(art_data['url'])
-            
-            new_art = database.Article(
-                title=art_data['title'],
-                url=art_data['url'],
-                category_id=cat.id,
-                content_text=content,
-                word_count=word_count,
-                has_screenshots=has_screenshots,
-                article_custom_id=custom_id,
-                last_updated=datetime.utcnow()
-            )
-            session.add(new_art)
+    print(f"Fetching content for {len(pending)} articles...")
+    
+    # 4. Fetch full content and metadata concurrently, a chunk at a time.
+    # Workers only see plain values, never ORM objects. New rows are bulk-inserted and
+    # committed every DB_BATCH_SIZE rows, so a crash loses at most one transaction.
+    chunk = s.workers * 4
+    new_rows = []
+    dirty = 0
+    for start in range(0, len(pending), chunk):
+        batch = pending[start:start + chunk]
+        fetches = [
+            (art_data['url'], art.etag if art else None, art.last_modified_header if art else None)
+            for _, art_data, art in batch
+        ]
+        results = s.map(lambda req: s.fetch_article(*req), fetches)
+        
+        for (cat_id, art_data, art), result in zip(batch, results):
+            if art is None:
+                result = result or {}
+                title = art_data['title'] or result.get('title') or art_data['url']
+                print(f"    New Article: {title}")
+                content = result.get('content', "")
+                new_rows.append({
+                    'title': title,
+                    'url': art_data['url'],
+                    'category_id': cat_id,
+                    'content_text': content,
+                    'word_count': result.get('word_count', 0),
+                    'has_screenshots': result.get('has_screenshots', False),
+                    'article_custom_id': s.extract_id_from_url(art_data['url']),
+                    'etag': result.get('etag'),
+                    'last_modified_header': result.get('last_modified'),
+                    'content_hash': result.get('content_hash') or scraper.content_hash(content),
+                    'sitemap_lastmod': art_data['lastmod'],
+                    'last_updated': datetime.utcnow()
+                })
+                stats['new'] += 1
+            elif result is None:
+                stats['failed'] += 1
+                continue
+            else:
+                art.etag = result['etag']
+                art.last_modified_header = result['last_modified']
+                art.sitemap_lastmod = art_data['lastmod']
+                old_hash = art.content_hash or scraper.content_hash(art.content_text)
+                if result['not_modified'] or result['content_hash'] == old_hash:
+                    art.content_hash = old_hash
+                    stats['unchanged'] += 1
+                else:
+                    art.title = art_data['title'] or result.get('title') or art.title
+                    print(f"    Changed Article: {art.title}")
+                    art.content_text = result['content']
+                    art.word_count = result['word_count']
+                    art.has_screenshots = result['has_screenshots']
+                    art.content_hash = result['content_hash']
+                    art.last_updated = datetime.utcnow()
+                    # Text changed, so the old analysis is stale: queue it for step 2
+                    database.reset_analysis(art)
+                    stats['changed'] += 1
+            dirty += 1
+        print(f"[{start + len(batch)}/{len(pending)}] articles fetched")
+                    
+        if dirty >= config.DB_BATCH_SIZE: # Counts new rows too
+            database.bulk_insert_articles(session, new_rows)
             session.commit()
+            new_rows, dirty = [], 0
             
-            # Small delay to be polite
-            time.sleep(0.5)
-
+    database.bulk_insert_articles(session, new_rows)
+    session.commit()
+            
+    print(f"New: {stats['new']}, Changed: {stats['changed']}, "
+          f"Unchanged: {stats['unchanged']}, Failed: {stats['failed']}")
+    s.close()
     print("\nData Collection Complete.")
+    metrics.report('collect')
+    session.close()
+
+def reextract_articles(extract_processes=None):
+    """
+    Rebuilds article text from the page archive with the current extraction code, without
+    touching the network. Articles whose text changes are re-queued for analysis.
+    """
+    print("Step 1: Re-extracting articles from the page archive (offline)")
+
+    Session = database.init_db()
+    session = Session()
+    archive = page_archive.PageArchive()
+    s = scraper.Scraper(extract_processes=extract_processes, archive=False)
+    print(f"Parser: {s.parser.name}, extract processes: {s.extract_processes}")
+
+    articles = {scraper.normalize_url(url): art for url, art in database.load_articles_for_reextract(session).items()}
+    archived = [(url, body_hash, encoding) for url, body_hash, encoding in archive.latest() if url in articles]
+    print(f"{len(archived)} of {len(articles)} articles have an archived page.")
+
+    # Decompress and extract a chunk at a time; with --extract-processes N the chunk is
+    # spread over N processes, so this runs at full local CPU speed
+    stats = {'changed': 0, 'unchanged': 0, 'empty': 0}
+    chunk = config.DB_BATCH_SIZE
+    for start in range(0, len(archived), chunk):
+        batch = archived[start:start + chunk]
+        pages = [(archive.get(body_hash), encoding) for _, body_hash, encoding in batch]
+        results = s.extract_many(pages)
+        for (url, _, _), (text, word_count, has_screenshots, _) in zip(batch, results):
+            art = articles[url]
+            if not text:
+                stats['empty'] += 1 # Keep what we have rather than blank the article
+                continue
+            new_hash = scraper.content_hash(text)
+            if new_hash == art.content_hash and has_screenshots == art.has_screenshots:
+                stats['unchanged'] += 1
+                continue
+            if new_hash != art.content_hash:
+                art.content_text = text
+                art.word_count = word_count
+                art.content_hash = new_hash
+                art.last_updated = datetime.utcnow()
+                # Text changed, so the old analysis is stale: queue it for step 2
+                database.reset_analysis(art)
+            art.has_screenshots = has_screenshots
+            stats['changed'] += 1
+        session.commit()
+        print(f"[{start + len(batch)}/{len(archived)}] articles re-extracted")
+
+    print(f"Changed: {stats['changed']}, Unchanged: {stats['unchanged']}, "
+          f"No article body found: {stats['empty']}, Not archived: {len(articles) - len(archived)}")
+    print(archive.stats())
+    archive.close()
+    s.close()
     session.close()
+    metrics.report('reextract')
+    print("\nRe-extraction Complete.")
 
 if __name__ == "__main__":
-    collect_data()
+    import cli
+    parser = argparse.ArgumentParser(description="Scrape the help center into the database.")
+    cli.add_collect_arguments(parser)
+    args = parser.parse_args()
+    collect_data(workers=args.crawl_workers, refresh=args.refresh, extract_processes=args.extract_processes,
+                 discovery=args.discovery, reextract=args.reextract)
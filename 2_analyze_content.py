@@ -1,66 +1,177 @@
 import database
+import dedup
+import metrics
 import ai_processor
+import config
 import time
 import sys
-from sqlalchemy import or_
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-def analyze_data():
+def save_result(session, art, result):
+    database.apply_analysis(art, result)
+    session.commit() # SAVE IMMEDIATELY
+    session.expunge(art) # Done with it; keep the identity map from growing with the corpus
+
+def analyze_serial(session, ai, pages, total):
+    i = 0
+    for page in pages:
+        for art in page:
+            i += 1
+            print(f"[{i}/{total}] Analyzing: {art.title}...", end="", flush=True)
+
+            start_t = time.time()
+
+            try:
+                # Call AI
+                result = ai.analyze_article(art.title, art.content_text, art.content_type)
+
+                # Update DB
+                save_result(session, art, result)
+
+                elapsed = time.time() - start_t
+                if "Error" in result['gap']:
+                     print(f" FAILED ({elapsed:.2f}s) - {result['gap']}")
+                else:
+                     print(f" DONE ({elapsed:.2f}s)")
+
+                # Rate limit is handled inside ai_processor or here?
+                # AIProcessor has no internal rate limit loop for single client,
+                # we should add small sleep here just in case Groq 30RPM
+                # 60s / 30 = 2s
+                time.sleep(1)
+
+            except Exception as e:
+                print(f" EXCEPTION: {e}")
+                session.rollback()
+
+def analyze_parallel(session, ai, pages, total, workers, batch=False):
+    """
+    Runs up to `workers` completions at once. The AIMD limiter decides how many are
+    actually in flight; this thread is the only one that touches the DB session.
+    With batch=True each completion carries several short articles.
+    Pages are pulled lazily, so only a few pages of articles are in memory at a time.
+    """
+    limiter = ai_processor.AdaptiveLimiter(workers, initial=config.ANALYSIS_INITIAL_CONCURRENCY)
+    ai.on_rate_limit = limiter.backoff
+
+    def work(items, attempt=0):
+        if attempt:
+            time.sleep(ai._retry_delay(attempt)) # Re-queued after a rate limit: back off first
+        limiter.acquire()
+        start_t = time.time()
+        success = False
+        try:
+            if len(items) == 1:
+                art_id, title, content, content_type = items[0]
+                results = {art_id: ai.analyze_article(title, content, content_type)}
+            else:
+                results = ai.analyze_batch(items)
+            success = len(results) == len(items) and not any(r['gap'].startswith("Error") for r in results.values())
+            return results, time.time() - start_t
+        finally:
+            limiter.release(success)
+
+    by_id = {}
+    units = {} # future -> (items, attempt)
+    done = 0
+
+    def collect(finished, pool):
+        """Saves finished results; returns futures for batches re-queued after a rate limit."""
+        nonlocal done
+        requeued = set()
+        for future in finished:
+            items, attempt = units.pop(future)
+            try:
+                results, elapsed = future.result()
+            except Exception as e:
+                print(f"EXCEPTION: {e}")
+                continue
+            # Articles a batch left unprocessed (rate limit, transport error) go round again
+            missing = [item for item in items if item[0] not in results]
+            if missing and attempt < config.AI_MAX_RETRIES:
+                print(f"Re-queueing {len(missing)} articles (attempt {attempt + 1}/{config.AI_MAX_RETRIES})")
+                retry = pool.submit(work, missing, attempt + 1)
+                units[retry] = (missing, attempt + 1)
+                requeued.add(retry)
+            elif missing:
+                results.update((item[0], ai._error_result("batch request kept failing")) for item in missing)
+            for art_id, result in results.items():
+                done += 1
+                art = by_id.pop(art_id)
+                try:
+                    save_result(session, art, result)
+                    status = f"FAILED ({elapsed:.2f}s) - {result['gap']}" if "Error" in result['gap'] else f"DONE ({elapsed:.2f}s, {result.get('model') or 'cached'})"
+                    print(f"[{done}/{total}] {art.title}: {status} [concurrency {int(limiter.limit)}]")
+                except Exception as e:
+                    print(f"[{done}/{total}] {art.title}: EXCEPTION: {e}")
+                    session.rollback()
+        return requeued
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = set()
+        for page in pages:
+            by_id.update((art.id, art) for art in page)
+            # Workers only get plain values, never ORM objects
+            items = [(art.id, art.title, art.content_text, art.content_type) for art in page]
+            batches = ai.plan_batches(items) if batch else [[item] for item in items]
+            for unit in batches:
+                future = pool.submit(work, unit)
+                units[future] = (unit, 0)
+                futures.add(future)
+            # Don't read the next page until the queue of submitted work drains a bit
+            while len(futures) > workers * 4:
+                finished, futures = wait(futures, return_when=FIRST_COMPLETED)
+                futures |= collect(finished, pool)
+        while futures:
+            finished, futures = wait(futures, return_when=FIRST_COMPLETED)
+            futures |= collect(finished, pool)
+
+def analyze_data(workers=config.ANALYSIS_WORKERS, batch=False, dedupe=False):
     print("Step 2: AI Analysis (Groq)")
-    
+
     # 1. Initialize DB & AI
     Session = database.init_db()
-    session = Session()
-    
+    session = Session(expire_on_commit=False) # Pages stay readable across per-row commits
+
     ai = ai_processor.AIProcessor()
-    
+
+    # Near-duplicates only send their cluster representative to the LLM
+    if dedupe:
+        clusters, duplicates = dedup.assign_duplicates(session)
+        session.commit()
+        print(f"Near-duplicates: {duplicates} articles in {clusters} clusters reuse a representative's analysis.")
+
     # 2. Fetch Pending Articles
-    # Pending = gap_analysis is NULL or gap_analysis starts with "Error" (retry errors)
-    articles = session.query(database.Article).filter(
-        or_(database.Article.gap_analysis == None, database.Article.gap_analysis.like("Error%"))
-    ).all()
-    
-    total = len(articles)
+    # Pending = analysis_status is 'pending' or 'error' (retry errors); counted and read via index
+    total = database.count_pending(session, skip_duplicates=dedupe)
     print(f"Found {total} articles needing analysis.")
-    
-    if total == 0:
+
+    if total == 0 and not dedupe:
         print("Nothing to analyze.")
         return
 
+    pages = database.iter_pending_articles(session, skip_duplicates=dedupe)
+
     # 3. Process Loop
-    for i, art in enumerate(articles):
-        print(f"[{i+1}/{total}] Analyzing: {art.title}...", end="", flush=True)
-        
-        start_t = time.time()
-        
-        try:
-            # Call AI
-            result = ai.analyze_article(art.title, art.content_text)
-            
-            # Update DB
-            art.gap_analysis = result['gap']
-            art.suggested_topics = result['suggestions'] # "Suggestions" column
-            art.topics_covered = result['topics']
-            art.content_type = result['type']
-            
-            session.commit() # SAVE IMMEDIATELY
-            
-            elapsed = time.time() - start_t
-            if "Error" in result['gap']:
-                 print(f" FAILED ({elapsed:.2f}s) - {result['gap']}")
-            else:
-                 print(f" DONE ({elapsed:.2f}s)")
-                 
-            # Rate limit is handled inside ai_processor or here?
-            # AIProcessor has no internal rate limit loop for single client, 
-            # we should add small sleep here just in case Groq 30RPM
-            # 60s / 30 = 2s
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f" EXCEPTION: {e}")
-            session.rollback()
+    if workers > 1 or batch:
+        analyze_parallel(session, ai, pages, total, workers, batch=batch)
+    else:
+        analyze_serial(session, ai, pages, total)
+
+    if dedupe:
+        copied = dedup.propagate_results(session)
+        session.commit()
+        print(f"Copied representative results to {copied} near-duplicates.")
 
     print("\nAnalysis Complete.")
+    if ai.cache:
+        print(ai.cache.stats())
+    metrics.report('analyze')
 
 if __name__ == "__main__":
-    analyze_data()
+    import cli
+    parser = argparse.ArgumentParser(description="Run AI gap analysis on pending articles.")
+    cli.add_analyze_arguments(parser)
+    args = parser.parse_args()
+    analyze_data(workers=args.analysis_workers, batch=args.batch, dedupe=args.dedupe)
@@ -1,90 +1,129 @@
 import database
-import pandas as pd
+import metrics
+import xlsxwriter
 import time
 import os
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+
+COLUMNS = [
+    # (header, width)
+    ('Article ID', 15),
+    ('Article Title', 40),
+    ('Category', 20),
+    ('URL', 30),
+    ('Last Updated', 15),
+    ('Topics Covered', 30),
+    ('Content Type', 20),
+    ('Word Count', 12),
+    ('Has Screenshots', 15),
+    ('Gaps Identified', 50),
+    ('Near Duplicates', 30),
+    ('AI Model', 25),
+]
+
+def iter_report_rows(session):
+    """
+    One joined, column-projected query streamed in chunks: no ORM objects, no per-row
+    category lookup, and only the columns the report shows (never content_text).
+    """
+    A, C = database.Article, database.Category
+    Rep = aliased(A)
+    # Cluster sizes are one small grouped query, so representatives can say how many copies they have
+    copies = dict(
+        session.query(A.duplicate_of, func.count(A.id)).filter(A.duplicate_of.isnot(None)).group_by(A.duplicate_of)
+    )
+    query = (
+        session.query(
+            A.id, A.article_custom_id, A.title, C.name, A.url, A.last_updated,
+            A.topics_covered, A.content_type, A.word_count, A.has_screenshots, A.gap_analysis,
+            Rep.article_custom_id, A.duplicate_similarity, A.analysis_model
+        )
+        .outerjoin(C, A.category_id == C.id)
+        .outerjoin(Rep, A.duplicate_of == Rep.id)
+        .order_by(A.id)
+        .yield_per(1000)
+    )
+    for (art_id, custom_id, title, cat_name, url, last_updated, topics, c_type, words, screens, gaps,
+         rep_custom_id, dup_similarity, model) in query:
+        # Format ID as KB-XXX
+        kb_id = f"KB-{custom_id}" if custom_id and custom_id != "N/A" else "KB-N/A"
+        if dup_similarity is not None:
+            duplicates = f"Near-duplicate of KB-{rep_custom_id or 'N/A'} ({dup_similarity:.0%} similar)"
+        elif art_id in copies:
+            duplicates = f"Representative of {copies[art_id]} near-duplicate(s)"
+        else:
+            duplicates = ""
+        yield [
+            kb_id,
+            title,
+            cat_name or 'Unknown',
+            url,
+            last_updated.strftime('%Y-%m-%d') if last_updated else "",
+            topics,
+            c_type,
+            words,
+            'Yes' if screens else 'No',
+            gaps,
+            duplicates,
+            model
+        ]
 
 def generate_report():
     print("Step 3: Generating Professional Excel Report")
-    
+
     Session = database.init_db()
     session = Session()
-    
-    articles = session.query(database.Article).all()
-    print(f"Fetching {len(articles)} records...")
-    
-    data = []
-    for art in articles:
-        cat = session.query(database.Category).get(art.category_id)
-        
-        # Format ID as KB-XXX
-        kb_id = f"KB-{art.article_custom_id}" if art.article_custom_id and art.article_custom_id != "N/A" else "KB-N/A"
-        
-        data.append({
-            'Article ID': kb_id,
-            'Article Title': art.title,
-            'Category': cat.name if cat else 'Unknown',
-            'URL': art.url,
-            'Last Updated': art.last_updated.strftime('%Y-%m-%d') if art.last_updated else "",
-            'Topics Covered': art.topics_covered,
-            'Content Type': art.content_type,
-            'Word Count': art.word_count,
-            'Has Screenshots': 'Yes' if art.has_screenshots else 'No',
-            'Gaps Identified': art.gap_analysis
-        })
-        
-    if not data:
-        print("No data to export.")
-        return
-        
-    df = pd.DataFrame(data)
-    
+
     # Filename with timestamp
     filename = f"AI_Audit_Report_{int(time.time())}.xlsx"
-    
-    # Use XlsxWriter for "Beautiful" formatting
-    writer = pd.ExcelWriter(filename, engine='xlsxwriter')
-    df.to_excel(writer, index=False, sheet_name='Audit Report')
-    
-    workbook = writer.book
-    worksheet = writer.sheets['Audit Report']
-    
-    # Formats
-    header_fmt = workbook.add_format({
-        'bold': True,
-        'text_wrap': True,
-        'valign': 'top',
-        'fg_color': '#D7E4BC', # Light Green
-        'border': 1
-    })
-    
-    cell_fmt = workbook.add_format({
-        'text_wrap': True,
-        'valign': 'top',
-        'border': 1
-    })
-    
-    # Set Column Widths and Apply Formats
-    # Columns: ID(0), Title(1), Cat(2), URL(3), Updated(4), Topics(5), Type(6), Count(7), Screens(8), Gaps(9)
-    
-    worksheet.set_column('A:A', 15, cell_fmt) # ID
-    worksheet.set_column('B:B', 40, cell_fmt) # Title
-    worksheet.set_column('C:C', 20, cell_fmt) # Category
-    worksheet.set_column('D:D', 30, cell_fmt) # URL
-    worksheet.set_column('E:E', 15, cell_fmt) # Updated
-    worksheet.set_column('F:F', 30, cell_fmt) # Topics
-    worksheet.set_column('G:G', 20, cell_fmt) # Content Type
-    worksheet.set_column('H:H', 12, cell_fmt) # Count
-    worksheet.set_column('I:I', 15, cell_fmt) # Screenshots
-    worksheet.set_column('J:J', 50, cell_fmt) # Gaps
-    
-    # Apply header format
-    for col_num, value in enumerate(df.columns.values):
-        worksheet.write(0, col_num, value, header_fmt)
-        
-    writer.close()
-    
+
+    workbook = None
+    row_num = 0
+    for row in iter_report_rows(session):
+        if workbook is None:
+            # Created on the first row so an empty DB leaves no file behind.
+            # constant_memory flushes each row to disk once the next one starts.
+            workbook = xlsxwriter.Workbook(filename, {'constant_memory': True})
+            worksheet = workbook.add_worksheet('Audit Report')
+
+            # Formats
+            header_fmt = workbook.add_format({
+                'bold': True,
+                'text_wrap': True,
+                'valign': 'top',
+                'fg_color': '#D7E4BC', # Light Green
+                'border': 1
+            })
+
+            cell_fmt = workbook.add_format({
+                'text_wrap': True,
+                'valign': 'top',
+                'border': 1
+            })
+
+            # Set Column Widths and Apply Formats (must precede rows in constant_memory mode)
+            for col_num, (header, width) in enumerate(COLUMNS):
+                worksheet.set_column(col_num, col_num, width, cell_fmt)
+
+            # Apply header format
+            for col_num, (header, _) in enumerate(COLUMNS):
+                worksheet.write(0, col_num, header, header_fmt)
+
+        row_num += 1
+        worksheet.write_row(row_num, 0, row)
+
+    session.close()
+
+    if workbook is None:
+        print("No data to export.")
+        return
+
+    workbook.close()
+
     print(f"Success! Report saved to: {filename}")
-    print(f"Total Rows: {len(df)}")
+    print(f"Total Rows: {row_num}")
+    metrics.report('report')
 
 if __name__ == "__main__":
     generate_report()
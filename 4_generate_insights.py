@@ -0,0 +1,251 @@
+import database
+import metrics
+import ai_processor
+import config
+import argparse
+import re
+import zlib
+from collections import Counter
+import numpy as np
+
+# Corpus-level gap insights. Per-article gaps are clustered locally and only a compact
+# summary of each of the largest clusters goes to the LLM:
+#
+#   gap lines -> hashed TF-IDF vectors (unigrams + bigrams) -> spherical k-means (NumPy)
+#   -> rank clusters by articles affected -> summaries, a few per prompt -> GapInsight rows
+#
+# LLM calls grow with the number of clusters reported, not with the size of the help center.
+
+TOKEN_RE = re.compile(r'[a-z][a-z0-9]+')
+STOPWORDS = set("""
+a an and are as at be but by can could does for from has have how in into is it its may
+more no not of on or should that the their there these this to was what when where which
+who why will with would about also any article articles other than then them they user
+users you your missing information there lack lacks details detail explain explained
+""".split())
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+def load_gaps(session):
+    """
+    One row per gap line of every successfully analyzed article: (article_id, title, category, gap).
+    Near-duplicates are left out so a copied page doesn't count twice.
+    """
+    A, C = database.Article, database.Category
+    query = (
+        session.query(A.id, A.title, C.name, A.gap_analysis)
+        .outerjoin(C, A.category_id == C.id)
+        .filter(A.analysis_status == database.STATUS_OK, A.duplicate_of.is_(None))
+        .yield_per(1000)
+    )
+    gaps = []
+    for art_id, title, cat_name, gap_text in query:
+        for line in (gap_text or "").splitlines():
+            line = line.strip().lstrip('-*• ').strip()
+            if len(line.split()) < 3 or line.startswith("Raw Output"):
+                continue
+            gaps.append((art_id, title, cat_name or 'Unknown', line))
+    return gaps
+
+class SparseRows:
+    """
+    Row-compressed (CSR) float32 matrix with just the operations kmeans and
+    summarize_clusters need: X @ dense, dense @ X, len(X), X[i] (dense row), X[idx] (rows).
+    Gap lines have a few dozen features each, so this stays O(nnz) instead of n x dim.
+    """
+    __array_ufunc__ = None # Makes `ndarray @ SparseRows` defer to __rmatmul__
+
+    def __init__(self, indptr, indices, data, dim):
+        self.indptr, self.indices, self.data = indptr, indices, data
+        self.shape = (len(indptr) - 1, dim)
+        self.row_ids = np.repeat(np.arange(self.shape[0]), np.diff(indptr))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, idx):
+        if np.isscalar(idx):
+            start, end = self.indptr[idx], self.indptr[idx + 1]
+            row = np.zeros(self.shape[1], dtype=np.float32)
+            np.add.at(row, self.indices[start:end], self.data[start:end])
+            return row
+        idx = np.asarray(idx, dtype=np.int64)
+        starts, ends = self.indptr[idx], self.indptr[idx + 1]
+        take = np.concatenate([np.arange(a, b) for a, b in zip(starts, ends)] or [np.array([], dtype=np.int64)])
+        indptr = np.concatenate([[0], np.cumsum(ends - starts)])
+        return SparseRows(indptr, self.indices[take], self.data[take], self.shape[1])
+
+    def toarray(self):
+        dense = np.zeros(self.shape, dtype=np.float32)
+        np.add.at(dense, (self.row_ids, self.indices), self.data)
+        return dense
+
+    def __matmul__(self, other):
+        """X @ other for a dense vector (dim,) or matrix (dim, k)."""
+        products = self.data.reshape(-1, *[1] * (other.ndim - 1)) * other[self.indices]
+        out = np.zeros((self.shape[0],) + other.shape[1:], dtype=products.dtype)
+        nonempty = np.diff(self.indptr) > 0
+        if nonempty.any():
+            out[nonempty] = np.add.reduceat(products, self.indptr[:-1][nonempty], axis=0)
+        return out
+
+    def __rmatmul__(self, other):
+        """other @ X for a dense (m, n) matrix, e.g. the one-hot cluster assignment."""
+        return np.stack([
+            np.bincount(self.indices, weights=row[self.row_ids] * self.data, minlength=self.shape[1])
+            for row in other
+        ]).astype(np.float32)
+
+def vectorize(token_lists, dim):
+    """Hashed TF-IDF over unigrams and bigrams, L2-normalized rows (SparseRows, n x dim)."""
+    indptr, indices, counts = [0], [], []
+    for tokens in token_lists:
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        row = Counter(zlib.crc32(f.encode('utf-8')) % dim for f in features)
+        indices.extend(row)
+        counts.extend(row.values())
+        indptr.append(len(indices))
+    indptr = np.array(indptr, dtype=np.int64)
+    indices = np.array(indices, dtype=np.int64)
+    df = np.bincount(indices, minlength=dim)
+    idf = (np.log((1 + len(token_lists)) / (1 + df)) + 1).astype(np.float32)
+    data = np.log1p(np.array(counts, dtype=np.float32)) * idf[indices]
+    X = SparseRows(indptr, indices, data, dim)
+    norms = np.sqrt(np.bincount(X.row_ids, weights=data ** 2, minlength=len(X)))
+    X.data = (data / np.maximum(norms, 1e-9)[X.row_ids]).astype(np.float32)
+    return X
+
+def kmeans(X, k, iterations=25, seed=0):
+    """Spherical k-means (cosine) with k-means++ seeding. Returns (labels, unit centroids)."""
+    rng = np.random.RandomState(seed)
+    n = len(X)
+    centroids = np.empty((k, X.shape[1]), dtype=np.float32)
+    centroids[0] = X[rng.randint(n)]
+    dist = 1 - X @ centroids[0]
+    for j in range(1, k):
+        weights = np.maximum(dist, 0) ** 2
+        total = weights.sum()
+        centroids[j] = X[rng.choice(n, p=weights / total) if total > 0 else rng.randint(n)]
+        dist = np.minimum(dist, 1 - X @ centroids[j])
+
+    labels = None
+    for _ in range(iterations):
+        new_labels = np.argmax(X @ centroids.T, axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        onehot = np.zeros((k, n), dtype=np.float32)
+        onehot[labels, np.arange(n)] = 1
+        sums = onehot @ X
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        sums[empty] = X[rng.randint(n, size=int(empty.sum()))].toarray() # Reseed empty clusters
+        norms[empty] = 1
+        centroids = sums / norms
+    return labels, centroids
+
+def summarize_clusters(gaps, token_lists, X, labels, centroids, top):
+    """Compact evidence for the `top` clusters that affect the most distinct articles."""
+    members = {}
+    for i, label in enumerate(labels):
+        members.setdefault(int(label), []).append(i)
+    ranked = sorted(members.items(), key=lambda item: -len({gaps[i][0] for i in item[1]}))
+
+    summaries = []
+    for rank, (label, idx) in enumerate(ranked[:top], start=1):
+        idx = np.array(idx)
+        closeness = X[idx] @ centroids[label]
+        central = idx[np.argsort(-closeness)]
+        sample_gaps, seen = [], set()
+        for i in central:
+            if gaps[i][3].lower() not in seen:
+                seen.add(gaps[i][3].lower())
+                sample_gaps.append(gaps[i][3])
+            if len(sample_gaps) == 5:
+                break
+        titles = list(dict.fromkeys(gaps[i][1] for i in central))[:3]
+        terms = Counter(t for i in idx for t in set(token_lists[i]))
+        categories = Counter(gaps[i][2] for i in idx)
+        summaries.append({
+            'id': rank,
+            'articles': len({gaps[i][0] for i in idx}),
+            'categories': [name for name, _ in categories.most_common(3)],
+            'terms': [term for term, _ in terms.most_common(8)],
+            'titles': titles,
+            'gaps': sample_gaps
+        })
+    return summaries
+
+def local_insight(summary, rank, total):
+    """Fallback when the LLM gave nothing usable for a cluster: built from the evidence alone."""
+    priority = "High" if rank <= total / 3 else "Medium" if rank <= 2 * total / 3 else "Low"
+    return {
+        'description': summary['gaps'][0],
+        'priority': priority,
+        'suggested_title': ", ".join(summary['terms'][:3]).title(),
+        'rationale': f"Raised in {summary['articles']} articles, mostly in {', '.join(summary['categories'])}."
+    }
+
+def generate_insights(top=config.INSIGHT_TOP_CLUSTERS):
+    print("Step 4: Strategic Gap Analysis")
+
+    Session = database.init_db()
+    session = Session()
+
+    with metrics.timer('insights_stage_seconds', step='load'):
+        gaps = load_gaps(session)
+    print(f"Loaded {len(gaps)} gaps from analyzed articles.")
+    if not gaps:
+        print("Nothing to summarize. Run Step 2 first.")
+        session.close()
+        return
+
+    with metrics.timer('insights_stage_seconds', step='cluster'):
+        token_lists = [tokenize(gap) for _, _, _, gap in gaps]
+        X = vectorize(token_lists, config.INSIGHT_VECTOR_DIM)
+        k = max(1, min(config.INSIGHT_MAX_CLUSTERS, int(len(gaps) ** 0.5), len(gaps)))
+        labels, centroids = kmeans(X, k)
+        summaries = summarize_clusters(gaps, token_lists, X, labels, centroids, top)
+    print(f"Grouped gaps into {k} clusters; summarizing the top {len(summaries)}.")
+
+    ai = ai_processor.AIProcessor()
+    with metrics.timer('insights_stage_seconds', step='llm'):
+        insights = ai.summarize_gap_clusters(summaries)
+    if len(insights) < len(summaries):
+        print(f"{len(summaries) - len(insights)} clusters fell back to locally generated text.")
+
+    # Rank by priority, then by articles affected; the gap ids follow that order
+    order = {'High': 0, 'Medium': 1, 'Low': 2}
+    rows = []
+    for summary in summaries:
+        insight = insights.get(summary['id']) or local_insight(summary, summary['id'], len(summaries))
+        priority = str(insight.get('priority', '')).strip().title()
+        rows.append((order.get(priority, 1), -summary['articles'], summary, insight,
+                     priority if priority in order else "Medium"))
+    rows.sort(key=lambda row: row[:2])
+
+    session.query(database.GapInsight).delete() # Each run replaces the previous set
+    for n, (_, _, summary, insight, priority) in enumerate(rows, start=1):
+        session.add(database.GapInsight(
+            gap_id=f"GAP-{n:03d}",
+            category=summary['categories'][0],
+            description=str(insight.get('description')),
+            priority=priority,
+            suggested_title=str(insight.get('suggested_title') or ""),
+            rationale=str(insight.get('rationale') or "")
+        ))
+    session.commit()
+    session.close()
+
+    print(f"Saved {len(rows)} strategic insights.")
+    if ai.cache:
+        print(ai.cache.stats())
+    metrics.report('insights')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cluster per-article gaps into ranked strategic insights.")
+    parser.add_argument("--top", type=int, default=config.INSIGHT_TOP_CLUSTERS,
+                        help="Number of insights (largest gap clusters) to generate")
+    args = parser.parse_args()
+    generate_insights(top=args.top)
@@ -3,11 +3,293 @@ import time
 import os
 import json
 import re
-from openai import OpenAI
-from google.api_core import exceptions
+import random
+import threading
+from llm_cache import LLMCache
+import metrics
+
+# Bump whenever the analysis prompt changes so cached results from the old prompt are ignored
+PROMPT_VERSION = "1"
+# Article text beyond this many characters is not sent to the model
+MAX_CONTENT_CHARS = 15000
+BATCH_PROMPT_VERSION = "batch-2"
+CHUNK_PROMPT_VERSION = "chunk-1"
+INSIGHT_PROMPT_VERSION = "insight-2"
+KNOWN_CONTENT_TYPES = ("How-to Guide", "FAQ", "Troubleshooting", "Reference", "Other")
+HOWTO_RE = re.compile(r'^how (to|do i|can i)\b', re.I)
+QUESTION_RE = re.compile(r'^(how|what|why|when|where|which|who|can|does|do|is|are|should)\b|\?$', re.I)
+
+def estimate_tokens(text):
+    """Rough token count (~4 chars/token for English), good enough for budgeting."""
+    return len(text or "") // 4 + 1
+
+def chunk_text(text, max_tokens):
+    """
+    Splits text into chunks of at most ~max_tokens, breaking on line boundaries
+    (the scraper emits one line per block element, so lines are sections/paragraphs).
+    A single line longer than the budget is split on word boundaries.
+    """
+    chunks, current, used = [], [], 0
+    for line in text.split("\n"):
+        pieces = [line]
+        if estimate_tokens(line) > max_tokens:
+            words, pieces, piece = line.split(), [], []
+            for word in words:
+                if piece and estimate_tokens(" ".join(piece + [word])) > max_tokens:
+                    pieces.append(" ".join(piece))
+                    piece = []
+                piece.append(word)
+            if piece:
+                pieces.append(" ".join(piece))
+        for piece in pieces:
+            tokens = estimate_tokens(piece)
+            if current and used + tokens > max_tokens:
+                chunks.append("\n".join(current))
+                current, used = [], 0
+            current.append(piece)
+            used += tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+def _drop_trailing_comma(chars):
+    i = len(chars) - 1
+    while i >= 0 and chars[i].isspace():
+        i -= 1
+    if i >= 0 and chars[i] == ',':
+        del chars[i]
+
+def _close_json(chars, stack, in_string=False):
+    text = "".join(chars) + ('"' if in_string else '')
+    return text.rstrip().rstrip(',').rstrip() + "".join(reversed(stack))
+
+def repair_json(text):
+    """
+    Parses model output as JSON, fixing the usual breakage locally instead of paying for
+    another call: markdown fences or prose around the JSON, trailing commas, and replies cut
+    off mid-way (open strings/arrays/objects are closed; a dangling key or partial value is
+    dropped back to the last complete element). Returns (data, repaired) or raises ValueError.
+    """
+    text = (text or "").strip()
+    fenced = re.search(r'```(?:json)?\s*(.*?)(?:```|$)', text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1).strip()
+    try:
+        return json.loads(text), False
+    except json.JSONDecodeError:
+        pass
+    starts = [i for i in (text.find('{'), text.find('[')) if i >= 0]
+    if not starts:
+        raise ValueError("no JSON object or array in the response")
+
+    # One pass over the text, tracking open brackets and string state. Commas outside
+    # strings are places where everything before them is complete, so the text can be cut
+    # there and closed if the end turns out to be garbage.
+    out, stack, cuts = [], [], []
+    in_string = escape = False
+    for ch in text[min(starts):]:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+            out.append(ch)
+        elif ch in '}]':
+            if not stack or ch != stack[-1]:
+                break
+            _drop_trailing_comma(out)
+            out.append(stack.pop())
+            if not stack:
+                break # Complete top-level value; ignore anything after it
+        elif ch == ',':
+            cuts.append((len(out), list(stack)))
+            out.append(ch)
+        else:
+            out.append(ch)
+
+    candidates = [_close_json(out, stack, in_string)]
+    candidates += [_close_json(out[:n], cut_stack) for n, cut_stack in reversed(cuts[-50:])]
+    for candidate in candidates:
+        try:
+            return json.loads(candidate), True
+        except json.JSONDecodeError:
+            continue
+    raise ValueError("unrecoverable JSON in the response")
+
+def validate_analysis(data):
+    """
+    Checks a parsed analysis object against the expected schema and normalizes it: gap and
+    suggestions become lists, topics_covered a string, content_type one of KNOWN_CONTENT_TYPES
+    ("Other" if unrecognized, "Unknown" if missing). Raises ValueError if it isn't one.
+    """
+    if isinstance(data, list) and len(data) == 1:
+        data = data[0]
+    if not isinstance(data, dict):
+        raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+    if "gap" not in data and "suggestions" not in data:
+        raise ValueError("response has neither 'gap' nor 'suggestions'")
+
+    gaps = data.get("gap") or []
+    gaps = [str(g).strip() for g in (gaps if isinstance(gaps, list) else [gaps]) if str(g).strip()]
+    suggestions = []
+    raw_suggestions = data.get("suggestions") or []
+    for sugg in raw_suggestions if isinstance(raw_suggestions, list) else [raw_suggestions]:
+        if isinstance(sugg, dict):
+            suggestions.append({"topic": str(sugg.get("topic", "")), "description": str(sugg.get("description", ""))})
+        elif str(sugg).strip():
+            suggestions.append({"topic": str(sugg).strip(), "description": ""})
+    topics = data.get("topics_covered") or ""
+    if isinstance(topics, list):
+        topics = ", ".join(str(t) for t in topics)
+    c_type = str(data.get("content_type") or "").strip()
+    known = next((t for t in KNOWN_CONTENT_TYPES if t.lower() == c_type.lower()), None)
+    return dict(data, gap=gaps, suggestions=suggestions, topics_covered=str(topics),
+                content_type=known or ("Other" if c_type else "Unknown"))
+
+DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+
+def parse_duration(value):
+    """Seconds in a rate-limit header or message: '1m53.184s', '7.66s', '250ms', or a plain number."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_RE.findall(value)
+    if not parts:
+        return None
+    scale = {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}
+    return sum(float(n) * scale[unit] for n, unit in parts)
+
+def retry_after_from_message(message):
+    """Fallback for providers that only say 'try again in XmYs' in the error text."""
+    match = re.search(r'try again in ((?:\d+(?:\.\d+)?(?:ms|h|m|s))+)', message or "")
+    return parse_duration(match.group(1)) if match else None
+
+class RateLimitScheduler:
+    """
+    Per-model request/token budgets, learned from x-ratelimit-* response headers.
+    Before each call the first model (in preference order) with budget left is reserved,
+    so requests are routed away from an exhausted model instead of bouncing off a 429.
+    Budgets are spent locally on reservation and corrected from the next response's headers;
+    a model that is rate limited anyway is parked until its retry-after passes.
+    """
+    def __init__(self, models):
+        self.models = list(models)
+        self.lock = threading.Lock()
+        self.budgets = {m: {
+            'requests': None, 'requests_reset': 0.0, # None = unknown, assume capacity
+            'tokens': None, 'tokens_reset': 0.0,
+            'blocked_until': 0.0
+        } for m in self.models}
+
+    def _ready_at(self, budget, tokens, now):
+        """Monotonic time at which this model can take a request of `tokens`."""
+        ready = budget['blocked_until']
+        if budget['requests'] is not None and budget['requests'] < 1 and now < budget['requests_reset']:
+            ready = max(ready, budget['requests_reset'])
+        if budget['tokens'] is not None and budget['tokens'] < tokens and now < budget['tokens_reset']:
+            ready = max(ready, budget['tokens_reset'])
+        return ready
+
+    def reserve(self, tokens, prefer=None):
+        """
+        Returns (model, 0) with its budget reserved, or (None, seconds until one frees up).
+        Models in `prefer` are tried first, in that order, then the rest.
+        """
+        order = [m for m in prefer or () if m in self.budgets]
+        order += [m for m in self.models if m not in order]
+        with self.lock:
+            now = time.monotonic()
+            soonest = None
+            for model in order:
+                budget = self.budgets[model]
+                # Past a reset the provider's window has refilled; forget the stale counts
+                if budget['requests'] is not None and now >= budget['requests_reset']:
+                    budget['requests'] = None
+                if budget['tokens'] is not None and now >= budget['tokens_reset']:
+                    budget['tokens'] = None
+                ready = self._ready_at(budget, tokens, now)
+                if ready <= now:
+                    if budget['requests'] is not None:
+                        budget['requests'] -= 1
+                    if budget['tokens'] is not None:
+                        budget['tokens'] -= tokens
+                    return model, 0
+                soonest = ready if soonest is None else min(soonest, ready)
+            return None, soonest - now
+
+    def update(self, model, headers):
+        """Takes the provider's view of the remaining budget from response headers."""
+        if not headers:
+            return
+        now = time.monotonic()
+        with self.lock:
+            budget = self.budgets[model]
+            for kind in ('requests', 'tokens'):
+                remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+                reset = parse_duration(headers.get(f'x-ratelimit-reset-{kind}'))
+                if remaining is not None and reset is not None:
+                    try:
+                        budget[kind] = float(remaining)
+                    except ValueError:
+                        continue
+                    budget[f'{kind}_reset'] = now + reset
+
+    def block(self, model, seconds):
+        """Parks a model that returned 429 until its limit resets."""
+        with self.lock:
+            budget = self.budgets[model]
+            budget['blocked_until'] = max(budget['blocked_until'], time.monotonic() + seconds)
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for in-flight completions.
+    Each success grows the limit by 1/limit (about +1 per full window), each rate limit
+    halves it. Halving happens at most once per cooldown so a burst of 429s from calls
+    that were already in flight only counts once.
+    """
+    def __init__(self, max_limit, initial=2, min_limit=1, cooldown=5.0):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(max(self.min_limit, min(initial, self.max_limit)))
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.last_backoff = 0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with metrics.timer('ai_queue_wait_seconds'), self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, success=True):
+        with self.cond:
+            self.in_flight -= 1
+            if success:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
+
+    def backoff(self):
+        with self.cond:
+            now = time.time()
+            if now - self.last_backoff >= self.cooldown:
+                self.last_backoff = now
+                self.limit = max(self.min_limit, self.limit / 2)
 
 class AIProcessor:
-    def __init__(self):
+    def __init__(self, use_cache=True):
         # Setup Groq (using the key user pasted in GROK_API_KEY)
         # Check both env vars just in case
         grok_key = os.getenv("GROK_API_KEY") or os.getenv("GROQ_API_KEY")
@@ -21,13 +303,19 @@ class AIProcessor:
             "meta-llama/llama-4-maverick-17b-128e-instruct",
             "meta-llama/llama-4-scout-17b-16e-instruct"
         ]
-        self.model_index = 0
+        self.scheduler = RateLimitScheduler(self.models)
+        self.json_mode_unsupported = set() # Models that rejected response_format
+        self.cache = LLMCache() if use_cache and config.LLM_CACHE_ENABLED else None
+        # Optional callable, invoked whenever the provider reports a rate limit
+        self.on_rate_limit = None
         
         if grok_key:
             try:
+                from openai import OpenAI # Deferred: the SDK takes ~0.5s to import
                 self.client = OpenAI(
                     api_key=grok_key,
-                    base_url="https://api.groq.com/openai/v1",
+                    base_url=config.AI_BASE_URL,
+                    max_retries=0, # Retries and model fallback are scheduled in _complete
                 )
                 print(f"DEBUG: Groq AI configured. Primary model: {self.models[0]}")
             except Exception as e:
@@ -35,68 +323,61 @@ class AIProcessor:
         else:
              print("WARNING: GROK_API_KEY not found. AI will fail.")
 
-    def _clean_json_text(self, text):
-        """Extracts JSON from markdown code blocks or raw text."""
-        # Check for markdown code block
-        match = re.search(r'```json\s*(.*?)\s*```', text, re.DOTALL)
-        if match:
-            return match.group(1)
-        # Check for plain code block
-        match = re.search(r'```\s*(.*?)\s*```', text, re.DOTALL)
-        if match:
-            return match.group(1)
-        return text
-
-    def _format_output(self, raw_json):
-        """Parses JSON and returns formatted text for Excel."""
+    def _parse_json(self, raw_response):
+        """repair_json() with metrics: how often replies parse as-is, need repair, or are lost."""
         try:
-            data = json.loads(raw_json)
-            
-            # Format Gaps
-            gaps = data.get("gap", [])
-            if isinstance(gaps, list):
-                gap_text = "\n".join([f"- {g}" for g in gaps])
-            else:
-                gap_text = str(gaps)
-                
-            # Format Suggestions
-            suggestions = data.get("suggestions", [])
-            if isinstance(suggestions, list):
-                sugg_text = ""
-                for s in suggestions:
-                    topic = s.get("topic", "")
-                    desc = s.get("description", "")
-                    sugg_text += f"**{topic}**\n{desc}\n\n"
-            else:
-                sugg_text = str(suggestions)
-                
-            # Format Topics
-            topics = data.get("topics_covered", "")
-            if isinstance(topics, list):
-                topics = ", ".join(topics)
-                
-            # Format Content Type
-            c_type = data.get("content_type", "Unknown")
-                
-            return gap_text, sugg_text.strip(), topics, c_type
-        except json.JSONDecodeError as e:
-            # print(f"JSON Parse Error: {e}") # Optional: debug
-            return f"Raw Output (Parse Error): {raw_json}", "Parse Error"
-        except Exception as e:
-            return f"Error formatting: {e}", "Error"
+            data, repaired = repair_json(raw_response)
+        except ValueError:
+            metrics.inc('ai_json_outputs_total', outcome='unrecoverable')
+            raise
+        metrics.inc('ai_json_outputs_total', outcome='repaired' if repaired else 'valid')
+        return data
 
-    def analyze_article(self, title, content):
+    def _format_output(self, raw_json):
         """
-        Analyzes a single article using Groq.
+        Parses, repairs and validates a single-article reply and returns the formatted
+        (gaps, suggestions, topics, content type) text for Excel.
+        Raises ValueError when the reply is unrecoverable, so the article is marked as an error
+        and retried on a later run.
         """
-        if not self.client:
-            return {"gap": "No AI Configured", "suggestions": ""}
-        
-        prompt = f"""
+        return self._format_data(validate_analysis(self._parse_json(raw_json)))
+
+    def _format_data(self, data):
+        """Formats one parsed analysis object into (gaps, suggestions, topics, content type) text."""
+        # Format Gaps
+        gaps = data.get("gap", [])
+        if isinstance(gaps, list):
+            gap_text = "\n".join([f"- {g}" for g in gaps])
+        else:
+            gap_text = str(gaps)
+            
+        # Format Suggestions
+        suggestions = data.get("suggestions", [])
+        if isinstance(suggestions, list):
+            sugg_text = ""
+            for s in suggestions:
+                topic = s.get("topic", "")
+                desc = s.get("description", "")
+                sugg_text += f"**{topic}**\n{desc}\n\n"
+        else:
+            sugg_text = str(suggestions)
+            
+        # Format Topics
+        topics = data.get("topics_covered", "")
+        if isinstance(topics, list):
+            topics = ", ".join(topics)
+            
+        # Format Content Type
+        c_type = data.get("content_type", "Unknown")
+            
+        return gap_text, sugg_text.strip(), topics, c_type
+
+    def _build_prompt(self, title, snippet):
+        return f"""
         You are a content strategist. Analyze the following help center article.
         
         Title: {title}
-        Content Snippet: {content[:15000]}
+        Content Snippet: {snippet}
         
         Identify:
         1. Gaps (missing information based on the title and context).
@@ -116,76 +397,500 @@ class AIProcessor:
         }}
         """
 
+    def _send(self, model, prompt):
+        """One chat completion. Returns (text, response headers or None, usage or None)."""
+        request = {
+            'model': model,
+            'messages': [
+                {"role": "system", "content": "You are a helpful assistant that outputs strict JSON."},
+                {"role": "user", "content": prompt}
+            ]
+        }
+        if config.AI_JSON_MODE and model not in self.json_mode_unsupported:
+            # Structured output: the provider guarantees a syntactically valid JSON object
+            request['response_format'] = {"type": "json_object"}
+        completions = self.client.chat.completions
+        raw_api = getattr(completions, 'with_raw_response', None)
+        if raw_api is None:
+            completion = completions.create(**request)
+            headers = None
+        else:
+            raw = raw_api.create(**request)
+            completion, headers = raw.parse(), raw.headers
+        return completion.choices[0].message.content, headers, getattr(completion, 'usage', None)
+
+    def _retry_delay(self, attempt, hint=None):
+        """Provider's retry-after when known, else capped exponential backoff; always jittered."""
+        delay = hint if hint is not None else min(config.AI_RETRY_MAX_DELAY, config.AI_RETRY_BASE_DELAY * 2 ** attempt)
+        return delay * random.uniform(1.0, 1.0 + config.AI_RETRY_JITTER)
+
+    @staticmethod
+    def failure_kind(e):
+        """'rate_limited', 'transient' (timeouts, connection errors, 5xx) or None if retrying won't help."""
+        import openai
+        if isinstance(e, openai.RateLimitError) or "rate_limit_exceeded" in str(e).lower():
+            return 'rate_limited'
+        if isinstance(e, (openai.APIConnectionError, openai.InternalServerError)):
+            return 'transient'
+        return None
+
+    def _complete(self, prompt, models=None):
+        """
+        Sends one prompt and returns (raw response text, model that answered).
+        The scheduler picks the first model with request/token budget left, in the order of
+        `models` (a route from route(); default: self.models), so a model that
+        is out of quota is skipped without a round trip. Rate limits park the model and
+        retry on another; timeouts, connection and 5xx errors retry with jittered backoff.
+        Each model gets AI_MAX_RETRIES rate-limit retries and the prompt AI_MAX_RETRIES
+        transient ones; past that, or after AI_MAX_WAIT_SECONDS waiting for budget, the
+        error is raised. Any other error is raised immediately.
+        """
+        import openai # Already loaded by __init__ when a client exists
+        tokens = estimate_tokens(prompt) + config.AI_COMPLETION_TOKENS_ESTIMATE
+        waited = 0.0
+        retries = {'rate_limited': 0, 'transient': 0}
+        limits = {'rate_limited': config.AI_MAX_RETRIES * len(self.models), 'transient': config.AI_MAX_RETRIES}
+        while True:
+            model, wait = self.scheduler.reserve(tokens, models)
+            if model is None:
+                if waited >= config.AI_MAX_WAIT_SECONDS:
+                    raise RuntimeError(f"rate_limit_exceeded on all models; gave up after waiting {waited:.0f}s")
+                wait = self._retry_delay(0, min(wait, config.AI_RETRY_MAX_DELAY))
+                print(f"All models out of budget. Waiting {wait:.1f}s for the next rate limit reset...")
+                metrics.inc('ai_rate_limit_sleep_seconds_total', wait)
+                time.sleep(wait)
+                waited += wait
+                continue
+
+            if model != (models or self.models)[0]:
+                # Preferred model out of budget; the choice stays local to this call
+                metrics.inc('ai_fallback_switches_total', to_model=model)
+
+            start_t = time.perf_counter()
+            try:
+                text, headers, usage = self._send(model, prompt)
+            except Exception as e:
+                metrics.observe('ai_request_seconds', time.perf_counter() - start_t, model=model)
+                response = getattr(e, 'response', None)
+                headers = getattr(response, 'headers', None)
+                self.scheduler.update(model, headers)
+                if (isinstance(e, openai.BadRequestError) and 'response_format' in str(e)
+                        and model not in self.json_mode_unsupported):
+                    print(f"{model} does not support JSON mode; asking it for plain text instead.")
+                    self.json_mode_unsupported.add(model)
+                    continue
+                kind = self.failure_kind(e)
+                rate_limited = kind == 'rate_limited'
+                metrics.inc('ai_requests_total', model=model, outcome='rate_limited' if rate_limited else 'error')
+                if kind is None or retries[kind] >= limits[kind]:
+                    raise
+                retries[kind] += 1
+                metrics.inc('ai_retries_total', model=model, reason=kind)
+                if rate_limited:
+                    hint = parse_duration(headers.get('retry-after')) if headers else None
+                    if hint is None:
+                        hint = retry_after_from_message(str(e))
+                    delay = self._retry_delay(retries[kind] // len(self.models), hint)
+                    print(f"Rate Limit Hit on {model}; parking it for {delay:.1f}s")
+                    self.scheduler.block(model, delay)
+                    if self.on_rate_limit:
+                        self.on_rate_limit()
+                else:
+                    delay = self._retry_delay(retries[kind])
+                    print(f"Transient error on {model} ({e}); retrying in {delay:.1f}s "
+                          f"({retries[kind]}/{limits[kind]})")
+                    time.sleep(delay)
+                continue
+
+            metrics.observe('ai_request_seconds', time.perf_counter() - start_t, model=model)
+            metrics.inc('ai_requests_total', model=model, outcome='ok')
+            self.scheduler.update(model, headers)
+            if usage:
+                metrics.inc('ai_prompt_tokens_total', usage.prompt_tokens or 0, model=model)
+                metrics.inc('ai_completion_tokens_total', usage.completion_tokens or 0, model=model)
+            return text, model
+
+    @staticmethod
+    def guess_type(title, content_type=None):
+        """The known content type, else a guess from the title ("How to ..." or a question), else None."""
+        if content_type in KNOWN_CONTENT_TYPES:
+            return content_type
+        title = (title or "").strip()
+        return "How-to Guide" if HOWTO_RE.search(title) else "FAQ" if QUESTION_RE.search(title) else None
+
+    def route(self, title, content, content_type=None, word_count=None):
+        """
+        Models to prefer for one request, from config.MODEL_ROUTES: the first rule whose word
+        limit and content types match wins, so short FAQs go to a small fast model and long
+        reference pages to the large one. content_type is the type from an earlier analysis;
+        without one it is guessed from the title ("How to ..." or a question). Unmatched requests prefer the
+        primary model. The scheduler still falls back to any model with budget left.
+        """
+        if not config.MODEL_ROUTING:
+            return list(self.models)
+        words = word_count if word_count is not None else len((content or "").split())
+        content_type = self.guess_type(title, content_type)
+        for max_words, types, models in config.MODEL_ROUTES:
+            if words <= max_words and (types is None or content_type in types):
+                preferred = [m for m in models if m in self.models]
+                return preferred + [m for m in self.models if m not in preferred]
+        return list(self.models)
+
+    def analyze_article(self, title, content, content_type=None, cache_checked=False):
+        """
+        Analyzes a single article using Groq, on the model route() picks for it
+        (content_type: the article's type from a previous analysis, if any).
+        Results for identical input are served from the on-disk cache without a network call.
+        Articles longer than the token budget are split and analyzed chunk by chunk.
+        The result's "model" says which model produced it. cache_checked=True skips the cache
+        lookup when the caller has just made it (the result is still stored).
+        """
+        content = content or ""
+        if estimate_tokens(content) > config.LONG_ARTICLE_TOKENS:
+            return self.analyze_long_article(title, content)
+        
+        snippet = content[:MAX_CONTENT_CHARS]
+        models = self.route(title, snippet, content_type)
+        current_model = models[0]
+        cache_key = None
+        if self.cache:
+            cache_key = LLMCache.make_key(current_model, PROMPT_VERSION, title, snippet)
+            cached = None if cache_checked else self.cache.get(cache_key)
+            if cached:
+                return cached
+        
+        if not self.client:
+            return {"gap": "No AI Configured", "suggestions": ""}
+        
+        prompt = self._build_prompt(title, snippet)
+
         try:
-            current_model = self.models[self.model_index]
-            # print(f"Analyzing: {title} using {current_model}...") # Debug
-            
-            completion = self.client.chat.completions.create(
-                model=current_model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that outputs strict JSON."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            raw_response = completion.choices[0].message.content
+            raw_response, model = self._complete(prompt, models)
                 
-            # Clean and parse
-            json_text = self._clean_json_text(raw_response)
-            gap_text, sugg_text, topics, c_type = self._format_output(json_text)
+            # Parse, repair and validate locally; only unrecoverable replies become errors
+            gap_text, sugg_text, topics, c_type = self._format_output(raw_response)
             
-            return {
+            result = {
                 "gap": gap_text,
                 "suggestions": sugg_text,
                 "topics": topics,
-                "type": c_type
+                "type": c_type,
+                "model": model
             }
+            if cache_key:
+                self.cache.put(cache_key, current_model, PROMPT_VERSION, result)
+            return result
             
         except Exception as e:
-            error_msg = str(e)
-            if "rate_limit_exceeded" in error_msg.lower():
-                 print(f"Rate Limit Hit on {self.models[self.model_index]}: {error_msg}")
-                 
-                 # Switch to next model
-                 old_index = self.model_index
-                 self.model_index = (self.model_index + 1) % len(self.models)
-                 
-                 if self.model_index != 0:
-                     print(f"Switching fallback model: {self.models[old_index]} -> {self.models[self.model_index]}")
-                     # Immediate retry with new model
-                     return self.analyze_article(title, content)
-                 
-                 # If we wrapped back to 0, we've exhausted all models. Now sleep.
-                 print("All available models exhausted. Waiting for rate limits to reset...")
-                 
-                 # Try to extract wait time
-                 wait_time = 60 # Default
-                 import re
-                 # Look for "try again in Xs" or "try again in XmYs"
-                 # Example: "in 1m53.184s"
-                 
-                 # Regex for minutes/seconds
-                 match = re.search(r'in (\d+)m(\d+\.?\d*)s', error_msg)
-                 if match:
-                     minutes = int(match.group(1))
-                     seconds = float(match.group(2))
-                     wait_time = (minutes * 60) + seconds + 5 # Add buffer
-                     
-                 else:
-                     # Check for just seconds
-                     match_s = re.search(r'in (\d+\.?\d*)s', error_msg)
-                     if match_s:
-                         wait_time = float(match_s.group(1)) + 5
-               
-                 print(f"Sleeping for {wait_time:.2f} seconds before restarting from primary model...")
-                 time.sleep(wait_time)
-                 
-                 # Retry recursively (will start from model_index 0)
-                 return self.analyze_article(title, content)
-                 
             print(f"AI Failure: {e}")
-            return {
-                "gap": f"Error: {e}",
-                "suggestions": "Error",
-                "topics": "Error",
-                "type": "Error"
-            }
+            return self._error_result(e)
+
+    def _error_result(self, e):
+        return {
+            "gap": f"Error: {e}",
+            "suggestions": "Error",
+            "topics": "Error",
+            "type": "Error"
+        }
+
+    def _build_chunk_prompt(self, title, chunk, part, parts):
+        return f"""
+        You are a content strategist. The following is part {part} of {parts} of a long help center article.
+        Only flag gaps that this part's subject matter should cover; other parts are analyzed separately.
+        
+        Title: {title}
+        Content (part {part}/{parts}): {chunk}
+        
+        Identify:
+        1. Gaps (missing information based on the title and context).
+        2. Suggestions (related topics or articles that should be created).
+        3. Topics Covered (comma-separated keywords).
+        4. Content Type of the whole article (One of: "How-to Guide", "FAQ", "Troubleshooting", "Reference", "Other").
+        
+        Return STRICT JSON format only:
+        {{
+          "gap": ["gap 1", "gap 2", ...],
+          "suggestions": [
+             {{"topic": "Topic Name", "description": "Why this is needed..."}},
+             ...
+          ],
+          "topics_covered": "Topic 1, Topic 2, ...",
+          "content_type": "Type"
+        }}
+        """
+
+    def _analyze_chunk(self, title, chunk, part, parts):
+        """Map step: returns the parsed JSON object for one chunk (plus "model"), or None if it failed."""
+        models = self.route(title, chunk, "Reference")
+        current_model = models[0]
+        cache_key = None
+        if self.cache:
+            cache_key = LLMCache.make_key(current_model, CHUNK_PROMPT_VERSION, title, f"{part}/{parts}\x00{chunk}")
+            cached = self.cache.get(cache_key)
+            if cached:
+                return cached
+        try:
+            raw_response, model = self._complete(self._build_chunk_prompt(title, chunk, part, parts), models)
+            data = validate_analysis(self._parse_json(raw_response))
+            data["model"] = model
+        except Exception as e:
+            print(f"AI Failure on part {part}/{parts} of '{title}': {e}")
+            return None
+        if cache_key:
+            self.cache.put(cache_key, current_model, CHUNK_PROMPT_VERSION, data)
+        return data
+
+    def _reduce_chunks(self, parts, weights):
+        """Reduce step: merges per-chunk objects into one object of the single-article shape."""
+        gaps, gap_seen = [], set()
+        suggestions, sugg_seen = [], set()
+        topics, topic_seen = [], set()
+        votes = {}
+        for data, weight in zip(parts, weights):
+            chunk_gaps = data.get("gap", [])
+            for g in chunk_gaps if isinstance(chunk_gaps, list) else [chunk_gaps]:
+                if str(g).strip().lower() not in gap_seen:
+                    gap_seen.add(str(g).strip().lower())
+                    gaps.append(g)
+            chunk_sugg = data.get("suggestions", [])
+            for sugg in chunk_sugg if isinstance(chunk_sugg, list) else []:
+                key = str(sugg.get("topic", "")).strip().lower() if isinstance(sugg, dict) else ""
+                if key and key not in sugg_seen:
+                    sugg_seen.add(key)
+                    suggestions.append(sugg)
+            chunk_topics = data.get("topics_covered", "")
+            if not isinstance(chunk_topics, list):
+                chunk_topics = str(chunk_topics).split(",")
+            for t in chunk_topics:
+                t = str(t).strip()
+                if t and t.lower() not in topic_seen:
+                    topic_seen.add(t.lower())
+                    topics.append(t)
+            # Longer chunks get a bigger say in the article's content type
+            c_type = data.get("content_type")
+            if c_type:
+                votes[c_type] = votes.get(c_type, 0) + weight
+        return {
+            "gap": gaps,
+            "suggestions": suggestions,
+            "topics_covered": ", ".join(topics),
+            "content_type": max(votes, key=votes.get) if votes else "Unknown"
+        }
+
+    def analyze_long_article(self, title, content):
+        """
+        Map-reduce analysis for articles over the token budget: the text is split on line
+        boundaries, chunks are analyzed one after another and the results merged locally.
+        The chunks run inside the caller's concurrency slot, so a long article never puts
+        more requests in flight than the AdaptiveLimiter allowed. If any chunk fails the
+        article is an error (and retried later); chunks that succeeded are cached meanwhile.
+        """
+        if not self.client:
+            return {"gap": "No AI Configured", "suggestions": ""}
+        chunks = chunk_text(content, config.CHUNK_TOKENS)
+        print(f"Long article '{title}': analyzing {len(chunks)} chunks")
+        parts = [self._analyze_chunk(title, chunk, i + 1, len(chunks)) for i, chunk in enumerate(chunks)]
+        failed = sum(data is None for data in parts)
+        if failed:
+            return self._error_result(f"{failed} of {len(chunks)} chunks failed")
+        gap_text, sugg_text, topics, c_type = self._format_data(
+            self._reduce_chunks(parts, [estimate_tokens(chunk) for chunk in chunks]))
+        return {
+            "gap": gap_text,
+            "suggestions": sugg_text,
+            "topics": topics,
+            "type": c_type,
+            "model": ", ".join(sorted({data.get("model") for data in parts if data.get("model")}))
+        }
+
+    def _build_batch_prompt(self, items):
+        articles = "\n\n".join(
+            f"### Article id={art_id}\nTitle: {title}\nContent Snippet: {snippet}"
+            for art_id, title, snippet in items
+        )
+        return f"""
+        You are a content strategist. Analyze EACH of the following help center articles independently.
+        
+        For each article identify:
+        1. Gaps (missing information based on the title and context).
+        2. Suggestions (related topics or articles that should be created).
+        3. Topics Covered (comma-separated keywords).
+        4. Content Type (One of: "How-to Guide", "FAQ", "Troubleshooting", "Reference", "Other").
+        
+        Return STRICT JSON format only: an object whose "results" array has exactly one object per article, using its id:
+        {{"results": [
+          {{
+            "id": 123,
+            "gap": ["gap 1", "gap 2", ...],
+            "suggestions": [
+               {{"topic": "Topic Name", "description": "Why this is needed..."}},
+               ...
+            ],
+            "topics_covered": "Topic 1, Topic 2, ...",
+            "content_type": "Type"
+          }},
+          ...
+        ]}}
+        
+        {articles}
+        """
+
+    def plan_batches(self, items, token_budget=None, max_articles=None):
+        """
+        Groups (id, title, content, content_type) items into batches whose snippets fit the token budget.
+        Articles too large to share a request (including long ones that get chunked)
+        end up alone in their own batch.
+        """
+        token_budget = token_budget or config.BATCH_TOKEN_BUDGET
+        max_articles = max_articles or config.BATCH_MAX_ARTICLES
+        batches, current, used = [], [], 0
+        for item in items:
+            if estimate_tokens(item[2]) > config.LONG_ARTICLE_TOKENS:
+                batches.append([item])
+                continue
+            tokens = estimate_tokens((item[2] or "")[:MAX_CONTENT_CHARS]) + estimate_tokens(item[1])
+            if current and (used + tokens > token_budget or len(current) >= max_articles):
+                batches.append(current)
+                current, used = [], 0
+            current.append(item)
+            used += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _parse_batch(self, raw_response):
+        """
+        Returns {str(id): parsed object} for every entry in a batch response. A truncated
+        reply is repaired, so the entries before the cut are kept.
+        """
+        try:
+            data = self._parse_json(raw_response)
+        except ValueError:
+            return {}
+        if isinstance(data, dict):
+            # Tolerate {"results": [...]} or {"12": {...}, ...}
+            data = data.get("results") or [dict(v, id=k) for k, v in data.items() if isinstance(v, dict)]
+        parsed = {}
+        for entry in data if isinstance(data, list) else []:
+            if isinstance(entry, dict) and "id" in entry:
+                parsed[str(entry["id"])] = entry
+        return parsed
+
+    def analyze_batch(self, items):
+        """
+        Analyzes several (id, title, content, content_type) articles in one request, routed
+        like the longest of them. Returns {id: result}. Entries that are missing or fail to
+        parse fall back to single-article calls, as does a batch the provider rejects outright.
+        A batch that fails on rate limits or transport errors is not retried article by article
+        (that would multiply requests while the provider pushes back): its articles are left out
+        of the result for the caller to re-queue.
+        """
+        results = {}
+        todo = []
+        for art_id, title, content, content_type in items:
+            snippet = (content or "")[:MAX_CONTENT_CHARS]
+            key = None
+            if self.cache:
+                # A single-article result is just as good as a batched one
+                current_model = self.route(title, snippet, content_type)[0]
+                key = (current_model, LLMCache.make_key(current_model, BATCH_PROMPT_VERSION, title, snippet))
+                cached = self.cache.get(LLMCache.make_key(current_model, PROMPT_VERSION, title, snippet), key[1])
+                if cached:
+                    results[art_id] = cached
+                    continue
+            todo.append((art_id, title, content, content_type, snippet, key))
+
+        if len(todo) == 1 or (todo and not self.client):
+            for art_id, title, content, content_type, _, key in todo:
+                results[art_id] = self.analyze_article(title, content, content_type, cache_checked=key is not None)
+            return results
+
+        parsed, model = {}, None
+        if todo:
+            prompt = self._build_batch_prompt([(art_id, title, snippet) for art_id, title, _, _, snippet, _ in todo])
+            types = {self.guess_type(title, content_type) for _, title, _, content_type, _, _ in todo}
+            models = self.route("", "", types.pop() if len(types) == 1 else None,
+                                word_count=max(len(snippet.split()) for *_, snippet, _ in todo))
+            try:
+                raw_response, model = self._complete(prompt, models)
+                parsed = self._parse_batch(raw_response)
+            except Exception as e:
+                if self.failure_kind(e):
+                    print(f"Batch of {len(todo)} failed ({e}); leaving it to be re-queued.")
+                    return results
+                print(f"Batch of {len(todo)} failed ({e}); falling back to single-article calls.")
+
+        for art_id, title, content, content_type, _, key in todo:
+            entry = parsed.get(str(art_id))
+            if entry is not None:
+                try:
+                    gap_text, sugg_text, topics, c_type = self._format_data(validate_analysis(entry))
+                    result = {"gap": gap_text, "suggestions": sugg_text, "topics": topics, "type": c_type,
+                              "model": model}
+                    if key:
+                        self.cache.put(key[1], key[0], BATCH_PROMPT_VERSION, result)
+                    results[art_id] = result
+                    continue
+                except Exception:
+                    pass
+            results[art_id] = self.analyze_article(title, content, content_type, cache_checked=key is not None)
+        return results
+
+    def _build_insight_prompt(self, summaries):
+        clusters = "\n\n".join(
+            f"### Cluster id={c['id']}\n"
+            f"Articles affected: {c['articles']}\n"
+            f"Main categories: {', '.join(c['categories'])}\n"
+            f"Key terms: {', '.join(c['terms'])}\n"
+            f"Example articles: {'; '.join(c['titles'])}\n"
+            f"Representative gaps:\n" + "\n".join(f"- {g}" for g in c['gaps'])
+            for c in summaries
+        )
+        return f"""
+        You are a content strategist reviewing a help center's documentation as a whole.
+        Each cluster below groups similar gaps that were flagged across many individual articles.
+        
+        For EACH cluster write one strategic insight:
+        1. Description (one or two sentences naming the underlying documentation gap).
+        2. Priority (One of: "High", "Medium", "Low"), weighing how many articles are affected and the user impact.
+        3. Suggested Title for a new or consolidated article that would close the gap.
+        4. Rationale (why it matters, citing the evidence given).
+        
+        Return STRICT JSON format only: an object whose "results" array has exactly one object per cluster, using its id:
+        {{"results": [
+          {{"id": 1, "description": "...", "priority": "High", "suggested_title": "...", "rationale": "..."}},
+          ...
+        ]}}
+        
+        {clusters}
+        """
+
+    def summarize_gap_clusters(self, summaries, per_prompt=None):
+        """
+        Turns compact gap-cluster summaries into {id: insight object}, a few clusters per
+        request, so the prompt size depends on the number of clusters and never on the corpus.
+        Clusters whose entry is missing or malformed are left out; callers fall back to local text.
+        """
+        per_prompt = per_prompt or config.INSIGHT_CLUSTERS_PER_PROMPT
+        insights = {}
+        if not self.client:
+            return insights
+        for start in range(0, len(summaries), per_prompt):
+            group = summaries[start:start + per_prompt]
+            prompt = self._build_insight_prompt(group)
+            current_model = self.models[0] # Fixed, so the cache key never depends on other threads
+            key = LLMCache.make_key(current_model, INSIGHT_PROMPT_VERSION, "", prompt) if self.cache else None
+            parsed = self.cache.get(key) if key else None
+            if not parsed:
+                try:
+                    parsed = self._parse_batch(self._complete(prompt)[0])
+                except Exception as e:
+                    print(f"AI Failure on {len(group)} gap clusters: {e}")
+                    continue
+                if key and parsed:
+                    self.cache.put(key, current_model, INSIGHT_PROMPT_VERSION, parsed)
+            for c in group:
+                entry = parsed.get(str(c['id']))
+                if isinstance(entry, dict) and entry.get("description"):
+                    insights[c['id']] = entry
+        return insights
@@ -0,0 +1,495 @@
+"""
+Offline benchmark for the three pipeline stages.
+
+Serves a synthetic help center and an OpenAI-compatible mock completion endpoint on
+localhost, then runs collect -> analyze -> report against them in a scratch directory.
+Each stage runs in its own subprocess so its peak RSS is measured on its own.
+
+    python benchmark.py --categories 10 --articles 50 --latency 0.05 --llm-latency 0.3
+    python benchmark.py --llm-rpm 120 --llm-malformed 0.05 --error-rate 0.02 --json out.json
+    python benchmark.py --check-parsers    # golden parity + speed of the HTML backends
+    python benchmark.py --check-imports    # CLI startup time and lazy heavy imports
+"""
+import argparse
+import hashlib
+import http.server
+import importlib
+import json
+import os
+import random
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+
+WORDS = ("board project review feedback issue task screenshot comment annotate share "
+         "export report integration workflow team member admin setting browser extension "
+         "upload file version compare status priority assign notify email login account").split()
+
+# --- Synthetic help center ------------------------------------------------------------
+
+class HelpCenter:
+    def __init__(self, categories, articles, words, latency, error_rate, seed=0):
+        self.categories = categories
+        self.articles = articles
+        self.words = words
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def article_body(self, art_id):
+        rng = random.Random(art_id)
+        paragraphs = []
+        remaining = max(1, int(rng.gauss(self.words, self.words / 4)))
+        while remaining > 0:
+            n = min(remaining, rng.randint(20, 80))
+            paragraphs.append(f"<p>{' '.join(rng.choice(WORDS) for _ in range(n))}.</p>")
+            remaining -= n
+        img = '<img src="/static/shot.png">' if art_id % 3 == 0 else ''
+        return (f"<nav><a href='/'>Home</a></nav><article><h1>Article {art_id}</h1>"
+                f"<h2>Overview</h2>{''.join(paragraphs)}{img}</article><footer>footer</footer>")
+
+    def render(self, path, base=''):
+        """Returns (status, body) for a path; base is the absolute site URL sitemaps link to."""
+        if path == '/sitemap.xml':
+            return 200, ('<?xml version="1.0" encoding="UTF-8"?>'
+                         '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                         f'<sitemap><loc>{base}/sitemap-articles.xml</loc></sitemap></sitemapindex>')
+        if path == '/sitemap-articles.xml':
+            urls = ''.join(
+                f'<url><loc>{base}/article/{c * self.articles + a}-how-to-{c}-{a}</loc>'
+                f'<lastmod>2024-01-01</lastmod></url>'
+                for c in range(self.categories) for a in range(self.articles)
+            )
+            return 200, ('<?xml version="1.0" encoding="UTF-8"?>'
+                         f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>')
+        if path == '/':
+            cats = ''.join(
+                f'<a class="category" href="/collection/{c}-category-{c}"><h3>Category {c}</h3>'
+                f'<p class="article-count"><span>{self.articles} articles</span></p></a>'
+                for c in range(self.categories)
+            )
+            return 200, f"<html><body>{cats}</body></html>"
+        match = re.match(r'^/collection/(\d+)-', path)
+        if match:
+            c = int(match.group(1))
+            links = ''.join(
+                f'<li><a href="/article/{c * self.articles + a}-how-to-{c}-{a}">How to {c}-{a}</a></li>'
+                for a in range(self.articles)
+            )
+            return 200, f"<html><body><ul>{links}</ul></body></html>"
+        match = re.match(r'^/article/(\d+)-', path)
+        if match:
+            return 200, f"<html><body>{self.article_body(int(match.group(1)))}</body></html>"
+        return 404, "not found"
+
+    def handler(self):
+        site = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with site.lock:
+                    site.requests += 1
+                    throttled = site.rng.random() < site.error_rate
+                time.sleep(site.latency)
+                if throttled:
+                    self.send_response(429)
+                    self.end_headers()
+                    return
+                status, body = site.render(self.path, f"http://{self.headers.get('Host')}")
+                payload = body.encode()
+                etag = '"%s"' % hashlib.md5(payload).hexdigest()
+                if status == 200 and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(status)
+                kind = 'application/xml' if self.path.endswith('.xml') else 'text/html'
+                self.send_header('Content-Type', f'{kind}; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+# --- Mock OpenAI-compatible completion endpoint ---------------------------------------
+
+class MockLLM:
+    def __init__(self, latency, rpm, malformed_rate, seed=0):
+        self.latency = latency
+        self.rpm = rpm
+        self.malformed_rate = malformed_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.windows = {}
+        self.by_model = {}
+        self.requests = 0
+        self.rate_limited = 0
+
+    def admit(self, model):
+        """
+        Sliding one-minute window per model, like Groq's per-model limits.
+        Returns (seconds to wait or 0 if admitted, x-ratelimit-* headers).
+        """
+        with self.lock:
+            self.requests += 1
+            self.by_model[model] = self.by_model.get(model, 0) + 1
+            now = time.time()
+            window = self.windows[model] = [t for t in self.windows.get(model, []) if now - t < 60]
+            wait = 0
+            if self.rpm and len(window) >= self.rpm:
+                self.rate_limited += 1
+                wait = 60 - (now - window[0])
+            else:
+                window.append(now)
+            if not self.rpm:
+                return wait, {}
+            reset = 60 - (now - window[0]) if window else 0
+            return wait, {'x-ratelimit-limit-requests': str(self.rpm),
+                          'x-ratelimit-remaining-requests': str(max(0, self.rpm - len(window))),
+                          'x-ratelimit-reset-requests': f"{reset:.3f}s"}
+
+    @staticmethod
+    def analysis(art_id=None):
+        data = {
+            "gap": ["Missing troubleshooting steps", "No screenshots of settings"],
+            "suggestions": [{"topic": "Advanced setup", "description": "Users ask about it often."}],
+            "topics_covered": "setup, configuration",
+            "content_type": "How-to Guide"
+        }
+        if art_id is not None:
+            data["id"] = art_id
+        return data
+
+    def handler(self):
+        llm = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body, headers=None):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                wait, limit_headers = llm.admit(request.get('model'))
+                if wait:
+                    self.reply(429, {"error": {
+                        "message": f"Rate limit reached for model `{request.get('model')}`. Please try again in {wait:.3f}s.",
+                        "type": "requests", "code": "rate_limit_exceeded"
+                    }}, dict(limit_headers, **{'retry-after': str(int(wait) + 1)}))
+                    return
+                time.sleep(llm.latency)
+                prompt = request.get('messages', [{}])[-1].get('content', '')
+                ids = re.findall(r'Article id=(\d+)', prompt)
+                if ids:
+                    content = json.dumps({"results": [llm.analysis(int(i)) for i in ids]})
+                else:
+                    content = json.dumps(llm.analysis())
+                with llm.lock:
+                    malformed = llm.rng.random() < llm.malformed_rate
+                if malformed:
+                    content = content[:len(content) // 2]
+                prompt_tokens = len(prompt) // 4
+                completion_tokens = len(content) // 4
+                self.reply(200, {
+                    "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()),
+                    "model": request.get('model'),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": f"```json\n{content}\n```"}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens}
+                }, limit_headers)
+
+        return Handler
+
+def serve(handler):
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+# --- HTML parser parity ---------------------------------------------------------------
+
+# Edge cases the fast backends must extract exactly like BeautifulSoup + html.parser
+GOLDEN_FIXTURES = [
+    '<html><body><p>a<!-- c -->b<script>var x</script><style>s</style> t\xa0 </p>'
+    '<template>T<b>in</b></template>tail<br>x</body></html>',
+    '<html><body><nav>n</nav><article><h1>T</h1><p>one <b>two</b> three</p>'
+    '<ul><li>x</li><li>y</li></ul><img src=a></article></body></html>',
+    '<html><body><div class="x article-body"><p>p1</p><p>p2 &amp; &lt;tag&gt; caf\u00e9</p></div></body></html>',
+    '<html><body>no article<p>unclosed<p>second<div>d</div></body></html>',
+    '<html><body><article>first</article><article>second</article></body></html>',
+    '<html><head><title>t</title></head><body><table><tr><td>c1<td>c2</table></body></html>',
+]
+
+def check_parsers(site, rounds=3):
+    """Compares every backend against the bs4 reference on golden + synthetic pages."""
+    import html_parsers
+    pages = [(html.encode('utf-8'), 'article') for html in GOLDEN_FIXTURES]
+    pages.append((site.render('/')[1].encode('utf-8'), 'categories'))
+    pages.append((site.render('/collection/0-x')[1].encode('utf-8'), 'links'))
+    for art_id in range(min(200, site.categories * site.articles)):
+        pages.append((site.render(f'/article/{art_id}-x')[1].encode('utf-8'), 'article'))
+    pages.extend((html.encode('utf-8'), 'title') for html in GOLDEN_FIXTURES)
+
+    reference = html_parsers.Bs4Backend()
+    expected = [getattr(reference, kind)(reference.parse(body, 'utf-8')) for body, kind in pages]
+    ok = True
+    for name in html_parsers.BACKENDS:
+        backend = html_parsers.get_backend(name)
+        mismatches = sum(
+            getattr(backend, kind)(backend.parse(body, 'utf-8')) != want
+            for (body, kind), want in zip(pages, expected)
+        )
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for body, kind in pages:
+                getattr(backend, kind)(backend.parse(body, 'utf-8'))
+        per_page = (time.perf_counter() - start) / (rounds * len(pages))
+        ok = ok and mismatches == 0
+        print(f"{name:<6} {per_page * 1000:8.3f} ms/page  mismatches: {mismatches}/{len(pages)}")
+    return ok
+
+# --- Startup time ---------------------------------------------------------------------
+
+HEAVY_MODULES = {'sqlalchemy', 'requests', 'bs4', 'lxml', 'openai', 'xlsxwriter', 'numpy', 'pandas'}
+
+STARTUP_CHECKS = [
+    # (label, interpreter args, heavy modules it may load)
+    ("cli.py --help", ["cli.py", "--help"], set()),
+    ("cli.py analyze --help", ["cli.py", "analyze", "--help"], set()),
+    ("cli.py status", ["cli.py", "status"], set()),
+    ("import ai_processor", ["-c", "import ai_processor"], set()),
+    ("import scraper", ["-c", "import scraper"], {'requests'}),
+    ("import database", ["-c", "import database"], {'sqlalchemy'}),
+]
+
+def startup_profile(args, cwd, env, rounds):
+    """(best wall seconds, top-level packages imported) for a fresh interpreter running args."""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=cwd, env=env,
+                          capture_output=True, text=True)
+    # stderr lines: "import time: self [us] | cumulative | <indent>module.name"
+    loaded = {line.rsplit("|", 1)[1].strip().split(".")[0]
+              for line in proc.stderr.splitlines() if line.startswith("import time:") and "|" in line}
+    return best, loaded
+
+def check_imports(rounds=5):
+    """Times CLI startup against a bare interpreter and flags heavy modules loaded eagerly."""
+    import config
+    import database
+    here = os.path.dirname(os.path.abspath(__file__))
+    workdir = tempfile.mkdtemp(prefix="zipboard_imports_")
+    env = dict(os.environ, PYTHONPATH=here)
+    ok = True
+    try:
+        config.DB_NAME = os.path.join(workdir, os.path.basename(config.DB_NAME))
+        database.init_db() # So `status` reads a real (empty) database
+        baseline, _ = startup_profile(["-c", "pass"], workdir, env, rounds)
+        print(f"{'command':<24}{'ms':>8}{'over bare':>11}  heavy imports")
+        for label, args, allowed in STARTUP_CHECKS:
+            if args[0].endswith(".py"):
+                args = [os.path.join(here, args[0])] + args[1:]
+            best, loaded = startup_profile(args, workdir, env, rounds)
+            heavy = loaded & HEAVY_MODULES
+            over = (best - baseline) * 1000
+            failed = bool(heavy - allowed) or (not allowed and over > config.CLI_STARTUP_BUDGET_MS)
+            ok = ok and not failed
+            print(f"{label:<24}{best * 1000:>8.0f}{over:>11.0f}  {', '.join(sorted(heavy)) or '-'}"
+                  f"{'  <-- over budget' if failed else ''}")
+        print(f"Budget: {config.CLI_STARTUP_BUDGET_MS} ms over a bare interpreter "
+              f"({baseline * 1000:.0f} ms) for commands that load no heavy modules.")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return ok
+
+# --- Stage runner (child process) -----------------------------------------------------
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+def timed(owner, name, sink):
+    """Wraps owner.name so every call's latency is appended to sink."""
+    original = getattr(owner, name)
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            sink.append(time.perf_counter() - start)
+
+    setattr(owner, name, wrapper)
+
+def run_stage(stage, settings):
+    import config
+    config.BASE_URL = settings['base_url']
+    config.DB_NAME = settings['db']
+    config.REQUEST_INTERVAL = settings['request_interval']
+    config.AI_BASE_URL = settings['llm_url']
+    config.LLM_CACHE_ENABLED = False
+    config.HTML_PARSER = settings['parser']
+    config.DISCOVERY = settings['discovery']
+    os.environ['GROQ_API_KEY'] = 'benchmark'
+
+    import database
+    import scraper
+    import ai_processor
+
+    latencies = []
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        if stage == 'collect':
+            timed(scraper.Scraper, 'get_page', latencies)
+            importlib.import_module('1_collect_data').collect_data(
+                workers=settings['crawl_workers'], extract_processes=settings['extract_processes'])
+        elif stage == 'analyze':
+            timed(ai_processor.AIProcessor, '_complete', latencies)
+            importlib.import_module('2_analyze_content').analyze_data(
+                workers=settings['analysis_workers'], batch=settings['batch'])
+        elif stage == 'report':
+            importlib.import_module('3_generate_report').generate_report()
+    elapsed = time.perf_counter() - start
+
+    session = database.init_db()()
+    counts = {
+        'collect': session.query(database.Article).count(),
+        'analyze': session.query(database.Article).filter(
+            database.Article.analysis_status == database.STATUS_OK).count(),
+        'report': session.query(database.Article).count(),
+    }
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+    return {
+        'stage': stage,
+        'seconds': round(elapsed, 3),
+        'items': counts[stage],
+        'items_per_sec': round(counts[stage] / elapsed, 2) if elapsed else None,
+        'calls': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+        'peak_rss_mb': round(rss_mb, 1),
+    }
+
+# --- Driver ---------------------------------------------------------------------------
+
+def main():
+    import config
+    parser = argparse.ArgumentParser(description="Offline benchmark: synthetic help center + mock LLM.")
+    parser.add_argument("--categories", type=int, default=5)
+    parser.add_argument("--articles", type=int, default=20, help="Articles per category")
+    parser.add_argument("--words", type=int, default=400, help="Mean words per article")
+    parser.add_argument("--latency", type=float, default=0.05, help="Help center response latency (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of page requests answered 429")
+    parser.add_argument("--request-interval", type=float, default=0.0,
+                        help="Crawl budget for this run (config.REQUEST_INTERVAL is 0.5)")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Mock completion latency (s)")
+    parser.add_argument("--llm-rpm", type=int, default=0, help="Mock requests/minute limit per model (0 = unlimited)")
+    parser.add_argument("--llm-malformed", type=float, default=0.0, help="Fraction of truncated JSON replies")
+    parser.add_argument("--crawl-workers", type=int, default=config.CRAWL_WORKERS)
+    parser.add_argument("--analysis-workers", type=int, default=config.ANALYSIS_WORKERS)
+    parser.add_argument("--batch", action="store_true")
+    parser.add_argument("--parser", default=config.HTML_PARSER, help="HTML backend for the crawl")
+    parser.add_argument("--extract-processes", type=int, default=config.EXTRACT_PROCESSES)
+    parser.add_argument("--discovery", choices=["auto", "categories"], default=config.DISCOVERY)
+    parser.add_argument("--check-parsers", action="store_true",
+                        help="Only check HTML backend parity against bs4 and time them")
+    parser.add_argument("--check-imports", action="store_true",
+                        help="Only check CLI startup time and that heavy modules are imported lazily")
+    parser.add_argument("--stages", default="collect,analyze,report")
+    parser.add_argument("--json", help="Also write results to this file")
+    parser.add_argument("--run-stage", help=argparse.SUPPRESS)
+    parser.add_argument("--settings", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        print(json.dumps(run_stage(args.run_stage, json.loads(args.settings))))
+        return
+
+    if args.check_imports:
+        sys.exit(0 if check_imports() else 1)
+    site = HelpCenter(args.categories, args.articles, args.words, args.latency, args.error_rate)
+    if args.check_parsers:
+        sys.exit(0 if check_parsers(site) else 1)
+    llm = MockLLM(args.llm_latency, args.llm_rpm, args.llm_malformed)
+    site_server, site_url = serve(site.handler())
+    llm_server, llm_url = serve(llm.handler())
+
+    workdir = tempfile.mkdtemp(prefix="zipboard_bench_")
+    settings = {
+        'base_url': site_url,
+        'llm_url': llm_url + "/v1",
+        'db': os.path.join(workdir, "bench.db"),
+        'request_interval': args.request_interval,
+        'crawl_workers': args.crawl_workers,
+        'analysis_workers': args.analysis_workers,
+        'batch': args.batch,
+        'parser': args.parser,
+        'extract_processes': args.extract_processes,
+        'discovery': args.discovery,
+    }
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    try:
+        for stage in args.stages.split(","):
+            # Run from the scratch dir so the report file lands there too
+            proc = subprocess.run(
+                [sys.executable, os.path.join(here, "benchmark.py"), "--run-stage", stage,
+                 "--settings", json.dumps(settings)],
+                cwd=workdir, capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=here)
+            )
+            if proc.returncode != 0:
+                print(f"Stage {stage} failed:\n{proc.stderr}")
+                break
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    finally:
+        site_server.shutdown()
+        llm_server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'stage':<9}{'seconds':>9}{'items':>8}{'items/s':>10}{'calls':>8}{'p50 ms':>9}{'p99 ms':>9}{'RSS MB':>9}")
+    for r in results:
+        print(f"{r['stage']:<9}{r['seconds']:>9}{r['items']:>8}{r['items_per_sec'] or '-':>10}{r['calls']:>8}"
+              f"{r['p50_ms'] or '-':>9}{r['p99_ms'] or '-':>9}{r['peak_rss_mb']:>9}")
+    print(f"Help center requests: {site.requests}, LLM requests: {llm.requests} ({llm.rate_limited} rate limited)")
+    for model, n in sorted(llm.by_model.items(), key=lambda item: -item[1]):
+        print(f"  {model}: {n}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results,
+                       'site_requests': site.requests, 'llm_requests': llm.requests,
+                       'llm_rate_limited': llm.rate_limited, 'llm_by_model': llm.by_model}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
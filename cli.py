@@ -0,0 +1,135 @@
+"""
+Single entry point for the pipeline stages.
+
+    python cli.py collect --refresh
+    python cli.py analyze --workers 8 --batch --dedupe
+    python cli.py report
+    python cli.py run-all --crawl-workers 8 --analysis-workers 8
+    python cli.py status
+
+Only argparse, sqlite3 and config are imported up front. SQLAlchemy, requests, the
+OpenAI SDK and xlsxwriter load inside the command that needs them, so `status` and
+`--help` start in milliseconds (`python benchmark.py --check-imports` guards this).
+"""
+import argparse
+import importlib
+import os
+import sqlite3
+import time
+import config
+
+# --- Arguments (shared with the stage scripts' own __main__) --------------------------
+
+def add_collect_arguments(parser, workers_flag="--workers"):
+    parser.add_argument(workers_flag, dest="crawl_workers", metavar="N", type=int, default=config.CRAWL_WORKERS,
+                        help="Concurrent fetches (1 = serial crawl)")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Re-check existing articles with conditional GETs and re-queue changed ones for analysis")
+    parser.add_argument("--extract-processes", type=int, default=config.EXTRACT_PROCESSES,
+                        help="Worker processes for HTML extraction (0 = in the fetch threads)")
+    parser.add_argument("--discovery", choices=["auto", "categories"], default=config.DISCOVERY,
+                        help="auto: sitemap.xml, crawling category pages only when needed; categories: always crawl them")
+    parser.add_argument("--reextract", action="store_true",
+                        help="Rebuild articles from the page archive with the current extraction code (no network)")
+
+def add_analyze_arguments(parser, workers_flag="--workers"):
+    parser.add_argument(workers_flag, dest="analysis_workers", metavar="N", type=int, default=config.ANALYSIS_WORKERS,
+                        help="Max concurrent completions (1 = serial with a fixed delay)")
+    parser.add_argument("--batch", action="store_true",
+                        help="Pack several short articles into each request")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="Analyze one article per near-duplicate cluster and copy its result to the rest")
+
+# --- Commands -------------------------------------------------------------------------
+
+def run_collect(args):
+    importlib.import_module('1_collect_data').collect_data(
+        workers=args.crawl_workers, refresh=args.refresh, extract_processes=args.extract_processes,
+        discovery=args.discovery, reextract=args.reextract)
+
+def run_analyze(args):
+    importlib.import_module('2_analyze_content').analyze_data(
+        workers=args.analysis_workers, batch=args.batch, dedupe=args.dedupe)
+
+def run_report(args):
+    importlib.import_module('3_generate_report').generate_report()
+
+def run_all(args):
+    start = time.time()
+    for step in (run_collect, run_analyze, run_report):
+        step(args)
+        print()
+    print(f"All stages finished in {time.time() - start:.1f}s.")
+
+def show_status(args):
+    """Summary of the database, read with plain sqlite3 (no SQLAlchemy, no network)."""
+    if not os.path.exists(config.DB_NAME):
+        print(f"No database yet ({config.DB_NAME}). Run `python cli.py collect` first.")
+        return
+    conn = sqlite3.connect(f"file:{config.DB_NAME}?mode=ro", uri=True)
+    conn.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    print(f"Database: {config.DB_NAME} ({os.path.getsize(config.DB_NAME) / 1e6:.1f} MB)")
+
+    if 'articles' in tables:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(articles)")}
+        if 'analysis_status' in columns:
+            by_status = dict(conn.execute(
+                "SELECT COALESCE(analysis_status, 'pending'), COUNT(*) FROM articles GROUP BY 1"))
+        else:
+            by_status = {'not migrated': conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]}
+        breakdown = ", ".join(f"{status} {count}" for status, count in sorted(by_status.items()))
+        print(f"Articles: {sum(by_status.values())}" + (f" ({breakdown})" if breakdown else ""))
+        if 'duplicate_of' in columns:
+            copies = conn.execute("SELECT COUNT(*) FROM articles WHERE duplicate_of IS NOT NULL").fetchone()[0]
+            if copies:
+                print(f"Near-duplicates: {copies}")
+    if 'categories' in tables:
+        print(f"Categories: {conn.execute('SELECT COUNT(*) FROM categories').fetchone()[0]}")
+    if 'gap_insights' in tables:
+        print(f"Gap insights: {conn.execute('SELECT COUNT(*) FROM gap_insights').fetchone()[0]}")
+    if 'job_runs' in tables:
+        runs = conn.execute("""
+            SELECT stage, status, done, total, started_at FROM job_runs
+            WHERE id IN (SELECT MAX(id) FROM job_runs GROUP BY stage) ORDER BY stage
+        """).fetchall()
+        for stage, status, done, total, started_at in runs:
+            progress = f" {done}/{total}" if total else ""
+            started = f" (started {started_at[:19]})" if started_at else ""
+            print(f"Last dashboard run of {stage}: {status}{progress}{started}")
+    conn.close()
+
+    reports = [f for f in os.listdir('.') if f.startswith('AI_Audit_Report') and f.endswith('.xlsx')]
+    if reports:
+        print(f"Latest report: {max(reports, key=os.path.getctime)}")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="zipBoard help center audit pipeline.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("collect", help="Scrape the help center into the database")
+    add_collect_arguments(p)
+    p.set_defaults(func=run_collect)
+
+    p = commands.add_parser("analyze", help="Run AI gap analysis on pending articles")
+    add_analyze_arguments(p)
+    p.set_defaults(func=run_analyze)
+
+    p = commands.add_parser("report", help="Write the Excel audit report")
+    p.set_defaults(func=run_report)
+
+    p = commands.add_parser("run-all", help="collect, analyze and report in one go")
+    add_collect_arguments(p, workers_flag="--crawl-workers")
+    add_analyze_arguments(p, workers_flag="--analysis-workers")
+    p.set_defaults(func=run_all)
+
+    p = commands.add_parser("status", help="Article, analysis and job counts from the database")
+    p.set_defaults(func=show_status)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
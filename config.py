@@ -8,3 +8,87 @@ DB_NAME = "ai_automation.db"
 # Rate limit: 2 requests per second = 0.5s interval
 REQUEST_INTERVAL = 0.5 
 AI_API_KEY = os.getenv("AI_API_KEY")
+# OpenAI-compatible endpoint (override to point at a proxy or the benchmark mock)
+AI_BASE_URL = os.getenv("AI_BASE_URL", "https://api.groq.com/openai/v1")
+# Concurrent crawl: worker threads sharing the REQUEST_INTERVAL budget
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", 4))
+RATE_LIMIT_BURST = 1 # Tokens a host may bank; 1 = never exceed 1/REQUEST_INTERVAL
+# LLM result cache (separate SQLite file so it survives DB rebuilds)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_PATH = "llm_cache.db"
+LLM_CACHE_MAX_ENTRIES = 50000
+LLM_CACHE_MAX_AGE_DAYS = 90
+# Parallel analysis: upper bound on in-flight completions, adapted by an AIMD limiter
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", 4))
+ANALYSIS_INITIAL_CONCURRENCY = 2
+# Batched analysis: pack short articles into one request up to this many content tokens
+BATCH_TOKEN_BUDGET = 6000
+BATCH_MAX_ARTICLES = 10
+# Long articles: above this many tokens, analyze in chunks and merge (map-reduce)
+LONG_ARTICLE_TOKENS = 3750 # ~15000 chars, the old truncation point
+CHUNK_TOKENS = 3000
+# Streaming pipeline: scraped articles allowed to wait for analysis before the crawl pauses
+PIPELINE_QUEUE_SIZE = 50
+# SQLite tuning
+DB_BATCH_SIZE = 200 # Rows per transaction on bulk ingest
+SQLITE_CACHE_KB = 64000
+SQLITE_BUSY_TIMEOUT_MS = 5000
+# Analysis queue: pending articles are read in pages; errors retried up to N times (0 = forever)
+ANALYSIS_PAGE_SIZE = 200
+MAX_ANALYSIS_ATTEMPTS = 0
+# Metrics export at the end of each stage (empty = disabled)
+METRICS_JSONL_PATH = os.getenv("METRICS_JSONL_PATH", "")
+METRICS_PROM_PATH = os.getenv("METRICS_PROM_PATH", "")
+# HTML parser backend: "auto" (lxml if installed), "lxml" or "bs4" (pure Python html.parser)
+HTML_PARSER = os.getenv("HTML_PARSER", "auto")
+# Worker processes for HTML extraction during crawls (0 = extract in the fetch threads)
+EXTRACT_PROCESSES = int(os.getenv("EXTRACT_PROCESSES", 0))
+# Article discovery: "auto" (sitemap, falling back to category pages) or "categories"
+DISCOVERY = os.getenv("DISCOVERY", "auto")
+SITEMAP_URL = os.getenv("SITEMAP_URL", "") # Empty = BASE_URL/sitemap.xml
+SITEMAP_ARTICLE_PATTERN = "/article/" # Sitemap entries that are help articles
+SITEMAP_MAX_FILES = 50 # Cap on sitemap files followed through sitemap indexes
+# Near-duplicate detection (MinHash + LSH over word shingles)
+DEDUP_THRESHOLD = 0.8 # Estimated Jaccard similarity to count as a near-duplicate
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 16 # 16 bands x 8 rows: pairs above ~0.7 similarity become candidates
+SHINGLE_WORDS = 5
+# Strategic gap insights (step 4): local clustering of per-article gaps, then a few LLM calls
+INSIGHT_TOP_CLUSTERS = 15 # GapInsight rows produced, largest clusters first
+INSIGHT_MAX_CLUSTERS = 60 # k-means clusters at most (sqrt of the number of gaps below that)
+INSIGHT_VECTOR_DIM = 1024 # Hashed TF-IDF features
+INSIGHT_CLUSTERS_PER_PROMPT = 5
+# LLM rate limiting: per-model budgets come from x-ratelimit-* headers; failures retry with jitter
+AI_MAX_RETRIES = 6 # Retries per prompt after a 429, timeout or 5xx
+AI_MAX_WAIT_SECONDS = 600 # Give up when no model has budget for this long
+AI_RETRY_BASE_DELAY = 1.0
+AI_RETRY_MAX_DELAY = 60.0
+AI_RETRY_JITTER = 0.25 # Delays are stretched by a random 0-25% so workers don't retry in lockstep
+AI_COMPLETION_TOKENS_ESTIMATE = 800 # Reserved for the reply when checking token budgets
+# Model routing: the first rule matching an article's word count and content type picks the
+# models tried first (the rest remain fallbacks). Unmatched articles prefer the large model.
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "1") != "0"
+MODEL_ROUTES = [
+    # (max words, content types or None for any, models in preference order)
+    (600, ("FAQ", "Other"), ["llama-3.1-8b-instant", "meta-llama/llama-4-scout-17b-16e-instruct"]),
+    (300, None, ["llama-3.1-8b-instant", "meta-llama/llama-4-scout-17b-16e-instruct"]),
+    (1200, ("How-to Guide", "Troubleshooting"), ["meta-llama/llama-4-scout-17b-16e-instruct", "llama-3.3-70b-versatile"]),
+]
+# Ask for structured JSON output (response_format) on models that accept it
+AI_JSON_MODE = os.getenv("AI_JSON_MODE", "1") != "0"
+# Dashboard background jobs
+JOB_LOG_LINES = 500 # Output lines kept per stage run (older lines are dropped)
+JOB_PROGRESS_INTERVAL = 1.0 # Seconds between progress writes to job_runs
+JOB_POLL_SECONDS = 2 # How often the dashboard refreshes job status
+# Startup budget checked by `python benchmark.py --check-imports`: ms a light CLI command
+# (status, --help) may add to a bare interpreter's start
+CLI_STARTUP_BUDGET_MS = 100
+# Raw page archive: every fetched body, compressed and stored once per distinct content,
+# so `1_collect_data.py --reextract` can rebuild articles without re-crawling
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "1") != "0"
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "page_archive")
+ARCHIVE_CODEC = os.getenv("ARCHIVE_CODEC", "auto") # "auto" (zstd if zstandard is installed), "zstd" or "gzip"
+# Help center 429s: retries per page, honoring Retry-After, else exponential backoff from the base
+SCRAPER_MAX_RETRIES = 3
+SCRAPER_BACKOFF_SECONDS = 10
+SCRAPER_MAX_BACKOFF_SECONDS = 120
@@ -1,10 +1,10 @@
 import streamlit as st
-import subprocess
-import sys
 import os
 import pandas as pd
 import sqlite3
+import threading
 import time
+import config
 
 # Page Config
 st.set_page_config(
@@ -53,27 +53,79 @@ st.title("🚀 Autonomous AI System")
 st.markdown("### _Review, Analyze, and Report Pipeline_")
 st.divider()
 
-# Metrics Section - Real-time stats
-if os.path.exists("ai_automation.db"):
-    try:
-        conn = sqlite3.connect("ai_automation.db")
-        # Check if table exists
-        cursor = conn.cursor()
-        cursor.execute("SELECT count(*) FROM sqlite_master WHERE type='table' AND name='articles'")
-        if cursor.fetchone()[0] == 1:
-            total_articles = pd.read_sql("SELECT COUNT(*) FROM articles", conn).iloc[0,0]
-            analyzed_articles = pd.read_sql("SELECT COUNT(*) FROM articles WHERE gap_analysis IS NOT NULL", conn).iloc[0,0]
+# Data layer. Every widget click reruns this script, so the database is read through one
+# shared read-only connection and each snapshot is cached until a stage commits something:
+# PRAGMA data_version changes only when another connection writes, which costs one cheap
+# query per rerun instead of a set of COUNT(*) scans. Readers never block the writers (WAL).
+@st.cache_resource(show_spinner=False)
+def get_read_connection(db_path, inode):
+    """Pooled read-only connection; reopened when the database file is replaced (new inode)."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+    conn.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+    return conn, threading.Lock() # Streamlit sessions run in separate threads
+
+def read_connection():
+    if not os.path.exists(config.DB_NAME):
+        return None
+    return get_read_connection(os.path.abspath(config.DB_NAME), os.stat(config.DB_NAME).st_ino)
+
+def data_version():
+    """Cache key for snapshots: (connection, data_version), or None before the database exists."""
+    pooled = read_connection()
+    if pooled is None:
+        return None
+    conn, lock = pooled
+    with lock:
+        return id(conn), conn.execute("PRAGMA data_version").fetchone()[0]
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def load_snapshot(version):
+    """Everything the page shows, read in one pass over articles plus two small queries."""
+    snapshot = {
+        'total': 0, 'analyzed': 0, 'by_status': {}, 'by_category': pd.DataFrame(),
+        'gaps': pd.DataFrame(), 'preview': pd.DataFrame()
+    }
+    if version is None:
+        return snapshot
+    conn, lock = read_connection()
+    with lock:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        if 'articles' in tables:
+            rows = conn.execute("""
+                SELECT COALESCE(c.name, 'Unknown'), COALESCE(a.analysis_status, 'pending'),
+                       COUNT(*), SUM(a.gap_analysis IS NOT NULL)
+                FROM articles a LEFT JOIN categories c ON c.id = a.category_id
+                GROUP BY a.category_id, a.analysis_status
+            """).fetchall()
+            snapshot['preview'] = pd.read_sql(
+                "SELECT id, title, category_id, article_custom_id, gap_analysis "
+                "FROM articles ORDER BY id DESC LIMIT 50", conn)
         else:
-            total_articles = 0
-            analyzed_articles = 0
-        conn.close()
-    except Exception as e:
-        total_articles = 0
-        analyzed_articles = 0
-        # st.error(f"DB Error: {e}")
-else:
-    total_articles = 0
-    analyzed_articles = 0
+            rows = []
+        if 'gap_insights' in tables:
+            snapshot['gaps'] = pd.read_sql(
+                "SELECT gap_id, category, priority, description, suggested_title, rationale "
+                "FROM gap_insights ORDER BY gap_id", conn)
+
+    df = pd.DataFrame(rows, columns=["category", "status", "articles", "analyzed"])
+    snapshot['total'] = int(df["articles"].sum())
+    snapshot['analyzed'] = int(df["analyzed"].sum())
+    snapshot['by_status'] = df.groupby("status")["articles"].sum().astype(int).to_dict()
+    if not df.empty:
+        snapshot['by_category'] = (
+            df.pivot_table(index="category", columns="status", values="articles", aggfunc="sum", fill_value=0)
+            .assign(total=lambda t: t.sum(axis=1))
+            .sort_values("total", ascending=False)
+        )
+    return snapshot
+
+try:
+    snapshot = load_snapshot(data_version())
+except Exception as e:
+    snapshot = load_snapshot(None)
+    # st.error(f"DB Error: {e}")
+total_articles = snapshot['total']
+analyzed_articles = snapshot['analyzed']
 
 # Display Metrics
 m1, m2, m3, m4 = st.columns(4)
@@ -82,114 +134,170 @@ m2.metric("🧠 Analyzed", analyzed_articles, f"{analyzed_articles/total_article
 m3.metric("⚡ System Status", "Online")
 m4.metric("📅 Last Update", time.strftime("%H:%M"))
 
+if not snapshot['by_category'].empty:
+    with st.expander("📊 Articles by Category and Analysis Status", expanded=False):
+        st.caption(" · ".join(f"{status}: {count}" for status, count in sorted(snapshot['by_status'].items())))
+        st.dataframe(snapshot['by_category'], use_container_width=True)
+
 st.markdown("---")
 
-# Process Runner
-def run_process_with_log(script_name, log_container, status_label):
-    """Runs script and updates UI using st.status"""
-    with log_container.status(status_label, expanded=True) as status:
-        st.write(f"🚀 Launching {script_name}...")
-        
-        cmd = [sys.executable, script_name]
+# Process Runner: stages run in the background (see jobs.py); the page only starts and watches them
+@st.cache_resource(show_spinner=False)
+def job_holder():
+    """Shared by every browser session, so a running stage is visible (and not restartable) for all."""
+    return {'manager': None, 'lock': threading.Lock()}
+
+def get_job_manager():
+    """
+    The JobManager writes job_runs, so it (and init_db's schema checks) is only created when
+    a stage is first started; page loads stay on the read-only connection.
+    """
+    holder = job_holder()
+    with holder['lock']:
+        if holder['manager'] is None:
+            import database
+            import jobs
+            holder['manager'] = jobs.JobManager(database.init_db())
+        return holder['manager']
+
+def started_job(script):
+    """The Job this dashboard process started for script, or None."""
+    manager = job_holder()['manager']
+    return manager.get(script) if manager else None
+
+STAGES = [
+    # (script, heading, caption, button label, button key)
+    ("1_collect_data.py", "1. 📡 Collection", "Scrape Help Center data", "Start Scraper", "btn_scrape"),
+    ("2_analyze_content.py", "2. 🧠 Analysis", "Run Multi-Model AI Agent", "Start AI Agent", "btn_analyze"),
+    ("3_generate_report.py", "3. 📊 Reporting", "Generate Excel Audit", "Generate Report", "btn_report"),
+    ("4_generate_insights.py", "4. 💡 Insights", "Cluster gaps into strategic insights", "Generate Insights", "btn_insights"),
+]
+REPORT_STAGE = "3_generate_report.py"
+
+def load_job_runs():
+    """Latest run of each stage: {script: (status, done, total, rate, eta_seconds, exit_code)}."""
+    pooled = read_connection()
+    if pooled is None:
+        return {}
+    conn, lock = pooled
+    with lock:
         try:
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                universal_newlines=True,
-                encoding='utf-8',
-                cwd=os.getcwd() # Run in current dir
-            )
-            
-            output_area = st.empty()
-            full_log = ""
-            
-            for line in iter(process.stdout.readline, ''):
-                full_log += line
-                # Keep log concise
-                output_area.code(full_log[-3000:], language='bash') 
-                
-            process.stdout.close()
-            return_code = process.wait()
-            
-            if return_code == 0:
-                status.update(label=f"✅ {script_name} Completed!", state="complete", expanded=False)
-                st.toast(f"{script_name} finished successfully!", icon="🎉")
-            else:
-                status.update(label=f"❌ {script_name} Failed (Exit Code: {return_code})", state="error")
-                st.error("Check logs above for details.")
-        except Exception as e:
-            status.update(label="❌ Execution Error", state="error")
-            st.error(f"Failed to run script: {e}")
-
-# Main Controls Layout
-c1, c2, c3 = st.columns(3)
-
-with c1:
-    st.subheader("1. 📡 Collection")
-    st.caption("Scrape Help Center data")
-    if st.button("Start Scraper", type="primary", key="btn_scrape"):
-        run_process_with_log("1_collect_data.py", st, "Fetching Data...")
-
-with c2:
-    st.subheader("2. 🧠 Analysis")
-    st.caption("Run Multi-Model AI Agent")
-    if st.button("Start AI Agent", type="primary", key="btn_analyze"):
-        run_process_with_log("2_analyze_content.py", st, "Running AI Models...")
-
-with c3:
-    st.subheader("3. 📊 Reporting")
-    st.caption("Generate Excel Audit")
-    if st.button("Generate Report", type="primary", key="btn_report"):
-        run_process_with_log("3_generate_report.py", st, "Building Report...")
-        
-        time.sleep(1) # Wait for file write
+            rows = conn.execute("""
+                SELECT stage, status, done, total, rate, eta_seconds, exit_code FROM job_runs
+                WHERE id IN (SELECT MAX(id) FROM job_runs GROUP BY stage)
+            """).fetchall()
+        except sqlite3.OperationalError:
+            return {} # No stage launched from the dashboard yet
+    return {row[0]: row[1:] for row in rows}
+
+def show_job(script, run):
+    status, done, total, rate, eta, exit_code = run
+    job = started_job(script)
+    if status == 'running' and job is None:
+        status = 'interrupted' # Started by an earlier dashboard process, which took its output pipe along
+    if status == 'running':
+        if total:
+            st.progress(min(done / total, 1.0), text=f"{done}/{total}")
+        details = ["Running..."]
+        if rate:
+            details.append(f"{rate:.2f} items/s")
+        if eta is not None:
+            details.append(f"ETA {time.strftime('%H:%M:%S', time.gmtime(eta))}")
+        st.caption(" · ".join(details))
+    elif status == 'done':
+        st.success(f"✅ {script} Completed!")
+    elif status == 'failed':
+        st.error(f"❌ {script} Failed (Exit Code: {exit_code})")
+    else:
+        st.warning(f"{script} was interrupted.")
+
+    if job is not None:
+        with st.expander("Log", expanded=job.running):
+            st.code(job.log()[-3000:], language='bash')
+
+# Main Controls Layout. Polled every few seconds; only this fragment reruns.
+@st.fragment(run_every=config.JOB_POLL_SECONDS)
+def job_panel():
+    cols = st.columns(len(STAGES))
+    for col, (script, heading, caption, label, key) in zip(cols, STAGES):
+        with col:
+            st.subheader(heading)
+            st.caption(caption)
+            if st.button(label, type="primary", key=key):
+                get_job_manager().start(script)
+                st.toast(f"{script} started in the background.", icon="🚀")
+
+    runs = load_job_runs()
+    for col, (script, *_) in zip(cols, STAGES):
+        if script in runs:
+            with col:
+                show_job(script, runs[script])
+
+    report_run = runs.get(REPORT_STAGE)
+    if report_run and report_run[0] == 'done':
         files = [f for f in os.listdir('.') if f.startswith('AI_Audit_Report') and f.endswith('.xlsx')]
         if files:
             latest = max(files, key=os.path.getctime)
-            with open(latest, "rb") as f:
+            report_col = cols[[script for script, *_ in STAGES].index(REPORT_STAGE)]
+            with report_col, open(latest, "rb") as f:
                 st.download_button("📥 Download Report", f, file_name=latest, use_container_width=True)
 
+job_panel()
+
 st.divider()
 
 # Strategic Insights Preview
 st.subheader("💡 Strategic Gap Analysis (Top 5)")
-if os.path.exists("ai_automation.db"):
-    conn = sqlite3.connect("ai_automation.db")
+df_gaps = snapshot['gaps']
+if not df_gaps.empty:
+    st.dataframe(
+        df_gaps, 
+        column_config={
+            "priority": st.column_config.TextColumn(
+                "Priority",
+                help="Impact level",
+                validate="^(High|Medium|Low)$"
+            )
+        },
+        use_container_width=True,
+        hide_index=True
+    )
+elif total_articles:
+    st.info("No insights generated yet. Run Step 4 (Generate Insights).")
+else:
+    st.write("Gap table not ready.")
+
+st.divider()
+
+# Full-text search (FTS5 index, ranked)
+st.subheader("🔍 Search Articles")
+search_query = st.text_input("Search titles, content, topics and gaps", placeholder="e.g. jira integration")
+pooled = read_connection() if search_query else None
+if pooled is not None:
+    import database
+    conn, lock = pooled
     try:
-        df_gaps = pd.read_sql("SELECT gap_id, category, priority, description, suggested_title, rationale FROM gap_insights", conn)
-        if not df_gaps.empty:
+        with lock:
+            hits = database.search_articles_dbapi(conn, search_query, limit=50)
+        if hits:
+            st.caption(f"{len(hits)} best matches")
             st.dataframe(
-                df_gaps, 
-                column_config={
-                    "priority": st.column_config.TextColumn(
-                        "Priority",
-                        help="Impact level",
-                        validate="^(High|Medium|Low)$"
-                    )
-                },
+                pd.DataFrame(hits, columns=["id", "title", "url", "snippet"]),
                 use_container_width=True,
                 hide_index=True
             )
         else:
-             st.info("No insights generated yet. Run Step 4.")
+            st.info("No matching articles.")
     except Exception as e:
-        st.write("Gap table not ready.")
-    conn.close()
+        st.write(f"Search not available: {e}")
 
 st.divider()
 
 # Data Preview Expander
 with st.expander("📂 Live Database Preview (Last 50 Articles)", expanded=False):
-    if os.path.exists("ai_automation.db"):
-        conn = sqlite3.connect("ai_automation.db")
-        try:
-            df = pd.read_sql("SELECT id, title, category_id, article_custom_id, gap_analysis FROM articles ORDER BY id DESC LIMIT 50", conn)
-            st.dataframe(df, use_container_width=True)
-        except:
-            st.write("No data found yet.")
-        conn.close()
+    if not snapshot['preview'].empty:
+        st.dataframe(snapshot['preview'], use_container_width=True)
+    elif os.path.exists(config.DB_NAME):
+        st.write("No data found yet.")
     else:
         st.write("Database not initialized yet.")
@@ -1,10 +1,24 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, Boolean
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from sqlalchemy import create_engine, event, func, inspect, text, Column, Integer, Float, String, Text, DateTime, ForeignKey, Boolean, Index
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import declarative_base, sessionmaker, relationship, load_only, object_session
 from datetime import datetime
 import config
+import metrics
+import time
 
 Base = declarative_base()
 
+STATUS_PENDING = 'pending'
+STATUS_OK = 'ok'
+STATUS_ERROR = 'error'
+# Analyses copied from a near-duplicate's representative (dedup.propagate_results) start with this
+COPIED_ANALYSIS_PREFIX = "[Near-duplicate of "
+# Column values of an article waiting for (re-)analysis; content_type is kept as a routing hint
+RESET_ANALYSIS = {
+    'gap_analysis': None, 'suggested_topics': None, 'topics_covered': None,
+    'analysis_model': None, 'analysis_status': STATUS_PENDING, 'analysis_attempts': 0
+}
+
 class Category(Base):
     __tablename__ = 'categories'
     id = Column(Integer, primary_key=True)
@@ -18,7 +32,7 @@ class Article(Base):
     id = Column(Integer, primary_key=True)
     title = Column(String)
     url = Column(String, unique=True)
-    category_id = Column(Integer, ForeignKey('categories.id'))
+    category_id = Column(Integer, ForeignKey('categories.id'), index=True)
     category = relationship("Category", back_populates="articles")
     content_text = Column(Text) # Full text content
     word_count = Column(Integer, default=0)
@@ -28,11 +42,31 @@ class Article(Base):
     article_custom_id = Column(String) # Extracted identifier (e.g. 63)
     has_screenshots = Column(Boolean, default=False)
     
+    # Incremental re-crawl: HTTP validators + hash of the extracted text
+    etag = Column(String)
+    last_modified_header = Column(String) # Raw Last-Modified header value
+    content_hash = Column(String) # sha256 of content_text
+    sitemap_lastmod = Column(String) # Raw <lastmod> from the sitemap, if listed there
+    
+    # Near-duplicates (dedup.py): the cluster representative this article copies, if any
+    duplicate_of = Column(Integer, ForeignKey('articles.id'), index=True)
+    duplicate_similarity = Column(Float) # Estimated Jaccard similarity to duplicate_of
+    
     # Analysis fields
     gap_analysis = Column(Text) # "Gaps Identified"
     suggested_topics = Column(Text) # "Suggestions" (or repurposed)
     topics_covered = Column(Text) # New AI field
     content_type = Column(String) # New AI field ("How-to", "FAQ", etc)
+    analysis_model = Column(String) # Model(s) that produced the analysis
+    
+    # Analysis work queue: pending -> ok | error. Indexed so finding work is O(pending).
+    analysis_status = Column(String, default=STATUS_PENDING, server_default=STATUS_PENDING)
+    analysis_attempts = Column(Integer, default=0, server_default='0')
+    last_analysis_at = Column(DateTime)
+    
+    __table_args__ = (
+        Index('ix_articles_analysis_status_id', 'analysis_status', 'id'),
+    )
 
 class GapInsight(Base):
     __tablename__ = 'gap_insights'
@@ -45,7 +79,285 @@ class GapInsight(Base):
     rationale = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class JobRun(Base):
+    """One dashboard-launched stage run; progress is parsed from the stage's [done/total] lines."""
+    __tablename__ = 'job_runs'
+    id = Column(Integer, primary_key=True)
+    stage = Column(String, index=True) # Script name, e.g. 2_analyze_content.py
+    status = Column(String) # running/done/failed/interrupted
+    pid = Column(Integer)
+    done = Column(Integer, default=0)
+    total = Column(Integer) # NULL until the stage prints its first progress line
+    rate = Column(Float) # Items per second
+    eta_seconds = Column(Float)
+    exit_code = Column(Integer)
+    last_line = Column(Text)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+def upsert_categories(session, categories):
+    """
+    Inserts new categories and refreshes article_count on existing ones in one statement.
+    Returns {url: id} for the given categories. Caller commits.
+    """
+    if not categories:
+        return {}
+    stmt = sqlite_insert(Category.__table__)
+    stmt = stmt.on_conflict_do_update(index_elements=['url'], set_={'article_count': stmt.excluded.article_count})
+    # executemany: one parameter set per row, so SQLITE_MAX_VARIABLE_NUMBER (999 on older builds) never applies
+    session.execute(stmt, [{'name': c['name'], 'url': c['url'], 'article_count': c['count']} for c in categories])
+    urls = {c['url'] for c in categories}
+    return {url: cat_id for url, cat_id in session.query(Category.url, Category.id) if url in urls}
+
+def known_article_urls(session):
+    """All article URLs in one index-only scan, instead of a lookup per article."""
+    return {url for (url,) in session.query(Article.url)}
+
+def load_articles_for_refresh(session):
+    """{url: Article} with only the columns an incremental refresh compares; content loads lazily."""
+    query = session.query(Article).options(load_only(
+        Article.id, Article.url, Article.etag, Article.last_modified_header, Article.content_hash,
+        Article.sitemap_lastmod
+    ))
+    return {art.url: art for art in query}
+
+def load_articles_for_reextract(session):
+    """{url: Article} with the columns re-extraction compares; content is only ever written."""
+    query = session.query(Article).options(load_only(
+        Article.id, Article.url, Article.content_hash, Article.has_screenshots
+    ))
+    return {art.url: art for art in query}
+
+def bulk_insert_articles(session, rows):
+    """Inserts article dicts with one executemany, skipping URLs that already exist. Caller commits."""
+    if rows:
+        stmt = sqlite_insert(Article.__table__).on_conflict_do_nothing(index_elements=['url'])
+        session.execute(stmt, rows) # Per-row parameters, never one statement with rows x columns variables
+
+def apply_analysis(article, result):
+    """Copies an AIProcessor result dict onto an Article and updates its queue status (caller commits)."""
+    article.gap_analysis = result['gap']
+    article.suggested_topics = result.get('suggestions') # "Suggestions" column
+    # Results without a model ("No AI Configured") have no topics or type
+    article.topics_covered = result.get('topics')
+    article.content_type = result.get('type')
+    article.analysis_model = result.get('model')
+    article.analysis_status = STATUS_ERROR if str(result['gap']).startswith("Error") else STATUS_OK
+    article.analysis_attempts = (article.analysis_attempts or 0) + 1
+    article.last_analysis_at = datetime.utcnow()
+
+def reset_analysis(article):
+    """
+    Clears analysis output and puts the article back in the queue (caller commits).
+    Near-duplicates holding a copy of this article's analysis are reset with it.
+    """
+    for column, value in RESET_ANALYSIS.items(): # content_type is kept: it steers model routing
+        setattr(article, column, value)
+    session = object_session(article)
+    if session is not None and article.id is not None:
+        session.query(Article).filter(
+            Article.duplicate_of == article.id,
+            Article.gap_analysis.startswith(COPIED_ANALYSIS_PREFIX, autoescape=True)
+        ).update(RESET_ANALYSIS, synchronize_session=False)
+
+def pending_filter(skip_duplicates=False):
+    """
+    Condition for articles that need (re-)analysis; served by ix_articles_analysis_status_id.
+    skip_duplicates leaves out near-duplicates, which inherit their representative's result.
+    """
+    statuses = [STATUS_PENDING, STATUS_ERROR]
+    cond = Article.analysis_status.in_(statuses)
+    if config.MAX_ANALYSIS_ATTEMPTS:
+        cond = cond & ((Article.analysis_status == STATUS_PENDING) |
+                       (func.coalesce(Article.analysis_attempts, 0) < config.MAX_ANALYSIS_ATTEMPTS))
+    if skip_duplicates:
+        cond = cond & Article.duplicate_of.is_(None)
+    return cond
+
+def count_pending(session, skip_duplicates=False):
+    return session.query(Article.id).filter(pending_filter(skip_duplicates)).count()
+
+def iter_pending_articles(session, page_size=None, skip_duplicates=False):
+    """
+    Yields pending articles in pages of page_size, keyset-paginated on id so each page is
+    an index range scan and nothing beyond the current page is held in memory.
+    Only the columns analysis needs are loaded.
+    """
+    page_size = page_size or config.ANALYSIS_PAGE_SIZE
+    last_id = 0
+    while True:
+        page = (
+            session.query(Article)
+            .options(load_only(Article.id, Article.title, Article.content_text, Article.content_type,
+                               Article.analysis_status, Article.analysis_attempts))
+            .filter(pending_filter(skip_duplicates), Article.id > last_id)
+            .order_by(Article.id)
+            .limit(page_size)
+            .all()
+        )
+        if not page:
+            return
+        last_id = page[-1].id
+        yield page
+
+def _add_missing_columns(engine):
+    """create_all() never alters existing tables, so add columns introduced since the DB was built."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    col_type = column.type.compile(engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+
+def _set_sqlite_pragmas(dbapi_conn, _record):
+    # WAL lets the dashboard read while a stage writes, and with synchronous=NORMAL
+    # a commit no longer costs an fsync (only checkpoints do)
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_KB}")
+    cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+def _create_missing_indexes(engine):
+    """Like _add_missing_columns, for indexes declared after the table was created."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+def _backfill_analysis_status(engine):
+    # Rows from before analysis_status existed: derive it from the analysis text once
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            UPDATE articles SET analysis_status = CASE
+                WHEN gap_analysis IS NULL THEN '{STATUS_PENDING}'
+                WHEN gap_analysis LIKE 'Error%' THEN '{STATUS_ERROR}'
+                ELSE '{STATUS_OK}' END
+            WHERE analysis_status IS NULL
+        """))
+
+# Full-text search: an external-content FTS5 table over the article text and analysis output.
+# It stores only the index (the text stays in `articles`) and triggers keep it in sync with
+# every insert/update/delete, including the bulk ingest path.
+FTS_COLUMNS = ('title', 'content_text', 'topics_covered', 'gap_analysis')
+FTS_WEIGHTS = (10.0, 1.0, 5.0, 2.0) # bm25 column weights: title hits rank highest
+
+def _fts_values(prefix):
+    return ", ".join(f"{prefix}.{col}" for col in FTS_COLUMNS)
+
+def _create_search_index(engine):
+    cols = ", ".join(FTS_COLUMNS)
+    with engine.begin() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'articles_fts'"
+        )).first()
+        try:
+            conn.execute(text(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+                    {cols}, content='articles', content_rowid='id', tokenize='porter unicode61'
+                )
+            """))
+        except Exception as e:
+            print(f"Full-text search unavailable (SQLite built without FTS5?): {e}")
+            return
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS articles_fts_insert AFTER INSERT ON articles BEGIN
+                INSERT INTO articles_fts(rowid, {cols}) VALUES (new.id, {_fts_values('new')});
+            END
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS articles_fts_delete AFTER DELETE ON articles BEGIN
+                INSERT INTO articles_fts(articles_fts, rowid, {cols}) VALUES ('delete', old.id, {_fts_values('old')});
+            END
+        """))
+        # Only edits to indexed columns touch the index; status/bookkeeping updates don't
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS articles_fts_update AFTER UPDATE OF {cols} ON articles BEGIN
+                INSERT INTO articles_fts(articles_fts, rowid, {cols}) VALUES ('delete', old.id, {_fts_values('old')});
+                INSERT INTO articles_fts(rowid, {cols}) VALUES (new.id, {_fts_values('new')});
+            END
+        """))
+        if not exists:
+            # Index whatever was stored before search existed
+            conn.execute(text("INSERT INTO articles_fts(articles_fts) VALUES ('rebuild')"))
+
+def fts_query(query):
+    """
+    Turns free text into an FTS5 query: every word must match, the last one as a prefix
+    (search-as-you-type). Words are quoted, so FTS syntax characters are taken literally.
+    """
+    words = query.split()
+    if not words:
+        return None
+    terms = ['"' + w.replace('"', '""') + '"' for w in words]
+    terms[-1] += '*'
+    return " ".join(terms)
+
+def _search_statement(query, limit, raw):
+    """(sql, params) for search_articles, or None for a blank query. Plain SQLite SQL."""
+    match = query if raw else fts_query(query)
+    if not match:
+        return None
+    weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+    sql = f"""
+        SELECT a.id, a.title, a.url,
+               snippet(articles_fts, -1, '**', '**', ' … ', 16) AS snippet,
+               bm25(articles_fts, {weights}) AS score
+        FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid
+        WHERE articles_fts MATCH :match
+        ORDER BY score
+        LIMIT :limit
+    """
+    return sql, {'match': match, 'limit': limit}
+
+def search_articles(session, query, limit=50, raw=False):
+    """
+    Ranked full-text search over title, content, topics and gaps.
+    Returns [{'id', 'title', 'url', 'snippet', 'score'}], best match first (lower bm25 is better).
+    raw=True passes the query through as FTS5 syntax (AND/OR/NEAR, column filters, "phrases").
+    """
+    statement = _search_statement(query, limit, raw)
+    if statement is None:
+        return []
+    sql, params = statement
+    with metrics.timer('db_search_seconds'):
+        rows = session.execute(text(sql), params).mappings().all()
+    return [dict(row) for row in rows]
+
+def search_articles_dbapi(conn, query, limit=50, raw=False):
+    """search_articles on a plain sqlite3 connection, e.g. the dashboard's read-only one."""
+    statement = _search_statement(query, limit, raw)
+    if statement is None:
+        return []
+    with metrics.timer('db_search_seconds'):
+        cursor = conn.execute(*statement)
+        columns = [d[0] for d in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def _commit_started(session):
+    session.info['commit_started'] = time.perf_counter()
+
+def _commit_finished(session):
+    started = session.info.pop('commit_started', None)
+    if started is not None:
+        metrics.observe('db_commit_seconds', time.perf_counter() - started)
+
 def init_db():
     engine = create_engine(f'sqlite:///{config.DB_NAME}')
+    event.listen(engine, 'connect', _set_sqlite_pragmas)
     Base.metadata.create_all(engine)
-    return sessionmaker(bind=engine)
+    _add_missing_columns(engine)
+    _create_missing_indexes(engine)
+    _backfill_analysis_status(engine)
+    _create_search_index(engine)
+    Session = sessionmaker(bind=engine)
+    # Times flush + commit for every session from this factory
+    event.listen(Session, 'before_commit', _commit_started)
+    event.listen(Session, 'after_commit', _commit_finished)
+    return Session
@@ -0,0 +1,194 @@
+import database
+import config
+import argparse
+import re
+import zlib
+from collections import defaultdict
+import numpy as np
+
+# Near-duplicate detection: MinHash signatures over word shingles, bucketed with LSH so
+# only articles sharing a band are ever compared (no all-pairs scan).
+#
+#   text -> 5-word shingles -> crc32 -> min over NUM_PERM hash functions -> signature
+#   signature split into bands; articles with an identical band land in one bucket
+#   candidates are confirmed on estimated Jaccard similarity, then unioned into clusters
+#
+# Each cluster's longest article is its representative. It is the only one sent to the
+# LLM; the others get its result copied over with a note (see propagate_results).
+
+PRIME = (1 << 31) - 1 # Hash values stay below 2^31, so a * x + b fits in uint64
+TOKEN_RE = re.compile(r'\w+')
+
+class MinHasher:
+    def __init__(self, num_perm=None, shingle_words=None, seed=1):
+        self.num_perm = num_perm or config.MINHASH_PERMUTATIONS
+        self.shingle_words = shingle_words or config.SHINGLE_WORDS
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, PRIME, size=self.num_perm).astype(np.uint64)
+        self.b = rng.randint(0, PRIME, size=self.num_perm).astype(np.uint64)
+
+    def shingles(self, text):
+        words = TOKEN_RE.findall((text or "").lower())
+        k = min(self.shingle_words, len(words))
+        if k == 0:
+            return set()
+        return {zlib.crc32(" ".join(words[i:i + k]).encode('utf-8')) % PRIME
+                for i in range(len(words) - k + 1)}
+
+    def signature(self, text):
+        """uint32 MinHash signature of the text, or None when it has no words."""
+        shingles = self.shingles(text)
+        if not shingles:
+            return None
+        x = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        hashed = (x[:, None] * self.a + self.b) % PRIME
+        return hashed.min(axis=0).astype(np.uint32)
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity: the fraction of matching MinHash slots."""
+    return float(np.mean(sig_a == sig_b))
+
+def find_clusters(signatures, threshold=None, bands=None):
+    """signatures: {article_id: signature}. Returns clusters as lists of two or more article ids."""
+    threshold = config.DEDUP_THRESHOLD if threshold is None else threshold
+    bands = bands or config.LSH_BANDS
+    ids = list(signatures)
+    if not ids:
+        return []
+    rows = len(signatures[ids[0]]) // bands
+
+    buckets = defaultdict(list)
+    for art_id in ids:
+        sig = signatures[art_id]
+        for band in range(bands):
+            buckets[(band, sig[band * rows:(band + 1) * rows].tobytes())].append(art_id)
+
+    parent = {art_id: art_id for art_id in ids}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        # Every candidate pair in the bucket: checking against a single anchor misses pairs
+        # that are similar to each other but not to it. One vectorized row per member.
+        sigs = np.stack([signatures[art_id] for art_id in members])
+        for i in range(len(members) - 1):
+            sims = (sigs[i + 1:] == sigs[i]).mean(axis=1)
+            for j in np.flatnonzero(sims >= threshold):
+                root_a, root_b = find(members[i]), find(members[i + 1 + j])
+                if root_a != root_b:
+                    parent[root_b] = root_a
+
+    groups = defaultdict(list)
+    for art_id in ids:
+        groups[find(art_id)].append(art_id)
+    return [members for members in groups.values() if len(members) > 1]
+
+def assign_duplicates(session, hasher=None):
+    """
+    Clusters every article with text and stores the result in Article.duplicate_of /
+    duplicate_similarity (both NULL for representatives and unique articles).
+    Returns (clusters, duplicates) counts. Caller commits.
+    """
+    hasher = hasher or MinHasher()
+    A = database.Article
+    signatures, words = {}, {}
+    query = session.query(A.id, A.content_text, A.word_count).yield_per(500)
+    for art_id, content, word_count in query:
+        sig = hasher.signature(content)
+        if sig is not None:
+            signatures[art_id] = sig
+            words[art_id] = word_count or 0
+
+    assignments = {}
+    clusters = find_clusters(signatures)
+    for members in clusters:
+        # The longest article most likely covers everything its copies do
+        rep = max(members, key=lambda art_id: (words[art_id], -art_id))
+        for art_id in members:
+            if art_id != rep:
+                assignments[art_id] = (rep, round(similarity(signatures[rep], signatures[art_id]), 3))
+
+    # Rewrite only rows whose assignment changed; a copied analysis no longer matches its
+    # new representative (or standalone article), so those rows go back in the queue
+    copied = {art_id for (art_id,) in session.query(A.id).filter(
+        A.gap_analysis.startswith(database.COPIED_ANALYSIS_PREFIX, autoescape=True))}
+    current = {
+        art_id: (rep, sim)
+        for art_id, rep, sim in session.query(A.id, A.duplicate_of, A.duplicate_similarity)
+        .filter(A.duplicate_of.isnot(None))
+    }
+    updates = [
+        {'id': art_id, 'duplicate_of': rep, 'duplicate_similarity': sim}
+        for art_id, (rep, sim) in assignments.items() if current.get(art_id) != (rep, sim)
+    ]
+    updates += [
+        {'id': art_id, 'duplicate_of': None, 'duplicate_similarity': None}
+        for art_id in current if art_id not in assignments
+    ]
+    for row in updates:
+        if row['id'] in copied:
+            row.update(database.RESET_ANALYSIS)
+    session.bulk_update_mappings(A, updates)
+    return len(clusters), len(assignments)
+
+def propagate_results(session):
+    """
+    Copies each representative's analysis onto its pending near-duplicates, prefixed with
+    a consolidation note, and refreshes earlier copies when the representative was
+    re-analyzed since. Returns the number of articles updated. Caller commits.
+    """
+    A = database.Article
+    reps = {}
+    updated = 0
+    members = (
+        session.query(A)
+        .filter(A.duplicate_of.isnot(None),
+                database.pending_filter() |
+                A.gap_analysis.startswith(database.COPIED_ANALYSIS_PREFIX, autoescape=True))
+        .order_by(A.id)
+        .all()
+    )
+    for art in members:
+        rep = reps.get(art.duplicate_of)
+        if rep is None:
+            rep = reps[art.duplicate_of] = session.get(A, art.duplicate_of)
+        if rep is None or rep.analysis_status != database.STATUS_OK:
+            continue # Representative not analyzed (yet); picked up on a later run
+        rep_id = f"KB-{rep.article_custom_id}" if rep.article_custom_id else rep.title
+        note = (f"{database.COPIED_ANALYSIS_PREFIX}{rep_id} ({art.duplicate_similarity:.0%} similar): "
+                f"consider consolidating] ")
+        gap = note + (rep.gap_analysis or "")
+        if art.gap_analysis == gap and art.suggested_topics == rep.suggested_topics:
+            continue # Copy is current
+        database.apply_analysis(art, {
+            'gap': gap,
+            'suggestions': rep.suggested_topics,
+            'topics': rep.topics_covered,
+            'type': rep.content_type,
+            'model': rep.analysis_model
+        })
+        updated += 1
+    return updated
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find near-duplicate articles (MinHash + LSH).")
+    parser.add_argument("--threshold", type=float, default=config.DEDUP_THRESHOLD,
+                        help="Minimum estimated Jaccard similarity of word shingles")
+    args = parser.parse_args()
+    config.DEDUP_THRESHOLD = args.threshold
+
+    Session = database.init_db()
+    session = Session()
+    clusters, duplicates = assign_duplicates(session)
+    session.commit()
+    print(f"{clusters} near-duplicate clusters, {duplicates} articles are copies of another.")
+    A = database.Article
+    for art in session.query(A).filter(A.duplicate_of.isnot(None)).order_by(A.duplicate_of, A.id):
+        print(f"  {art.title}  ->  #{art.duplicate_of} ({art.duplicate_similarity:.0%})")
+    session.close()
@@ -0,0 +1,133 @@
+import config
+
+# Pluggable HTML backends for the scraper. Each backend parses raw response bytes and
+# pulls out only what the scraper needs:
+#   categories(doc) -> [(name, href, count_text)]  from a.category cards
+#   links(doc)      -> [(href, text)]              for every <a>
+#   article(doc)    -> (text, has_images)          from the article body
+#   title(doc)      -> text or None                first <h1>, else <title>
+# Text follows BeautifulSoup's get_text(separator, strip=True): every text node stripped,
+# empties dropped, joined with the separator; comments, <script>, <style> and <template>
+# contents are skipped.
+
+class Bs4Backend:
+    """Reference implementation on BeautifulSoup + html.parser (pure Python, slowest)."""
+    name = 'bs4'
+
+    def __init__(self):
+        from bs4 import BeautifulSoup
+        self.BeautifulSoup = BeautifulSoup
+
+    def parse(self, content, encoding=None):
+        return self.BeautifulSoup(content, 'html.parser', from_encoding=encoding)
+
+    def categories(self, doc):
+        cards = []
+        for link in doc.select('a.category'):
+            name_tag = link.select_one('h3')
+            count_tag = link.select_one('.article-count span') or link.select_one('.article-count')
+            cards.append((
+                name_tag.get_text(strip=True) if name_tag else None,
+                link.get('href'),
+                count_tag.get_text(strip=True) if count_tag else None
+            ))
+        return cards
+
+    def links(self, doc):
+        return [(link.get('href'), link.get_text(strip=True)) for link in doc.select('a')]
+
+    def article(self, doc):
+        # Get all text from body, assuming article is main content
+        # Better: try to find 'article' tag or main div
+        body = doc.select_one('article') or doc.select_one('div.article-body') or doc.find('body')
+        if body is None:
+            return None
+        return body.get_text(separator='\n', strip=True), body.find('img') is not None
+
+    def title(self, doc):
+        # Articles found only through the sitemap have no listing link text to name them
+        for tag in (doc.find('h1'), doc.find('title')):
+            if tag is not None and tag.get_text(strip=True):
+                return tag.get_text(strip=True)
+        return None
+
+def _has_class(cls):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')"
+
+class LxmlBackend:
+    """libxml2 via lxml: C parser working on bytes, XPath instead of CSS selectors."""
+    name = 'lxml'
+    SKIP_TAGS = {'script', 'style', 'template'}
+
+    def __init__(self):
+        import lxml.html
+        self.lxml_html = lxml.html
+        self.parsers = {}
+
+    def parse(self, content, encoding=None):
+        # Use the charset from the HTTP header when given, otherwise libxml2 sniffs <meta charset>
+        parser = self.parsers.get(encoding)
+        if parser is None:
+            parser = self.parsers[encoding] = self.lxml_html.HTMLParser(encoding=encoding)
+        if isinstance(content, str):
+            content = content.encode(encoding or 'utf-8')
+        return self.lxml_html.document_fromstring(content, parser=parser)
+
+    def _strings(self, el):
+        if isinstance(el.tag, str) and el.tag not in self.SKIP_TAGS:
+            if el.text:
+                yield el.text
+            for child in el:
+                yield from self._strings(child)
+                if child.tail:
+                    yield child.tail
+
+    def text(self, el, separator=''):
+        return separator.join(s.strip() for s in self._strings(el) if s.strip())
+
+    def categories(self, doc):
+        cards = []
+        for link in doc.xpath(f"//a[{_has_class('category')}]"):
+            name_tag = link.xpath(".//h3")
+            count_tag = (link.xpath(f".//*[{_has_class('article-count')}]//span")
+                         or link.xpath(f".//*[{_has_class('article-count')}]"))
+            cards.append((
+                self.text(name_tag[0]) if name_tag else None,
+                link.get('href'),
+                self.text(count_tag[0]) if count_tag else None
+            ))
+        return cards
+
+    def links(self, doc):
+        return [(link.get('href'), self.text(link)) for link in doc.iter('a')]
+
+    def article(self, doc):
+        body = (doc.xpath("(//article)[1]") or doc.xpath(f"(//div[{_has_class('article-body')}])[1]")
+                or doc.xpath("//body"))
+        if not body:
+            return None
+        body = body[0]
+        return self.text(body, '\n'), bool(body.xpath(".//img"))
+
+    def title(self, doc):
+        for tag in (doc.xpath("(//h1)[1]"), doc.xpath("(//title)[1]")):
+            if tag and self.text(tag[0]):
+                return self.text(tag[0])
+        return None
+
+BACKENDS = {'bs4': Bs4Backend, 'lxml': LxmlBackend}
+
+def get_backend(name=None):
+    """
+    Returns a parser backend by name. 'auto' picks lxml when installed and falls back
+    to BeautifulSoup's pure-Python parser.
+    """
+    name = name or config.HTML_PARSER
+    if name == 'auto':
+        try:
+            return LxmlBackend()
+        except ImportError:
+            return Bs4Backend()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown HTML parser '{name}' (choose from: auto, {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
@@ -0,0 +1,122 @@
+import database
+import config
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Background runner for pipeline stages launched from the dashboard.
+#
+#   JobManager.start(script) -> subprocess -> follower thread -> ring buffer (last JOB_LOG_LINES)
+#                                                             -> job_runs row (throttled)
+#
+# The Streamlit script only starts jobs and reads their state, so a long analysis run never
+# holds a rerun open. One manager is shared by every browser session (st.cache_resource), and
+# progress lives in the database, so anyone can watch a job that someone else started.
+
+PROGRESS_RE = re.compile(r'^\[(\d+)/(\d+)\]') # "[12/340] ..." lines printed by the stages
+
+class Job:
+    def __init__(self, run_id, script, process):
+        self.id = run_id
+        self.script = script
+        self.process = process
+        self.lines = deque(maxlen=config.JOB_LOG_LINES)
+        self.started = time.time()
+        self.done = 0
+        self.total = None
+        self.returncode = None
+
+    @property
+    def running(self):
+        return self.returncode is None
+
+    def log(self):
+        return "".join(self.lines)
+
+    def progress(self):
+        """(done, total, items per second, seconds left); the last three may be None."""
+        elapsed = time.time() - self.started
+        rate = self.done / elapsed if self.done and elapsed > 0 else None
+        eta = (self.total - self.done) / rate if rate and self.total else None
+        return self.done, self.total, rate, eta
+
+class JobManager:
+    def __init__(self, session_factory):
+        self.Session = session_factory
+        self.lock = threading.Lock()
+        self.jobs = {} # script -> latest Job
+        # Runs left 'running' by a previous dashboard process lost their output pipe with it
+        session = self.Session()
+        session.query(database.JobRun).filter_by(status='running').update(
+            {'status': 'interrupted', 'finished_at': datetime.utcnow()})
+        session.commit()
+        session.close()
+
+    def get(self, script):
+        return self.jobs.get(script)
+
+    def start(self, script, args=()):
+        """Launches the stage unless it is already running; returns its Job either way."""
+        with self.lock:
+            job = self.jobs.get(script)
+            if job and job.running:
+                return job
+            process = subprocess.Popen(
+                [sys.executable, script, *args],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
+                encoding='utf-8',
+                errors='replace',
+                cwd=os.getcwd(),
+                env=dict(os.environ, PYTHONUNBUFFERED="1") # Lines arrive as printed, not per 8 KB
+            )
+            session = self.Session()
+            run = database.JobRun(stage=script, status='running', pid=process.pid)
+            session.add(run)
+            session.commit()
+            job = self.jobs[script] = Job(run.id, script, process)
+            session.close()
+            threading.Thread(target=self._follow, args=(job,), daemon=True).start()
+            return job
+
+    def _follow(self, job):
+        last_saved = 0
+        for line in iter(job.process.stdout.readline, ''):
+            job.lines.append(line)
+            match = PROGRESS_RE.match(line)
+            if match:
+                job.done, job.total = int(match.group(1)), int(match.group(2))
+            if time.time() - last_saved >= config.JOB_PROGRESS_INTERVAL:
+                self._save(job)
+                last_saved = time.time()
+        job.process.stdout.close()
+        job.returncode = job.process.wait()
+        self._save(job)
+
+    def _save(self, job):
+        done, total, rate, eta = job.progress()
+        values = {
+            'done': done, 'total': total, 'rate': rate, 'eta_seconds': eta,
+            'last_line': job.lines[-1].rstrip() if job.lines else None,
+            'updated_at': datetime.utcnow()
+        }
+        if not job.running:
+            values.update(status='done' if job.returncode == 0 else 'failed',
+                          exit_code=job.returncode, finished_at=datetime.utcnow())
+        session = self.Session()
+        try:
+            session.query(database.JobRun).filter_by(id=job.id).update(values)
+            session.commit()
+        except Exception as e:
+            # Progress is best effort; the stage itself keeps running
+            print(f"Could not save progress of {job.script}: {e}")
+            session.rollback()
+        finally:
+            session.close()
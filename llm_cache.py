@@ -0,0 +1,88 @@
+import sqlite3
+import hashlib
+import json
+import threading
+import time
+import config
+import metrics
+
+class LLMCache:
+    """
+    Persistent cache of parsed analysis results, stored in its own SQLite file.
+    Keyed on (model, prompt version, hash of the exact prompt input), so a prompt
+    change or a different model never serves a stale answer.
+    """
+    def __init__(self, path=None, max_entries=None, max_age_days=None):
+        self.path = path or config.LLM_CACHE_PATH
+        self.max_entries = config.LLM_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.max_age = (config.LLM_CACHE_MAX_AGE_DAYS if max_age_days is None else max_age_days) * 86400
+        self.hits = 0
+        self.misses = 0
+        self.puts_since_evict = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                prompt_version TEXT,
+                result TEXT,
+                created_at REAL,
+                accessed_at REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed ON llm_cache (accessed_at)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(model, prompt_version, title, content):
+        digest = hashlib.sha256(f"{title}\x00{content}".encode('utf-8')).hexdigest()
+        return f"{model}:{prompt_version}:{digest}"
+
+    def get(self, *keys):
+        """Returns the first live entry among keys (one hit or miss is counted either way)."""
+        with self.lock:
+            now = time.time()
+            for key in keys:
+                row = self.conn.execute("SELECT result, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row and (not self.max_age or now - row[1] <= self.max_age):
+                    self.conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                    self.conn.commit()
+                    self.hits += 1
+                    metrics.inc('ai_cache_lookups_total', result='hit')
+                    return json.loads(row[0])
+            self.misses += 1
+            metrics.inc('ai_cache_lookups_total', result='miss')
+            return None
+
+    def put(self, key, model, prompt_version, result):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, prompt_version, result, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, prompt_version, json.dumps(result), now, now)
+            )
+            self.conn.commit()
+            # Eviction is a couple of index scans, so only run it every so often
+            self.puts_since_evict += 1
+            if self.puts_since_evict >= 100:
+                self._evict(now)
+
+    def _evict(self, now):
+        self.puts_since_evict = 0
+        if self.max_age:
+            self.conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.max_age,))
+        if self.max_entries:
+            # Drop the least recently used rows beyond the size cap
+            self.conn.execute("""
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+        self.conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0
+        return f"Cache: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate)"
@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+import config
+
+# Upper bounds (seconds) for latency histograms
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class Metrics:
+    """
+    Process-wide counters and latency histograms, safe to update from worker threads.
+    Series are keyed by name plus a sorted tuple of label pairs, Prometheus style.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = {'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * len(BUCKETS)}
+            h['count'] += 1
+            h['sum'] += seconds
+            h['max'] = max(h['max'], seconds)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    h['buckets'][i] += 1
+                    break
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def to_jsonl(self, stage=None):
+        ts = time.time()
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append({'ts': ts, 'stage': stage, 'type': 'counter', 'name': name,
+                              'labels': dict(labels), 'value': value})
+            for (name, labels), h in sorted(self.histograms.items()):
+                lines.append({'ts': ts, 'stage': stage, 'type': 'histogram', 'name': name,
+                              'labels': dict(labels), 'count': h['count'], 'sum': round(h['sum'], 6),
+                              'max': round(h['max'], 6)})
+        return "\n".join(json.dumps(line) for line in lines)
+
+    def to_prometheus(self):
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        out = []
+        with self.lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    out.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                out.append(f"{name}{fmt(labels)} {value}")
+            for (name, labels), h in sorted(self.histograms.items()):
+                if name not in typed:
+                    out.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, n in zip(BUCKETS, h['buckets']):
+                    cumulative += n
+                    out.append(f"{name}_bucket{fmt(labels, [('le', bound)])} {cumulative}")
+                out.append(f"{name}_bucket{fmt(labels, [('le', '+Inf')])} {h['count']}")
+                out.append(f"{name}_sum{fmt(labels)} {h['sum']:.6f}")
+                out.append(f"{name}_count{fmt(labels)} {h['count']}")
+        return "\n".join(out) + "\n"
+
+    def summary(self):
+        """Short human-readable breakdown of where time went, for the end of a stage."""
+        with self.lock:
+            rows = sorted(self.histograms.items(), key=lambda item: -item[1]['sum'])
+        lines = []
+        for (name, labels), h in rows[:10]:
+            label = ",".join(f"{k}={v}" for k, v in labels)
+            avg = h['sum'] / h['count'] if h['count'] else 0
+            lines.append(f"  {name}{'{' + label + '}' if label else ''}: "
+                         f"{h['count']} x {avg * 1000:.1f}ms avg, {h['sum']:.2f}s total")
+        return "\n".join(lines)
+
+    def export(self, stage):
+        """Appends a JSON-lines snapshot and/or rewrites the Prometheus text file, if configured."""
+        if config.METRICS_JSONL_PATH:
+            with open(config.METRICS_JSONL_PATH, 'a', encoding='utf-8') as f:
+                f.write(self.to_jsonl(stage) + "\n")
+        if config.METRICS_PROM_PATH:
+            with open(config.METRICS_PROM_PATH, 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+
+registry = Metrics()
+inc = registry.inc
+observe = registry.observe
+timer = registry.timer
+
+def report(stage):
+    """
+    Prints the time breakdown and exports; called at the end of each stage. The registry is
+    then cleared, so stages run in one process (cli.py run-all) each report only their own.
+    """
+    breakdown = registry.summary()
+    if breakdown:
+        print(f"Timing breakdown ({stage}):\n{breakdown}")
+    registry.export(stage)
+    registry.reset()
@@ -0,0 +1,156 @@
+import os
+import gzip
+import sqlite3
+import hashlib
+import threading
+import time
+import config
+import metrics
+
+# Raw HTTP bodies kept on disk so extraction changes can be replayed without re-crawling.
+#
+#   ARCHIVE_DIR/objects/ab/abcdef....zst   one compressed file per distinct body (sha256)
+#   ARCHIVE_DIR/index.db                   pages(url, hash, encoding, fetched_at) + blobs(hash, codec, sizes)
+#
+# Bodies are content-addressed, so a page fetched again unchanged (or the same body under two
+# URLs) is stored once. zstd is used when the `zstandard` package is installed, gzip otherwise;
+# each blob records its codec, so archives written with either stay readable.
+
+class GzipCodec:
+    name = 'gzip'
+    suffix = '.gz'
+
+    def compress(self, data):
+        return gzip.compress(data, compresslevel=6)
+
+    def decompress(self, data):
+        return gzip.decompress(data)
+
+class ZstdCodec:
+    name = 'zstd'
+    suffix = '.zst'
+
+    def __init__(self):
+        import zstandard # Optional dependency
+        self.compressor = zstandard.ZstdCompressor(level=10)
+        self.decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def decompress(self, data):
+        return self.decompressor.decompress(data)
+
+CODECS = {'gzip': GzipCodec, 'zstd': ZstdCodec}
+
+def get_codec(name=None):
+    """'auto' picks zstd when the zstandard package is installed and falls back to gzip."""
+    name = name or config.ARCHIVE_CODEC
+    if name == 'auto':
+        try:
+            return ZstdCodec()
+        except ImportError:
+            return GzipCodec()
+    if name not in CODECS:
+        raise ValueError(f"Unknown archive codec '{name}' (choose from: auto, {', '.join(CODECS)})")
+    return CODECS[name]()
+
+class PageArchive:
+    """Thread-safe archive of raw page bodies; fetch threads call put() directly."""
+    def __init__(self, path=None, codec=None):
+        self.path = path or config.ARCHIVE_DIR
+        self.codec = get_codec(codec)
+        self.codecs = {self.codec.name: self.codec} # Readers for blobs written with other codecs
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(self.path, 'objects'), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(self.path, 'index.db'), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                codec TEXT,
+                size INTEGER,
+                stored_size INTEGER,
+                created_at REAL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT,
+                hash TEXT,
+                encoding TEXT,
+                fetched_at REAL,
+                PRIMARY KEY (url, hash)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_pages_url_fetched ON pages (url, fetched_at)")
+        self.conn.commit()
+
+    def _blob_path(self, body_hash, suffix):
+        return os.path.join(self.path, 'objects', body_hash[:2], body_hash + suffix)
+
+    def put(self, url, content, encoding=None):
+        """Records that url served content; the body is written only if it isn't stored yet."""
+        body_hash = hashlib.sha256(content).hexdigest()
+        with self.lock:
+            stored = self.conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (body_hash,)).fetchone()
+        if stored:
+            metrics.inc('archive_puts_total', result='duplicate')
+        else:
+            # Compress and write outside the lock; a concurrent writer of the same body
+            # produces an identical file, and the rename makes either copy whole
+            data = self.codec.compress(content)
+            path = self._blob_path(body_hash, self.codec.suffix)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+            metrics.inc('archive_puts_total', result='stored')
+            metrics.inc('archive_stored_bytes_total', len(data))
+        with self.lock:
+            now = time.time()
+            if not stored:
+                self.conn.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?, ?)",
+                                  (body_hash, self.codec.name, len(content), len(data), now))
+            self.conn.execute("""
+                INSERT INTO pages (url, hash, encoding, fetched_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(url, hash) DO UPDATE SET encoding = excluded.encoding, fetched_at = excluded.fetched_at
+            """, (url, body_hash, encoding, now))
+            self.conn.commit()
+        return body_hash
+
+    def get(self, body_hash):
+        """Raw body bytes for a hash, or None if it isn't archived."""
+        with self.lock:
+            row = self.conn.execute("SELECT codec FROM blobs WHERE hash = ?", (body_hash,)).fetchone()
+        if not row:
+            return None
+        codec = self.codecs.get(row[0])
+        if codec is None:
+            codec = self.codecs[row[0]] = get_codec(row[0])
+        with open(self._blob_path(body_hash, codec.suffix), 'rb') as f:
+            return codec.decompress(f.read())
+
+    def latest(self):
+        """[(url, hash, encoding)] for the most recent body of every archived URL."""
+        with self.lock:
+            return self.conn.execute("""
+                SELECT url, hash, encoding FROM pages p
+                WHERE fetched_at = (SELECT MAX(fetched_at) FROM pages WHERE url = p.url)
+                ORDER BY url
+            """).fetchall()
+
+    def stats(self):
+        with self.lock:
+            pages, urls = self.conn.execute("SELECT COUNT(*), COUNT(DISTINCT url) FROM pages").fetchone()
+            blobs, raw, stored = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM blobs").fetchone()
+        ratio = f", {raw / stored:.1f}x compression" if stored else ""
+        return (f"Page archive: {urls} URLs, {pages} responses in {blobs} distinct bodies, "
+                f"{stored / 1e6:.1f} MB on disk for {raw / 1e6:.1f} MB of HTML{ratio}")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,228 @@
+import database
+import metrics
+import scraper
+import ai_processor
+import config
+import argparse
+import queue
+import threading
+import time
+from collections import deque
+from sqlalchemy import func
+from datetime import datetime
+
+# Streaming pipeline: crawl -> persist -> analyze -> persist, all overlapping.
+#
+#   crawler thread --(scraped_q, bounded)--> writer (main thread) --(analysis_q)--> AI workers
+#                                                  ^                                     |
+#                                                  +------------(results_q)--------------+
+#
+# The main thread is the only one that touches SQLite. Every scraped article is committed
+# with analysis_status 'pending' before it is queued for analysis, so the database itself is the
+# checkpoint: after a crash, rerunning picks up pending articles first and the crawler skips
+# URLs that were already saved.
+
+DONE = object()
+
+def crawl(s, known_urls, scraped_q, stop, discovery=None):
+    """Crawler thread: emits ('category', data), ('article', category_url, data) and ('failed', url) events."""
+    try:
+        categories = s.get_categories()
+        print(f"Found {len(categories)} categories.")
+        for cat_data in categories:
+            scraped_q.put(('category', cat_data))
+
+        known = {scraper.normalize_url(url) for url in known_urls}
+        pending = [
+            (art_data['category_url'], art_data)
+            for art_data in s.discover_articles(categories, known, discovery)
+            if scraper.normalize_url(art_data['url']) not in known
+        ]
+        print(f"Crawling {len(pending)} new articles...")
+
+        chunk = s.workers * 4
+        for start in range(0, len(pending), chunk):
+            if stop.is_set():
+                break
+            batch = pending[start:start + chunk]
+            results = s.map(s.fetch_article, [art_data['url'] for _, art_data in batch])
+            for (cat_url, art_data), result in zip(batch, results):
+                # Blocks while the writer is behind: backpressure on the crawl
+                if result is None:
+                    scraped_q.put(('failed', art_data['url'])) # Not saved, so the next run retries it
+                else:
+                    scraped_q.put(('article', cat_url, dict(art_data, result=result)))
+    except Exception as e:
+        print(f"Crawler failed: {e}")
+    finally:
+        scraped_q.put(DONE)
+
+def analyze_worker(ai, limiter, analysis_q, results_q):
+    while True:
+        item = analysis_q.get()
+        if item is DONE:
+            return
+        art_id, title, content = item
+        limiter.acquire()
+        start_t = time.time()
+        result = None
+        try:
+            result = ai.analyze_article(title, content)
+        except Exception as e:
+            result = {"gap": f"Error: {e}", "suggestions": "Error", "topics": "Error", "type": "Error"}
+        finally:
+            limiter.release(result is not None and not result['gap'].startswith("Error"))
+            results_q.put((art_id, result, time.time() - start_t))
+
+def run_pipeline(crawl_workers=config.CRAWL_WORKERS, analysis_workers=config.ANALYSIS_WORKERS,
+                 queue_size=config.PIPELINE_QUEUE_SIZE, extract_processes=None, discovery=None):
+    print("Streaming Pipeline: Scrape -> Analyze -> Persist")
+    start_time = time.time()
+
+    Session = database.init_db()
+    session = Session()
+
+    s = scraper.Scraper(workers=crawl_workers, extract_processes=extract_processes)
+    ai = ai_processor.AIProcessor()
+    limiter = ai_processor.AdaptiveLimiter(analysis_workers, initial=config.ANALYSIS_INITIAL_CONCURRENCY)
+    ai.on_rate_limit = limiter.backoff
+
+    scraped_q = queue.Queue(maxsize=queue_size)
+    analysis_q = queue.Queue(maxsize=analysis_workers)
+    results_q = queue.Queue()
+    stop = threading.Event()
+
+    # Resume: anything already saved but not analyzed goes first. It is read a page at a
+    # time as the backlog drains, up to the last id pending now (newer articles are queued
+    # as they are scraped).
+    backlog = deque()
+    resume_pages = None
+    resuming = database.count_pending(session)
+    if resuming:
+        print(f"Resuming {resuming} articles pending analysis.")
+        resume_until = session.query(func.max(database.Article.id)).filter(database.pending_filter()).scalar()
+        resume_pages = database.iter_pending_articles(session, page_size=queue_size)
+    known_urls = database.known_article_urls(session)
+    cat_ids = {}
+
+    crawler = threading.Thread(target=crawl, args=(s, known_urls, scraped_q, stop, discovery), daemon=True)
+    workers = [
+        threading.Thread(target=analyze_worker, args=(ai, limiter, analysis_q, results_q), daemon=True)
+        for _ in range(analysis_workers)
+    ]
+    crawler.start()
+    for w in workers:
+        w.start()
+
+    crawl_done = False
+    in_flight = 0
+    stats = {'scraped': 0, 'fetch_failed': 0, 'analyzed': 0, 'failed': 0}
+    try:
+        while not (crawl_done and resume_pages is None and not backlog and in_flight == 0):
+            # 1. Persist finished analyses
+            while True:
+                try:
+                    art_id, result, elapsed = results_q.get_nowait()
+                except queue.Empty:
+                    break
+                in_flight -= 1
+                art = session.get(database.Article, art_id)
+                database.apply_analysis(art, result)
+                session.commit()
+                if result['gap'].startswith("Error"):
+                    stats['failed'] += 1
+                    print(f"  Analysis FAILED ({elapsed:.2f}s): {art.title} - {result['gap']}")
+                else:
+                    stats['analyzed'] += 1
+                    print(f"  Analyzed ({elapsed:.2f}s): {art.title} [concurrency {int(limiter.limit)}]")
+
+            # 2. Top up the backlog from the resume pages while it is short
+            while resume_pages is not None and len(backlog) < queue_size:
+                page = next(resume_pages, None)
+                if page is None or page[-1].id >= resume_until:
+                    resume_pages = None
+                backlog.extend((art.id, art.title, art.content_text)
+                               for art in page or () if art.id <= resume_until)
+
+            # 3. Feed the AI workers without ever blocking the writer
+            while backlog and not analysis_q.full():
+                analysis_q.put_nowait(backlog.popleft())
+                in_flight += 1
+
+            # 4. Persist newly scraped articles, but only while the analysis backlog is short.
+            # Once it fills up, scraped_q fills too and the crawler blocks.
+            if crawl_done or len(backlog) >= queue_size:
+                time.sleep(0.05)
+                continue
+            try:
+                event = scraped_q.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            if event is DONE:
+                crawl_done = True
+            elif event[0] == 'category':
+                cat_data = event[1]
+                cat = session.query(database.Category).filter_by(url=cat_data['url']).first()
+                if not cat:
+                    cat = database.Category(name=cat_data['name'], url=cat_data['url'])
+                    session.add(cat)
+                cat.article_count = cat_data['count']
+                session.commit()
+                cat_ids[cat.url] = cat.id
+            elif event[0] == 'failed':
+                stats['fetch_failed'] += 1
+                print(f"  Fetch FAILED: {event[1]}")
+            else:
+                _, cat_url, art_data = event
+                result = art_data['result']
+                content = result.get('content', "")
+                art = database.Article(
+                    title=art_data['title'] or result.get('title') or art_data['url'],
+                    url=art_data['url'],
+                    category_id=cat_ids.get(cat_url),
+                    content_text=content,
+                    word_count=result.get('word_count', 0),
+                    has_screenshots=result.get('has_screenshots', False),
+                    article_custom_id=s.extract_id_from_url(art_data['url']),
+                    etag=result.get('etag'),
+                    last_modified_header=result.get('last_modified'),
+                    content_hash=result.get('content_hash') or scraper.content_hash(content),
+                    sitemap_lastmod=art_data['lastmod'],
+                    last_updated=datetime.utcnow()
+                )
+                session.add(art)
+                session.commit() # Checkpoint before analysis
+                stats['scraped'] += 1
+                print(f"  Scraped: {art.title}")
+                backlog.append((art.id, art.title, art.content_text))
+    except KeyboardInterrupt:
+        print("\nInterrupted. Saved progress is kept; rerun to resume.")
+        stop.set()
+    finally:
+        for _ in workers:
+            try:
+                analysis_q.put_nowait(DONE)
+            except queue.Full:
+                pass
+        session.close()
+        s.close()
+
+    print(f"\nPipeline Complete in {time.time() - start_time:.1f}s. "
+          f"Scraped: {stats['scraped']}, Fetch failed: {stats['fetch_failed']}, Analyzed: {stats['analyzed']}, Failed: {stats['failed']}")
+    if ai.cache:
+        print(ai.cache.stats())
+    metrics.report('pipeline')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape and analyze in one streaming pass.")
+    parser.add_argument("--crawl-workers", type=int, default=config.CRAWL_WORKERS)
+    parser.add_argument("--analysis-workers", type=int, default=config.ANALYSIS_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=config.PIPELINE_QUEUE_SIZE,
+                        help="Max scraped articles waiting for analysis before the crawl pauses")
+    parser.add_argument("--extract-processes", type=int, default=config.EXTRACT_PROCESSES,
+                        help="Worker processes for HTML extraction (0 = in the crawl threads)")
+    parser.add_argument("--discovery", choices=["auto", "categories"], default=config.DISCOVERY,
+                        help="auto: sitemap.xml, crawling category pages only when needed; categories: always crawl them")
+    args = parser.parse_args()
+    run_pipeline(args.crawl_workers, args.analysis_workers, args.queue_size, args.extract_processes,
+                 args.discovery)
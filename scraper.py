@@ -1,42 +1,302 @@
+import re
+import gzip
 import time
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from urllib.parse import urlparse, urlsplit, urlunsplit
+from xml.etree import ElementTree
+from email.utils import parsedate_to_datetime
 import requests
-from bs4 import BeautifulSoup
 import config
+import metrics
+import html_parsers
+import page_archive
+
+# Pretend to be a browser
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+def content_hash(text):
+    """Stable hash of extracted article text, used to detect real content changes."""
+    return hashlib.sha256((text or "").encode('utf-8')).hexdigest()
+
+CHARSET_RE = re.compile(r'charset=([^;\s]+)', re.I)
+
+def retry_after_seconds(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def extract_content(backend, content, encoding=None):
+    """
+    (text, word_count, has_screenshots, title) for raw article bytes.
+    Pure, so it can run in any process.
+    """
+    try:
+        doc = backend.parse(content, encoding)
+    except Exception as e:
+        print(f"Error parsing article: {e}")
+        return "", 0, False, None
+    title = backend.title(doc)
+    extracted = backend.article(doc)
+    if extracted:
+        text, has_screenshots = extracted
+        word_count = len(text.split())
+        return text, word_count, has_screenshots, title
+    return "", 0, False, title
+
+def normalize_url(url):
+    """
+    Canonical form of a URL for de-duplication: lowercase scheme and host, no default
+    port, no fragment, no duplicate or trailing slashes.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.hostname or ''
+    if parts.port and (scheme, parts.port) not in (('http', 80), ('https', 443)):
+        netloc += f":{parts.port}"
+    path = re.sub(r'/{2,}', '/', parts.path).rstrip('/') or '/'
+    return urlunsplit((scheme, netloc, path, parts.query, ''))
+
+def parse_sitemap(content):
+    """
+    Parses sitemap XML (optionally gzipped) into (kind, [(loc, lastmod)]), where kind is
+    'index' for a sitemap index and 'urlset' for a plain sitemap.
+    """
+    if content[:2] == b'\x1f\x8b':
+        content = gzip.decompress(content)
+    root = ElementTree.fromstring(content)
+    kind = 'index' if root.tag.endswith('sitemapindex') else 'urlset'
+    entries = []
+    for node in root:
+        loc = lastmod = None
+        for child in node:
+            tag = child.tag.rsplit('}', 1)[-1] # Drop the XML namespace
+            if tag == 'loc':
+                loc = (child.text or '').strip()
+            elif tag == 'lastmod':
+                lastmod = (child.text or '').strip() or None
+        if loc:
+            entries.append((loc, lastmod))
+    return kind, entries
+
+# Extraction worker processes build their own parser backend once, at startup
+_worker_backend = None
+
+def _init_extract_worker(parser_name):
+    global _worker_backend
+    _worker_backend = html_parsers.get_backend(parser_name)
+
+def _extract_in_worker(page):
+    content, encoding = page
+    return extract_content(_worker_backend, content, encoding)
+
+class TokenBucket:
+    """Thread-safe token bucket. Refills `rate` tokens per second up to `capacity`."""
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # Reserve a token under the lock, sleep outside it so other threads can queue up
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+class RateLimiter:
+    """One token bucket per host, all sharing the config.REQUEST_INTERVAL budget."""
+    def __init__(self, interval=None, burst=None):
+        interval = config.REQUEST_INTERVAL if interval is None else interval
+        self.rate = 1.0 / interval if interval > 0 else float('inf')
+        self.burst = config.RATE_LIMIT_BURST if burst is None else burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        if self.rate == float('inf'):
+            return
+        host = urlparse(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(self.rate, self.burst)
+        bucket.acquire()
 
 class Scraper:
-    def __init__(self):
-        self.session = requests.Session()
-        # Pretend to be a browser
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
-        self.last_request_time = 0
-
-    def _rate_limit(self):
-        current_time = time.time()
-        elapsed = current_time - self.last_request_time
-        if elapsed < config.REQUEST_INTERVAL:
-            time.sleep(config.REQUEST_INTERVAL - elapsed)
-        self.last_request_time = time.time()
-
-    def get_soup(self, url):
-        self._rate_limit()
+    def __init__(self, workers=1, parser=None, extract_processes=None, archive=None):
+        self.workers = max(1, workers)
+        # HTML backend (see html_parsers); defaults to config.HTML_PARSER
+        self.parser = html_parsers.get_backend(parser)
+        # Parse/get_text/word count is CPU-bound and holds the GIL, so it can be moved to a
+        # process pool. Only worth it once fetching outpaces a single core.
+        self.extract_processes = config.EXTRACT_PROCESSES if extract_processes is None else extract_processes
+        self.extract_pool = None
+        if self.extract_processes > 0:
+            # spawn, not fork: the pool starts while fetch threads are running
+            self.extract_pool = ProcessPoolExecutor(
+                max_workers=self.extract_processes,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_extract_worker,
+                initargs=(self.parser.name,)
+            )
+        self.limiter = RateLimiter()
+        # Raw bodies are archived for offline re-extraction (pass archive=False to skip)
+        if archive is None and config.ARCHIVE_ENABLED:
+            archive = page_archive.PageArchive()
+        self.archive = archive or None
+        # requests.Session is not thread-safe, so each worker thread gets its own. The pool
+        # lives as long as the scraper, so those sessions keep their connections across map() calls.
+        self._local = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+
+    @property
+    def session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(HEADERS)
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown()
+            self.pool = None
+        with self._sessions_lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions.clear()
+        self._local = threading.local()
+        if self.extract_pool:
+            self.extract_pool.shutdown()
+            self.extract_pool = None
+        if self.archive:
+            print(self.archive.stats())
+            self.archive.close()
+            self.archive = None
+
+    def _rate_limit(self, url=config.BASE_URL):
+        with metrics.timer('scraper_rate_limit_wait_seconds'):
+            self.limiter.wait(url)
+
+    def map(self, func, items):
+        """Runs func over items on the worker pool, returning results in input order."""
+        items = list(items)
+        if self.pool is None or len(items) <= 1:
+            return [func(item) for item in items]
+        return list(self.pool.map(func, items))
+
+    def get_page(self, url, etag=None, last_modified=None):
+        """
+        Fetches a page, sending conditional headers when validators are given.
+        Returns a dict with 'status', raw 'content' bytes (None on 304), the header
+        'encoding' (None if undeclared), 'etag' and 'last_modified', or None on error.
+        A 429 is retried up to SCRAPER_MAX_RETRIES times, waiting for Retry-After when the
+        server sends one and backing off exponentially otherwise.
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
         try:
-            print(f"Scraping: {url}")
-            response = self.session.get(url)
-            if response.status_code == 429:
-                print("Rate limited! Waiting 10 seconds...")
-                time.sleep(10)
-                return self.get_soup(url) # Retry once
+            for attempt in range(config.SCRAPER_MAX_RETRIES + 1):
+                self._rate_limit(url)
+                print(f"Scraping: {url}")
+                with metrics.timer('scraper_fetch_seconds'):
+                    response = self.session.get(url, headers=headers)
+                metrics.inc('scraper_responses_total', status=response.status_code)
+                metrics.inc('scraper_response_bytes_total', len(response.content))
+                if response.status_code != 429:
+                    break
+                if attempt == config.SCRAPER_MAX_RETRIES:
+                    print(f"Still rate limited after {attempt} retries, giving up on {url}")
+                    metrics.inc('scraper_errors_total')
+                    return None
+                wait = retry_after_seconds(response.headers.get('Retry-After'))
+                if wait is None:
+                    wait = config.SCRAPER_BACKOFF_SECONDS * 2 ** attempt
+                wait = min(wait, config.SCRAPER_MAX_BACKOFF_SECONDS)
+                print(f"Rate limited! Waiting {wait:.0f} seconds...")
+                metrics.inc('scraper_retries_total')
+                metrics.inc('scraper_backoff_seconds_total', wait)
+                time.sleep(wait)
+            page = {
+                'status': response.status_code,
+                'content': None,
+                'encoding': None,
+                # A 304 may omit validators; keep the ones we sent
+                'etag': response.headers.get('ETag') or etag,
+                'last_modified': response.headers.get('Last-Modified') or last_modified
+            }
+            if response.status_code == 304:
+                return page
             response.raise_for_status()
-            return BeautifulSoup(response.text, 'html.parser')
+            page['content'] = response.content
+            charset = CHARSET_RE.search(response.headers.get('Content-Type', ''))
+            page['encoding'] = charset.group(1).strip('"\'') if charset else None
+            if self.archive:
+                try:
+                    self.archive.put(normalize_url(url), page['content'], page['encoding'])
+                except Exception as e:
+                    print(f"Could not archive {url}: {e}") # The crawl goes on without it
+            return page
         except Exception as e:
             print(f"Error scraping {url}: {e}")
+            metrics.inc('scraper_errors_total')
             return None
+
+    def parse(self, content, encoding=None):
+        with metrics.timer('scraper_parse_seconds', parser=self.parser.name):
+            return self.parser.parse(content, encoding)
+
+    def get_doc(self, url):
+        """Fetches and parses a page with the configured backend. None on error."""
+        page = self.get_page(url)
+        if not page or page['content'] is None:
+            return None
+        try:
+            return self.parse(page['content'], page['encoding'])
+        except Exception as e:
+            print(f"Error parsing {url}: {e}")
+            return None
+
+    def get_soup(self, url, etag=None, last_modified=None):
+        """BeautifulSoup of a page regardless of the configured backend, for ad-hoc use."""
+        from bs4 import BeautifulSoup # Only the bs4 backend needs it otherwise
+        page = self.get_page(url, etag, last_modified)
+        if not page or page['content'] is None:
+            return None
+        return BeautifulSoup(page['content'], 'html.parser', from_encoding=page['encoding'])
             
     def get_categories(self):
-        soup = self.get_soup(config.BASE_URL)
-        if not soup:
+        doc = self.get_doc(config.BASE_URL)
+        if doc is None:
             return []
         
         categories = []
@@ -47,22 +307,14 @@ class Scraper:
         
         # We assume .article-count is inside a.category or related to it.
         # Let's try finding all a.category elements
-        category_links = soup.select('a.category')
-        
-        for link in category_links:
+        for name, url, count_str in self.parser.categories(doc):
             try:
-                name_tag = link.select_one('h3')
-                name = name_tag.get_text(strip=True) if name_tag else "Unknown"
+                name = name if name is not None else "Unknown"
                 
-                url = link.get('href')
                 if url and not url.startswith('http'):
                     url = config.BASE_URL.rstrip('/') + '/' + url.lstrip('/')
                 
-                count_tag = link.select_one('.article-count span')
-                if not count_tag: # Try checking sibling or parent logic if fails, but assume inside for now
-                     count_tag = link.select_one('.article-count')
-                
-                count_str = count_tag.get_text(strip=True) if count_tag else "0"
+                count_str = count_str if count_str is not None else "0"
                 # Extract number from string like "12 articles"
                 count = int(''.join(filter(str.isdigit, count_str))) if any(c.isdigit() for c in count_str) else 0
                 
@@ -77,8 +329,8 @@ class Scraper:
         return categories
 
     def get_articles_from_category(self, category_url):
-        soup = self.get_soup(category_url)
-        if not soup:
+        doc = self.get_doc(category_url)
+        if doc is None:
             return []
             
         articles = []
@@ -90,13 +342,10 @@ class Scraper:
         # We will assume standard structure.
         
         # Heuristic: Find all links that look like articles
-        links = soup.select('a')
-        for link in links:
-            href = link.get('href')
+        for href, title in self.parser.links(doc):
             if href and ('article' in href or 'help' in href) and href != '#':
                  # Filter out navigation links if possible
                  # usually title is the text
-                 title = link.get_text(strip=True)
                  if not title: continue
                  
                  full_url = href
@@ -114,28 +363,128 @@ class Scraper:
                  
         return articles
 
+    def get_sitemap_articles(self, sitemap_url=None):
+        """
+        {normalized article url: lastmod} from the help center sitemap, following sitemap
+        indexes. None when there is no usable sitemap, so callers can fall back to category pages.
+        """
+        level = [sitemap_url or config.SITEMAP_URL or config.BASE_URL.rstrip('/') + '/sitemap.xml']
+        visited = set()
+        articles = {}
+        found = False
+        while level and len(visited) < config.SITEMAP_MAX_FILES:
+            level = [url for url in dict.fromkeys(level) if url not in visited][:config.SITEMAP_MAX_FILES - len(visited)]
+            visited.update(level)
+            next_level = []
+            for url, page in zip(level, self.map(self.get_page, level)):
+                if not page or not page['content']:
+                    continue
+                try:
+                    kind, entries = parse_sitemap(page['content'])
+                except Exception as e:
+                    print(f"Error parsing sitemap {url}: {e}")
+                    continue
+                found = True
+                if kind == 'index':
+                    next_level.extend(loc for loc, _ in entries)
+                    continue
+                for loc, lastmod in entries:
+                    if config.SITEMAP_ARTICLE_PATTERN in loc:
+                        articles.setdefault(normalize_url(loc), lastmod)
+            level = next_level
+        return articles if found and articles else None
+
+    def discover_articles(self, categories, known_urls=(), mode=None):
+        """
+        Articles to crawl as [{'url', 'title', 'category_url', 'lastmod'}], de-duplicated on
+        the normalized URL, in the same category order as a serial crawl.
+        Mode 'auto' reads the sitemap first: it lists every article with its lastmod in a
+        request or two, so category pages are only crawled when it names articles missing from
+        known_urls (to learn their category and title). Mode 'categories', or a missing sitemap,
+        crawls every category listing.
+        """
+        mode = mode or config.DISCOVERY
+        sitemap = self.get_sitemap_articles() if mode != 'categories' else None
+        if sitemap is None and mode != 'categories':
+            print("No usable sitemap, discovering articles from category pages.")
+        elif sitemap is not None:
+            print(f"Sitemap lists {len(sitemap)} articles.")
+
+        known = {normalize_url(url) for url in known_urls}
+        entries = {}
+        if sitemap is None or any(url not in known for url in sitemap):
+            listings = self.map(self.get_articles_from_category, [c['url'] for c in categories])
+            for cat_data, articles in zip(categories, listings):
+                print(f"  Articles for {cat_data['name']}: found {len(articles)}.")
+                for art_data in articles:
+                    key = normalize_url(art_data['url'])
+                    # With a sitemap, links it doesn't list are navigation rather than articles.
+                    # An article listed under several categories belongs to the first one.
+                    if key in entries or (sitemap is not None and key not in sitemap):
+                        continue
+                    entries[key] = {'url': art_data['url'], 'title': art_data['title'],
+                                    'category_url': cat_data['url'], 'lastmod': None}
+        if sitemap is not None:
+            for key, lastmod in sitemap.items():
+                entry = entries.setdefault(key, {'url': key, 'title': None, 'category_url': None})
+                entry['lastmod'] = lastmod
+        return list(entries.values())
+
     def get_article_content(self, article_url):
-        soup = self.get_soup(article_url)
-        if not soup:
-            return ""
-            
-        # Get all text from body, assuming article is main content
-        # Better: try to find 'article' tag or main div
-        article_body = soup.select_one('article')
-        if not article_body:
-            article_body = soup.select_one('div.article-body') # common class
-        if not article_body:
-            article_body = soup.find('body')
-            
-        if article_body:
-            # Check for screenshots (img tags)
-            images = article_body.find_all('img')
-            has_screenshots = len(images) > 0
-            
-            text = article_body.get_text(separator='\n', strip=True)
-            word_count = len(text.split())
-            return text, word_count, has_screenshots
-        return "", 0, False
+        page = self.get_page(article_url)
+        if not page or page['content'] is None:
+            return "", 0, False
+        return self.extract_article(page['content'], page['encoding'])[:3]
+
+    def fetch_article(self, article_url, etag=None, last_modified=None):
+        """
+        Conditional article fetch for incremental re-crawls.
+        Returns None on error, a dict with 'not_modified': True on 304,
+        otherwise the extracted content plus fresh validators and content hash.
+        """
+        page = self.get_page(article_url, etag, last_modified)
+        if not page:
+            return None
+        result = {
+            'not_modified': page['status'] == 304,
+            'etag': page['etag'],
+            'last_modified': page['last_modified']
+        }
+        if not result['not_modified']:
+            text, word_count, has_screenshots, title = self.extract_article(page['content'], page['encoding'])
+            result.update({
+                'title': title,
+                'content': text,
+                'word_count': word_count,
+                'has_screenshots': has_screenshots,
+                'content_hash': content_hash(text)
+            })
+        return result
+
+    def extract_article(self, content, encoding=None):
+        """
+        Returns (text, word_count, has_screenshots, title) for raw article page bytes.
+        With a process pool the calling fetch thread waits on a worker process, so at most
+        one body per fetch thread is in flight.
+        """
+        if self.extract_pool:
+            with metrics.timer('scraper_extract_seconds', parser=self.parser.name, mode='process'):
+                return self.extract_pool.submit(_extract_in_worker, (content, encoding)).result()
+        with metrics.timer('scraper_extract_seconds', parser=self.parser.name, mode='inline'):
+            return extract_content(self.parser, content, encoding)
+
+    def extract_many(self, pages, chunksize=None):
+        """
+        Bulk extraction for already-downloaded (content, encoding) pages, in input order.
+        Pages are shipped to the process pool in chunks to amortize IPC; callers bound
+        memory by how many pages they pass per call.
+        """
+        pages = list(pages)
+        if not self.extract_pool or len(pages) <= 1:
+            return [extract_content(self.parser, content, encoding) for content, encoding in pages]
+        chunksize = chunksize or max(1, len(pages) // (self.extract_processes * 4))
+        with metrics.timer('scraper_extract_batch_seconds', parser=self.parser.name):
+            return list(self.extract_pool.map(_extract_in_worker, pages, chunksize=chunksize))
 
     def extract_id_from_url(self, url):
         # Url format: .../article/63-how-to... -> 63
@@ -0,0 +1,51 @@
+import os
+import sys
+import pytest
+
+# The stages are flat modules in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    """Session on a fresh SQLite database in a temp directory."""
+    import database
+    monkeypatch.setattr(config, 'DB_NAME', str(tmp_path / 'test.db'))
+    session = database.init_db()()
+    yield session
+    session.close()
+
+@pytest.fixture
+def help_center(tmp_path, monkeypatch):
+    """
+    The benchmark's synthetic help center on localhost (2 categories x 5 articles), with
+    config pointed at it and at temp files. site.paths records every requested path.
+    """
+    import benchmark
+    site = benchmark.HelpCenter(categories=2, articles=5, words=60, latency=0, error_rate=0)
+    site.paths = []
+    render = site.render
+
+    def recording_render(path, base=''):
+        site.paths.append(path)
+        return render(path, base)
+
+    site.render = recording_render
+    server, url = benchmark.serve(site.handler())
+    monkeypatch.setattr(config, 'BASE_URL', url)
+    monkeypatch.setattr(config, 'SITEMAP_URL', '')
+    monkeypatch.setattr(config, 'REQUEST_INTERVAL', 0)
+    monkeypatch.setattr(config, 'DB_NAME', str(tmp_path / 'test.db'))
+    monkeypatch.setattr(config, 'ARCHIVE_DIR', str(tmp_path / 'page_archive'))
+    yield site
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def ai(monkeypatch):
+    """AIProcessor without an API key or cache; tests stub out the calls they make."""
+    import ai_processor
+    monkeypatch.delenv('GROK_API_KEY', raising=False)
+    monkeypatch.delenv('GROQ_API_KEY', raising=False)
+    return ai_processor.AIProcessor(use_cache=False)
@@ -0,0 +1,221 @@
+import threading
+import time
+import pytest
+import config
+from ai_processor import (AdaptiveLimiter, RateLimitScheduler, chunk_text, estimate_tokens, parse_duration,
+                          repair_json, validate_analysis)
+
+# --- AdaptiveLimiter ------------------------------------------------------------------
+
+def test_adaptive_limiter_grows_on_success_and_halves_on_backoff():
+    limiter = AdaptiveLimiter(max_limit=8, initial=2, cooldown=60)
+    for _ in range(20):
+        limiter.acquire()
+        limiter.release(success=True)
+    assert limiter.limit > 2
+    before = limiter.limit
+    limiter.backoff()
+    assert limiter.limit == pytest.approx(before / 2)
+    limiter.backoff() # Within the cooldown: counted once
+    assert limiter.limit == pytest.approx(before / 2)
+
+def test_adaptive_limiter_respects_bounds():
+    limiter = AdaptiveLimiter(max_limit=3, initial=10, min_limit=1, cooldown=0)
+    assert limiter.limit == 3
+    for _ in range(10):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 3
+    for _ in range(10):
+        limiter.backoff()
+    assert limiter.limit == 1
+
+def test_adaptive_limiter_blocks_at_limit():
+    limiter = AdaptiveLimiter(max_limit=1, initial=1)
+    limiter.acquire()
+    entered = threading.Event()
+
+    def second():
+        limiter.acquire()
+        entered.set()
+        limiter.release()
+
+    thread = threading.Thread(target=second)
+    thread.start()
+    assert not entered.wait(0.2)
+    limiter.release()
+    assert entered.wait(2)
+    thread.join()
+
+# --- chunk_text -----------------------------------------------------------------------
+
+def test_chunk_text_short_text_is_one_chunk():
+    assert chunk_text("one\ntwo", 100) == ["one\ntwo"]
+
+def test_chunk_text_breaks_on_lines_within_budget():
+    lines = [f"Paragraph {i} " + "word " * 30 for i in range(20)]
+    chunks = chunk_text("\n".join(lines), 100)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 100 for chunk in chunks)
+    assert "\n".join(chunks).split("\n") == lines # Nothing lost or reordered
+
+def test_chunk_text_splits_long_line_on_words():
+    line = " ".join(f"w{i}" for i in range(500))
+    chunks = chunk_text(line, 50)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 50 for chunk in chunks)
+    assert " ".join(chunks).split() == line.split()
+
+# --- repair_json ----------------------------------------------------------------------
+
+def test_repair_json_valid_is_untouched():
+    assert repair_json('{"gap": ["a"]}') == ({"gap": ["a"]}, False)
+
+def test_repair_json_strips_fences_and_prose():
+    data, _ = repair_json('Here you go:\n```json\n{"gap": ["a"], "suggestions": []}\n```')
+    assert data == {"gap": ["a"], "suggestions": []}
+
+def test_repair_json_trailing_comma():
+    data, repaired = repair_json('{"gap": ["a", "b",], "content_type": "FAQ",}')
+    assert repaired
+    assert data == {"gap": ["a", "b"], "content_type": "FAQ"}
+
+def test_repair_json_truncated_reply_keeps_complete_elements():
+    data, repaired = repair_json('{"gap": ["first", "second"], "suggestions": [{"topic": "X", "descr')
+    assert repaired
+    assert data["gap"] == ["first", "second"]
+
+def test_repair_json_ignores_text_after_value():
+    data, _ = repair_json('{"gap": []} and some closing remarks}')
+    assert data == {"gap": []}
+
+def test_repair_json_without_json_raises():
+    with pytest.raises(ValueError):
+        repair_json("Sorry, I cannot help with that.")
+
+# --- validate_analysis ----------------------------------------------------------------
+
+def test_validate_analysis_normalizes_fields():
+    result = validate_analysis({
+        "gap": "Missing screenshots",
+        "suggestions": ["Add a video", {"topic": "SSO", "description": "Explain setup"}],
+        "topics_covered": ["export", "pdf"],
+        "content_type": "how-to guide",
+    })
+    assert result["gap"] == ["Missing screenshots"]
+    assert result["suggestions"] == [{"topic": "Add a video", "description": ""},
+                                     {"topic": "SSO", "description": "Explain setup"}]
+    assert result["topics_covered"] == "export, pdf"
+    assert result["content_type"] == "How-to Guide"
+
+def test_validate_analysis_content_type_fallbacks():
+    assert validate_analysis({"gap": [], "content_type": "Tutorial"})["content_type"] == "Other"
+    assert validate_analysis({"gap": []})["content_type"] == "Unknown"
+
+def test_validate_analysis_unwraps_single_item_list():
+    assert validate_analysis([{"gap": ["a"]}])["gap"] == ["a"]
+
+@pytest.mark.parametrize("data", [["a", "b"], "text", {"topics_covered": "x"}])
+def test_validate_analysis_rejects_wrong_shape(data):
+    with pytest.raises(ValueError):
+        validate_analysis(data)
+
+# --- RateLimitScheduler ---------------------------------------------------------------
+
+def limit_headers(requests=None, tokens=None, reset="30s"):
+    headers = {}
+    if requests is not None:
+        headers.update({'x-ratelimit-remaining-requests': str(requests), 'x-ratelimit-reset-requests': reset})
+    if tokens is not None:
+        headers.update({'x-ratelimit-remaining-tokens': str(tokens), 'x-ratelimit-reset-tokens': reset})
+    return headers
+
+@pytest.mark.parametrize("value, seconds", [
+    ("1m53.184s", 113.184), ("7.66s", 7.66), ("250ms", 0.25), ("2", 2.0), ("1h", 3600.0), (None, None), ("soon", None),
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == (pytest.approx(seconds) if seconds is not None else None)
+
+def test_scheduler_unknown_budget_takes_first_model():
+    scheduler = RateLimitScheduler(["big", "small"])
+    assert scheduler.reserve(1000) == ("big", 0)
+
+def test_scheduler_skips_model_without_requests_left():
+    scheduler = RateLimitScheduler(["big", "small"])
+    scheduler.update("big", limit_headers(requests=1))
+    assert scheduler.reserve(10) == ("big", 0) # Spends the last request locally
+    assert scheduler.reserve(10) == ("small", 0)
+
+def test_scheduler_skips_model_without_tokens_for_the_request():
+    scheduler = RateLimitScheduler(["big", "small"])
+    scheduler.update("big", limit_headers(tokens=500))
+    assert scheduler.reserve(800) == ("small", 0)
+    assert scheduler.reserve(400) == ("big", 0)
+    assert scheduler.budgets["big"]["tokens"] == 100
+
+def test_scheduler_prefers_route_order():
+    scheduler = RateLimitScheduler(["big", "small"])
+    assert scheduler.reserve(10, prefer=["small", "unknown"]) == ("small", 0)
+
+def test_scheduler_waits_for_soonest_reset_when_all_are_exhausted():
+    scheduler = RateLimitScheduler(["big", "small"])
+    scheduler.update("big", limit_headers(requests=0, reset="30s"))
+    scheduler.block("small", 5)
+    model, wait = scheduler.reserve(10)
+    assert model is None
+    assert wait == pytest.approx(5, abs=0.5)
+
+def test_scheduler_forgets_budget_after_reset():
+    scheduler = RateLimitScheduler(["big"])
+    scheduler.update("big", limit_headers(requests=0, tokens=0, reset="20ms"))
+    assert scheduler.reserve(10)[0] is None
+    time.sleep(0.05)
+    assert scheduler.reserve(10) == ("big", 0)
+    assert scheduler.budgets["big"]["requests"] is None
+
+def test_scheduler_ignores_missing_or_bad_headers():
+    scheduler = RateLimitScheduler(["big"])
+    scheduler.update("big", None)
+    scheduler.update("big", {'x-ratelimit-remaining-requests': 'n/a', 'x-ratelimit-reset-requests': '1s'})
+    scheduler.update("big", {'x-ratelimit-remaining-tokens': '0'}) # No reset: not trusted
+    assert scheduler.reserve(10) == ("big", 0)
+
+# --- Model routing --------------------------------------------------------------------
+
+ROUTES = [
+    (600, ("FAQ",), ["small"]),
+    (300, None, ["small", "medium"]),
+    (1200, ("How-to Guide",), ["medium"]),
+]
+
+@pytest.fixture
+def routed_ai(ai, monkeypatch):
+    ai.models = ["large", "medium", "small"]
+    monkeypatch.setattr(config, 'MODEL_ROUTES', ROUTES)
+    monkeypatch.setattr(config, 'MODEL_ROUTING', True)
+    return ai
+
+@pytest.mark.parametrize("title, words, content_type, first", [
+    ("What is a project?", 500, None, "small"),             # Question title -> FAQ rule
+    ("Billing", 200, None, "small"),                        # Short page, any type
+    ("How to export a report", 1000, None, "medium"),       # How-to title -> how-to rule
+    ("Billing", 1000, "How-to Guide", "medium"),            # Type from an earlier analysis wins
+    ("How to export a report", 5000, None, "large"),        # Too long for every rule
+    ("Billing", 500, None, "large"),                        # No type, not short enough
+])
+def test_route_picks_first_matching_rule(routed_ai, title, words, content_type, first):
+    route = routed_ai.route(title, "", content_type=content_type, word_count=words)
+    assert route[0] == first
+    assert sorted(route) == sorted(routed_ai.models) # Every model stays available as a fallback
+
+def test_route_counts_words_when_not_given(routed_ai):
+    assert routed_ai.route("Billing", "word " * 100)[:2] == ["small", "medium"]
+    assert routed_ai.route("Billing", "word " * 400)[0] == "large"
+
+def test_route_skips_unknown_models(routed_ai, monkeypatch):
+    monkeypatch.setattr(config, 'MODEL_ROUTES', [(300, None, ["retired", "medium"])])
+    assert routed_ai.route("Billing", "", word_count=10) == ["medium", "large", "small"]
+
+def test_routing_disabled_keeps_model_order(routed_ai, monkeypatch):
+    monkeypatch.setattr(config, 'MODEL_ROUTING', False)
+    assert routed_ai.route("What is a project?", "", word_count=10) == ["large", "medium", "small"]
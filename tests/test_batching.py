@@ -0,0 +1,88 @@
+import importlib
+import json
+import pytest
+import config
+import database
+
+analyze = importlib.import_module('2_analyze_content')
+
+def entry(art_id, gap):
+    return {"id": art_id, "gap": [gap], "suggestions": [], "topics_covered": "t", "content_type": "FAQ"}
+
+ITEMS = [(1, "Export", "How to export.", None), (2, "Login", "Login with SSO.", None),
+         (3, "Billing", "Plans and invoices.", None)]
+
+@pytest.fixture
+def calls(ai, monkeypatch):
+    """Stubs _complete with a queue of replies (text, or an exception to raise); records prompts."""
+    ai.client = object()
+    calls = {'prompts': [], 'replies': []}
+
+    def complete(prompt, models=None):
+        calls['prompts'].append(prompt)
+        reply = calls['replies'].pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply, "model-a"
+
+    monkeypatch.setattr(ai, '_complete', complete)
+    return calls
+
+def test_batch_reply_covers_every_article_in_one_call(ai, calls):
+    calls['replies'] = [json.dumps({"results": [entry(1, "g1"), entry(2, "g2"), entry(3, "g3")]})]
+    results = ai.analyze_batch(ITEMS)
+    assert len(calls['prompts']) == 1
+    assert {art_id: r['gap'] for art_id, r in results.items()} == {1: "- g1", 2: "- g2", 3: "- g3"}
+    assert all(r['model'] == "model-a" for r in results.values())
+
+def test_missing_entry_falls_back_to_a_single_call(ai, calls):
+    calls['replies'] = [json.dumps({"results": [entry(1, "g1"), entry(3, "g3")]}),
+                        json.dumps(entry(2, "single"))]
+    results = ai.analyze_batch(ITEMS)
+    assert len(calls['prompts']) == 2
+    assert results[2]['gap'] == "- single"
+
+def test_rate_limited_batch_is_left_for_requeue(ai, calls):
+    calls['replies'] = [RuntimeError("rate_limit_exceeded on all models")]
+    assert ai.analyze_batch(ITEMS) == {}
+    assert len(calls['prompts']) == 1 # No per-article fan-out
+
+def test_rejected_batch_falls_back_to_single_calls(ai, calls):
+    calls['replies'] = [ValueError("prompt rejected")] + [json.dumps(entry(i, f"s{i}")) for i in (1, 2, 3)]
+    results = ai.analyze_batch(ITEMS)
+    assert len(calls['prompts']) == 4
+    assert [results[i]['gap'] for i in (1, 2, 3)] == ["- s1", "- s2", "- s3"]
+
+def test_analyze_parallel_requeues_missing_articles(ai, session, monkeypatch):
+    for _, title, content, _ in ITEMS:
+        session.add(database.Article(title=title, url=f"u/{title}", content_text=content))
+    session.commit()
+    session.expire_on_commit = False # As in analyze_data: pages stay readable across commits
+    monkeypatch.setattr(ai, '_retry_delay', lambda attempt, hint=None: 0)
+    attempts = []
+
+    def analyze_batch(items):
+        attempts.append([item[0] for item in items])
+        if len(attempts) == 1:
+            return {items[0][0]: {"gap": "- ok", "suggestions": "", "model": "m"}} # Rest rate limited
+        return {item[0]: {"gap": "- ok", "suggestions": "", "model": "m"} for item in items}
+
+    monkeypatch.setattr(ai, 'analyze_batch', analyze_batch)
+    analyze.analyze_parallel(session, ai, database.iter_pending_articles(session), 3, workers=2, batch=True)
+    assert attempts == [[1, 2, 3], [2, 3]]
+    assert database.count_pending(session) == 0
+
+def test_analyze_parallel_gives_up_after_max_retries(ai, session, monkeypatch):
+    for _, title, content, _ in ITEMS[:2]:
+        session.add(database.Article(title=title, url=f"u/{title}", content_text=content))
+    session.commit()
+    session.expire_on_commit = False
+    monkeypatch.setattr(config, 'AI_MAX_RETRIES', 2)
+    monkeypatch.setattr(ai, '_retry_delay', lambda attempt, hint=None: 0)
+    attempts = []
+    monkeypatch.setattr(ai, 'analyze_batch', lambda items: attempts.append(items) or {})
+
+    analyze.analyze_parallel(session, ai, database.iter_pending_articles(session), 2, workers=2, batch=True)
+    assert len(attempts) == 3
+    statuses = {art.analysis_status for art in session.query(database.Article)}
+    assert statuses == {database.STATUS_ERROR}
@@ -0,0 +1,63 @@
+import importlib
+import pytest
+import database
+
+collect = importlib.import_module('1_collect_data')
+
+def article_fetches(site):
+    return [path for path in site.paths if path.startswith('/article/')]
+
+@pytest.mark.parametrize("discovery", ["auto", "categories"])
+def test_second_run_skips_known_articles(help_center, discovery):
+    collect.collect_data(workers=2, extract_processes=0, discovery=discovery)
+    assert len(article_fetches(help_center)) == 10
+
+    help_center.paths.clear()
+    collect.collect_data(workers=2, extract_processes=0, discovery=discovery)
+    assert article_fetches(help_center) == []
+
+    session = database.init_db()()
+    assert session.query(database.Article).count() == 10
+    session.close()
+
+def test_new_articles_are_fetched_on_later_runs(help_center):
+    help_center.categories = 1
+    collect.collect_data(workers=2, extract_processes=0)
+    help_center.categories = 2
+    help_center.paths.clear()
+    collect.collect_data(workers=2, extract_processes=0)
+    assert len(article_fetches(help_center)) == 5 # Only the new category's articles
+
+    session = database.init_db()()
+    assert session.query(database.Article).count() == 10
+    assert session.query(database.Article).filter(database.Article.category_id.is_(None)).count() == 0
+    session.close()
+
+def analyze_all(session):
+    for art in session.query(database.Article):
+        database.apply_analysis(art, {'gap': "Some gap", 'topics': "t", 'type': "FAQ"})
+    session.commit()
+
+def test_refresh_uses_sitemap_lastmod_to_skip_unchanged(help_center):
+    collect.collect_data(workers=2, extract_processes=0)
+    help_center.paths.clear()
+    collect.collect_data(workers=2, extract_processes=0, refresh=True)
+    assert article_fetches(help_center) == []
+
+def test_refresh_conditional_get_requeues_only_changed_articles(help_center):
+    collect.collect_data(workers=2, extract_processes=0, discovery='categories')
+    session = database.init_db()()
+    analyze_all(session)
+
+    body = help_center.article_body
+    help_center.article_body = lambda art_id: (
+        body(art_id).replace("</article>", "<p>new section</p></article>") if art_id == 3 else body(art_id))
+    help_center.paths.clear()
+    collect.collect_data(workers=2, extract_processes=0, discovery='categories', refresh=True)
+    assert len(article_fetches(help_center)) == 10 # Conditional GETs; unchanged ones answer 304
+
+    session.expire_all()
+    pending = session.query(database.Article).filter(database.pending_filter()).all()
+    assert [art.url.rsplit('/', 1)[-1] for art in pending] == ["3-how-to-0-3"]
+    assert "new section" in pending[0].content_text
+    session.close()
@@ -0,0 +1,108 @@
+import sqlite3
+import config
+import database
+
+def add_article(session, title, content, gap=None, topics=None):
+    article = database.Article(title=title, url=f"https://example.com/{title.replace(' ', '-')}",
+                               content_text=content, gap_analysis=gap, topics_covered=topics)
+    session.add(article)
+    return article
+
+def test_fts_query_quotes_words_and_prefixes_last():
+    assert database.fts_query("jira integration") == '"jira" "integration"*'
+
+def test_fts_query_escapes_syntax():
+    assert database.fts_query('say "hi" OR -x') == '"say" """hi""" "OR" "-x"*'
+
+def test_fts_query_blank():
+    assert database.fts_query("   ") is None
+
+def test_search_articles_ranks_title_matches_first(session):
+    add_article(session, "Export settings", "How to configure the export of reports.")
+    add_article(session, "Jira integration", "Connect zipBoard to Jira with a webhook.")
+    add_article(session, "Getting started", "Invite users. The jira integration is described elsewhere.")
+    session.commit()
+
+    results = database.search_articles(session, "jira")
+    assert [r['title'] for r in results] == ["Jira integration", "Getting started"]
+    assert "**" in results[0]['snippet']
+
+def test_search_articles_prefix_and_all_words(session):
+    add_article(session, "Annotations", "Draw annotations on screenshots.")
+    add_article(session, "Screens", "Manage screen recordings.")
+    session.commit()
+
+    assert [r['title'] for r in database.search_articles(session, "annot")] == ["Annotations"]
+    assert database.search_articles(session, "annotations recordings") == []
+
+def test_search_articles_sees_updates_to_gaps(session):
+    article = add_article(session, "Billing", "Plans and invoices.")
+    session.commit()
+    assert database.search_articles(session, "guest") == []
+
+    database.apply_analysis(article, {'gap': "Guest user limits are missing", 'topics': "billing"})
+    session.commit()
+    assert [r['title'] for r in database.search_articles(session, "guest")] == ["Billing"]
+
+def test_search_articles_raw_syntax(session):
+    add_article(session, "SSO login", "Single sign-on with SAML.")
+    add_article(session, "Password login", "Reset your password.")
+    session.commit()
+
+    results = database.search_articles(session, "saml OR password", raw=True)
+    assert sorted(r['title'] for r in results) == ["Password login", "SSO login"]
+    assert database.search_articles(session, "") == []
+
+def test_search_articles_dbapi_on_read_only_connection(session):
+    add_article(session, "Jira integration", "Connect zipBoard to Jira with a webhook.")
+    add_article(session, "Getting started", "Invite users. The jira integration is described elsewhere.")
+    session.commit()
+
+    conn = sqlite3.connect(f"file:{config.DB_NAME}?mode=ro", uri=True)
+    assert database.search_articles_dbapi(conn, "jira integ") == database.search_articles(session, "jira integ")
+    assert database.search_articles_dbapi(conn, " ") == []
+    conn.close()
+
+def add_articles(session, statuses):
+    articles = []
+    for i, (status, attempts) in enumerate(statuses):
+        articles.append(database.Article(title=f"A{i}", url=f"u/{i}", content_text="text",
+                                         analysis_status=status, analysis_attempts=attempts))
+    session.add_all(articles)
+    session.commit()
+    return articles
+
+def test_iter_pending_articles_pages_by_id(session):
+    articles = add_articles(session, [(database.STATUS_PENDING, 0)] * 7)
+    pages = list(database.iter_pending_articles(session, page_size=3))
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [art.id for page in pages for art in page] == [art.id for art in articles]
+
+def test_iter_pending_articles_selects_pending_and_retryable_errors(session, monkeypatch):
+    articles = add_articles(session, [
+        (database.STATUS_PENDING, 0), (database.STATUS_OK, 1), (database.STATUS_ERROR, 1), (database.STATUS_ERROR, 3),
+    ])
+    monkeypatch.setattr(config, 'MAX_ANALYSIS_ATTEMPTS', 0) # No cap
+    assert [a.id for page in database.iter_pending_articles(session) for a in page] == [
+        articles[0].id, articles[2].id, articles[3].id]
+    monkeypatch.setattr(config, 'MAX_ANALYSIS_ATTEMPTS', 3)
+    assert [a.id for page in database.iter_pending_articles(session) for a in page] == [
+        articles[0].id, articles[2].id]
+    assert database.count_pending(session) == 2
+
+def test_iter_pending_articles_skips_duplicates_on_request(session):
+    rep, dup = add_articles(session, [(database.STATUS_PENDING, 0)] * 2)
+    dup.duplicate_of = rep.id
+    session.commit()
+    assert [a.id for page in database.iter_pending_articles(session, skip_duplicates=True) for a in page] == [rep.id]
+    assert database.count_pending(session) == 2
+
+def test_iter_pending_articles_is_stable_while_results_are_saved(session):
+    add_articles(session, [(database.STATUS_PENDING, 0)] * 5)
+    seen = []
+    for page in database.iter_pending_articles(session, page_size=2):
+        for art in page:
+            seen.append(art.id)
+            database.apply_analysis(art, {'gap': "done"}) # Leaves the pending set mid-iteration
+        session.commit()
+    assert len(seen) == len(set(seen)) == 5
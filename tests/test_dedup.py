@@ -0,0 +1,41 @@
+import numpy as np
+from dedup import MinHasher, find_clusters, similarity
+
+def words(start, count):
+    return " ".join(f"word{i}" for i in range(start, start + count))
+
+def signatures(texts):
+    hasher = MinHasher(num_perm=128, shingle_words=3)
+    return {art_id: hasher.signature(text) for art_id, text in texts.items()}
+
+def test_signature_of_empty_text_is_none():
+    assert MinHasher(num_perm=16).signature("  ") is None
+
+def test_identical_texts_have_identical_signatures():
+    sigs = signatures({1: words(0, 200), 2: words(0, 200)})
+    assert similarity(sigs[1], sigs[2]) == 1.0
+
+def test_find_clusters_groups_near_duplicates_only():
+    sigs = signatures({
+        1: words(0, 300),
+        2: words(0, 300) + " one extra sentence here",
+        3: words(1000, 300),
+        4: words(2000, 300),
+        5: words(2000, 295),
+    })
+    clusters = sorted(sorted(members) for members in find_clusters(sigs, threshold=0.8, bands=32))
+    assert clusters == [[1, 2], [4, 5]]
+
+def test_find_clusters_no_input():
+    assert find_clusters({}, threshold=0.8, bands=16) == []
+
+def test_find_clusters_compares_every_pair_in_a_bucket():
+    # 1 shares one band with 2 and 3 but is not similar to them; 2 and 3 are near-identical.
+    # Comparing against the bucket's first member only would miss the 2-3 pair.
+    base = np.arange(128, dtype=np.uint32)
+    sig2 = base.copy()
+    sig2[8:] += 1000
+    sig3 = sig2.copy()
+    sig3[120:] += 5
+    clusters = find_clusters({1: base, 2: sig2, 3: sig3}, threshold=0.8, bands=16)
+    assert [sorted(members) for members in clusters] == [[2, 3]]
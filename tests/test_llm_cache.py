@@ -0,0 +1,54 @@
+import pytest
+import llm_cache
+from llm_cache import LLMCache
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Deterministic time.time() for the cache: one second per call unless set."""
+    clock = {'now': 1_000_000.0}
+
+    def now():
+        clock['now'] += 1
+        return clock['now']
+
+    monkeypatch.setattr(llm_cache.time, 'time', now)
+    return clock
+
+def keys(cache):
+    return {row[0] for row in cache.conn.execute("SELECT key FROM llm_cache")}
+
+def test_key_depends_on_model_version_and_input():
+    key = LLMCache.make_key("m", "1", "Title", "body")
+    assert key == LLMCache.make_key("m", "1", "Title", "body")
+    assert len({key, LLMCache.make_key("m2", "1", "Title", "body"), LLMCache.make_key("m", "2", "Title", "body"),
+                LLMCache.make_key("m", "1", "Title", "body!")}) == 4
+
+def test_get_returns_first_live_key_and_counts(tmp_path, clock):
+    cache = LLMCache(path=str(tmp_path / 'c.db'))
+    cache.put("b", "m", "1", {"gap": "B"})
+    assert cache.get("a", "b") == {"gap": "B"}
+    assert cache.get("a") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_entries_past_max_age_are_misses_and_evicted(tmp_path, clock):
+    cache = LLMCache(path=str(tmp_path / 'c.db'), max_entries=0, max_age_days=1)
+    cache.put("old", "m", "1", {"gap": "old"})
+    clock['now'] += 2 * 86400
+    assert cache.get("old") is None
+    for i in range(100): # The 100th put triggers eviction
+        cache.put(f"k{i}", "m", "1", {})
+    assert "old" not in keys(cache)
+    assert len(keys(cache)) == 100
+
+def test_eviction_drops_least_recently_used_beyond_cap(tmp_path, clock):
+    cache = LLMCache(path=str(tmp_path / 'c.db'), max_entries=50, max_age_days=0)
+    for i in range(60):
+        cache.put(f"k{i}", "m", "1", {"i": i})
+    assert cache.get("k0") == {"i": 0} # Recently used again: survives eviction
+    for i in range(60, 100):
+        cache.put(f"k{i}", "m", "1", {"i": i})
+
+    remaining = keys(cache)
+    assert len(remaining) == 50
+    assert "k0" in remaining
+    assert remaining == {"k0"} | {f"k{i}" for i in range(51, 100)}
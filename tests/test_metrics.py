@@ -0,0 +1,26 @@
+import json
+import config
+import metrics
+
+def test_report_covers_only_the_stage_since_the_last_report(tmp_path, monkeypatch, capsys):
+    path = tmp_path / 'metrics.jsonl'
+    monkeypatch.setattr(config, 'METRICS_JSONL_PATH', str(path))
+    monkeypatch.setattr(config, 'METRICS_PROM_PATH', '')
+    metrics.registry.reset()
+
+    metrics.observe('scraper_fetch_seconds', 0.2)
+    metrics.inc('scraper_responses_total', status=200)
+    metrics.report('collect')
+    metrics.observe('ai_request_seconds', 1.5, model='m')
+    metrics.report('analyze')
+
+    out = capsys.readouterr().out
+    analyze_section = out.split("Timing breakdown (analyze)")[1]
+    assert "ai_request_seconds" in analyze_section
+    assert "scraper_fetch_seconds" not in analyze_section
+
+    snapshots = [json.loads(line) for line in path.read_text().splitlines()]
+    assert {(s['stage'], s['name']) for s in snapshots} == {
+        ('collect', 'scraper_fetch_seconds'), ('collect', 'scraper_responses_total'),
+        ('analyze', 'ai_request_seconds'),
+    }
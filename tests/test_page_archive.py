@@ -0,0 +1,58 @@
+import os
+import time
+import pytest
+from page_archive import PageArchive
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = PageArchive(path=str(tmp_path / 'archive'), codec='gzip')
+    yield archive
+    archive.close()
+
+def object_files(archive):
+    return [f for _, _, files in os.walk(os.path.join(archive.path, 'objects')) for f in files]
+
+def test_put_get_roundtrip(archive):
+    body = b"<html><body>Hello</body></html>"
+    body_hash = archive.put("https://example.com/a", body, encoding="utf-8")
+    assert archive.get(body_hash) == body
+
+def test_get_unknown_hash(archive):
+    assert archive.get("0" * 64) is None
+
+def test_identical_bodies_are_stored_once(archive):
+    body = b"<html>same</html>"
+    first = archive.put("https://example.com/a", body)
+    second = archive.put("https://example.com/b", body)
+    assert first == second
+    assert len(object_files(archive)) == 1
+
+def test_latest_returns_newest_body_per_url(archive):
+    old = archive.put("https://example.com/a", b"v1", encoding="utf-8")
+    time.sleep(0.01)
+    new = archive.put("https://example.com/a", b"v2", encoding="latin-1")
+    other = archive.put("https://example.com/b", b"other")
+
+    assert archive.latest() == [
+        ("https://example.com/a", new, "latin-1"),
+        ("https://example.com/b", other, None),
+    ]
+    assert archive.get(old) == b"v1" # Older bodies stay readable
+
+def test_refetching_old_body_makes_it_latest_again(archive):
+    first = archive.put("https://example.com/a", b"v1")
+    time.sleep(0.01)
+    archive.put("https://example.com/a", b"v2")
+    time.sleep(0.01)
+    archive.put("https://example.com/a", b"v1")
+    assert archive.latest() == [("https://example.com/a", first, None)]
+
+def test_reads_blobs_written_with_another_codec(tmp_path):
+    path = str(tmp_path / 'archive')
+    writer = PageArchive(path=path, codec='gzip')
+    body_hash = writer.put("https://example.com/a", b"gzip body")
+    writer.close()
+
+    reader = PageArchive(path=path, codec='auto')
+    assert reader.get(body_hash) == b"gzip body"
+    reader.close()
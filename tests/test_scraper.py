@@ -0,0 +1,90 @@
+import gzip
+import time
+import pytest
+from scraper import Scraper, TokenBucket, normalize_url, parse_sitemap, retry_after_seconds
+
+def test_token_bucket_burst_is_immediate():
+    bucket = TokenBucket(rate=10, capacity=3)
+    start = time.monotonic()
+    for _ in range(3):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.05
+
+def test_token_bucket_paces_after_burst():
+    bucket = TokenBucket(rate=20, capacity=1)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    # First token is free, the other four wait 1/20 s each
+    assert time.monotonic() - start == pytest.approx(0.2, abs=0.1)
+
+def test_token_bucket_capacity_at_least_one():
+    assert TokenBucket(rate=1, capacity=0).capacity == 1
+
+def test_retry_after_seconds():
+    assert retry_after_seconds("7") == 7
+    assert retry_after_seconds(None) is None
+    assert retry_after_seconds("soon") is None
+
+def test_map_reuses_worker_threads_and_sessions_across_calls():
+    s = Scraper(workers=3, extract_processes=0, archive=False)
+    sessions = set()
+    for _ in range(5):
+        assert s.map(lambda x: (sessions.add(id(s.session)), x * 2)[1], range(12)) == [x * 2 for x in range(12)]
+    assert len(sessions) <= 3
+    assert len(s._sessions) == len(sessions)
+    s.close()
+    assert s.pool is None and s._sessions == []
+
+# --- Discovery ------------------------------------------------------------------------
+
+@pytest.mark.parametrize("url, expected", [
+    ("HTTPS://Help.Example.com:443/article/1-x/", "https://help.example.com/article/1-x"),
+    ("http://example.com:8080//a//b#top", "http://example.com:8080/a/b"),
+    ("https://example.com", "https://example.com/"),
+    ("https://example.com/search?q=a ", "https://example.com/search?q=a"),
+])
+def test_normalize_url(url, expected):
+    assert normalize_url(url) == expected
+
+SITEMAP_INDEX = (b'<?xml version="1.0"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                 b'<sitemap><loc> https://example.com/s1.xml </loc></sitemap></sitemapindex>')
+URLSET = (b'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+          b'<url><loc>https://example.com/article/1</loc><lastmod>2024-01-01</lastmod></url>'
+          b'<url><loc>https://example.com/article/2</loc></url><url><lastmod>2024</lastmod></url></urlset>')
+
+def test_parse_sitemap_index():
+    assert parse_sitemap(SITEMAP_INDEX) == ('index', [("https://example.com/s1.xml", None)])
+
+def test_parse_sitemap_urlset_skips_entries_without_loc():
+    assert parse_sitemap(URLSET) == ('urlset', [("https://example.com/article/1", "2024-01-01"),
+                                                ("https://example.com/article/2", None)])
+
+def test_parse_sitemap_gzipped():
+    assert parse_sitemap(gzip.compress(URLSET)) == parse_sitemap(URLSET)
+
+def discover(site, known=(), mode='auto'):
+    s = Scraper(workers=2, extract_processes=0, archive=False)
+    try:
+        return s.discover_articles(s.get_categories(), known, mode)
+    finally:
+        s.close()
+
+def test_discover_articles_from_sitemap_and_categories(help_center):
+    articles = discover(help_center)
+    assert len(articles) == 10
+    assert all(a['category_url'] and a['title'] and a['lastmod'] == '2024-01-01' for a in articles)
+    assert any(path.startswith('/collection/') for path in help_center.paths)
+
+def test_discover_articles_skips_category_pages_when_sitemap_is_known(help_center):
+    known = [a['url'] for a in discover(help_center)]
+    help_center.paths.clear()
+    articles = discover(help_center, known)
+    assert len(articles) == 10
+    assert not any(path.startswith('/collection/') for path in help_center.paths)
+
+def test_discover_articles_categories_mode_ignores_sitemap(help_center):
+    articles = discover(help_center, mode='categories')
+    assert len(articles) == 10
+    assert all(a['lastmod'] is None for a in articles)
+    assert '/sitemap.xml' not in help_center.paths